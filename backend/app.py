@@ -20,6 +20,9 @@ from .routes.dynamic_questionnaire_routes import dynamic_questionnaire_bp
 from .routes.admin_dynamic_routes import admin_dynamic_bp
 from .routes.auth_admin_routes import auth_admin_bp
 from .extensions import limiter
+from .services import ux_survey
+from .services import payload_limits
+from .services.questionnaire_resolver import invalidate_resolution
 
 def create_app():
     """Crea y configura la aplicación Flask."""
@@ -35,6 +38,8 @@ def create_app():
     # Per-process instance id (used by frontend to invalidate client sessions on restart)
     app.config['INSTANCE_ID'] = uuid.uuid4().hex
     # Admin header fallback removed; JWT-only enforced for admin endpoints
+    # Request body cap (413 before parsing); answers are further bounded per field in the routes
+    app.config['MAX_CONTENT_LENGTH'] = payload_limits.MAX_REQUEST_BYTES
 
     if os.environ.get('FLASK_ENV') == 'production':
         # Require a real secret key in production
@@ -53,9 +58,9 @@ def create_app():
             'https://stem-vocacional-web-3h18qe8wm-michse017s-projects.vercel.app',
             "http://localhost:3000",
         ]
-        CORS(app, resources={r"/api/*": {"origins": allowed_origins, "allow_headers": ["Content-Type", "Authorization"]}}, supports_credentials=True)
+        CORS(app, resources={r"/api/*": {"origins": allowed_origins, "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"]}}, supports_credentials=True)
     else:
-        CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"], "allow_headers": ["Content-Type", "Authorization"]}}, supports_credentials=True)
+        CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"], "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"]}}, supports_credentials=True)
 
     app.register_blueprint(usuario_bp, url_prefix='/api')
     # Legacy questionnaire removed from runtime.
@@ -159,7 +164,9 @@ def _ensure_ux_survey():
     with Session(engine) as s:
         existing = s.query(Questionnaire).filter_by(code="ux_survey").first()
         if existing:
-            return  # Ya existe
+            # Ya existe: precargar estructura y usuarios que ya la respondieron
+            ux_survey.warm(s)
+            return
         q = Questionnaire(code="ux_survey", title="Encuesta de Usabilidad STEM", description="Encuesta de usabilidad de la herramienta STEM", status="active", is_primary=False)
         s.add(q)
         s.flush()
@@ -182,6 +189,8 @@ def _ensure_ux_survey():
             order_counter += 1
         s.commit()
         print("[ensure_ux_survey] Questionnaire 'ux_survey' creado con versión publicada.")
+        invalidate_resolution()
+        ux_survey.warm(s)
 
 # --- Punto de Entrada para Ejecución ---
 if __name__ == '__main__':
@@ -9,11 +9,22 @@ from sqlalchemy.exc import IntegrityError
 from database.controller import engine
 from database.dynamic_models import (
 	Questionnaire, QuestionnaireVersion, Section, Question, Option,
-	QuestionnaireAssignment, Response, ResponseItem
+	QuestionnaireAssignment, Response, ResponseItem, PrefillValue
 )
 from database.controller import SessionLocal, get_usuario_by_codigo, create_usuario
 from backend.services import ml_registry
+from backend.services import prefill_index
+from backend.services import response_store
+from backend.services import ux_survey
+from backend.services.computed_fields import ICFES_GLOBAL_EXPRESSION, ExpressionError, compile_expression, expression_source
 from backend.services.ml_inference_service import _resolve_path  # internal helper is fine for diagnostics
+from backend.services.dynamic_validation import _VALIDATORS, get_validator
+from backend.services.option_index import option_stats
+from backend.services.validation_profile import PROFILE, REGEX_GUARD, regex_risk, stored_unsafe_patterns
+from backend.services.version_index import get_version_index, invalidate_version
+from backend.services.questionnaire_resolver import (
+	invalidate_resolution, latest_version, latest_version_id, next_version_number
+)
 from database.models import Usuario
 
 admin_dynamic_bp = Blueprint("admin_dynamic", __name__)
@@ -30,6 +41,28 @@ def _error(msg, status=400, **extra):
 	return jsonify(body), status
 
 
+def _expression_error(payload):
+	"""Reject computed_expression values the engine cannot compile (None if fine)."""
+	if "computed_expression" not in payload or payload.get("computed_expression") is None:
+		return None
+	source = expression_source(payload.get("computed_expression"))
+	if source is None:
+		return "empty_expression"
+	try:
+		compile_expression(source)
+	except ExpressionError as e:
+		return str(e)
+	return None
+
+
+def _regex_error(payload):
+	"""Reject validation_rules.regex patterns that do not compile or can backtrack catastrophically."""
+	rules = payload.get("validation_rules")
+	if not isinstance(rules, dict) or not rules.get("regex"):
+		return None
+	return regex_risk(str(rules.get("regex")))
+
+
 # --- Access control (shared secret via header) ---
 
 @admin_dynamic_bp.before_request
@@ -53,11 +86,14 @@ def _serialize_version(version: QuestionnaireVersion):
 			assignment_count = _s.query(QuestionnaireAssignment).filter_by(questionnaire_version_id=version.id).count()
 	except Exception:
 		assignment_count = 0
-	# latest-published flag
-	q = version.questionnaire
-	published_numbers = [vv.version_number for vv in (q.versions if q else []) if vv.status == "published"]
-	latest_published = max(published_numbers) if published_numbers else None
-	is_latest_published = (version.status == "published" and latest_published == version.version_number)
+	# latest-published flag (single TOP 1 seek instead of loading every sibling version)
+	is_latest_published = False
+	if version.status == "published":
+		try:
+			with Session(engine) as _s:
+				is_latest_published = latest_version_id(_s, version.questionnaire_id, published_only=True) == version.id
+		except Exception:
+			is_latest_published = False
 	return {
 		"id": version.id,
 		"number": version.version_number,
@@ -108,17 +144,10 @@ def _serialize_version(version: QuestionnaireVersion):
 
 # --- Utility serializers/helpers ---
 
-def _parse_value(item: ResponseItem):
+def _parse_value(item: ResponseItem, v_index=None, code=None):
 	"""Parse stored ResponseItem into a JSON-friendly value consistent with public API."""
-	if item.numeric_value is not None:
-		return item.numeric_value
-	if item.value is None:
-		return None
-	if item.value in ("true", "false"):
-		return item.value == "true"
-	if "," in item.value and item.value.count(",") >= 1:
-		return [v for v in item.value.split(",") if v]
-	return item.value
+	meta = v_index.by_code.get(code) if (v_index is not None and code) else None
+	return response_store.decode_item(item, meta.type if meta else None)
 
 # --- Questionnaire CRUD ---
 
@@ -172,7 +201,7 @@ def set_primary_questionnaire(code: str):
 			# must be active and have a published version to be useful
 			if q.status != "active":
 				return _error("questionnaire_inactive", 409)
-			if not any(v.status == "published" for v in q.versions):
+			if not latest_version_id(s, q.id, published_only=True):
 				return _error("no_published_version", 409)
 			# block if another is already primary
 			other_primary = s.query(Questionnaire).filter(Questionnaire.is_primary == True, Questionnaire.code != q.code).first()
@@ -182,6 +211,7 @@ def set_primary_questionnaire(code: str):
 		else:
 			q.is_primary = False
 		s.commit()
+		invalidate_resolution()
 		return jsonify({"message": "primary_updated", "code": q.code, "is_primary": bool(q.is_primary)})
 
 @admin_dynamic_bp.route("/admin/users", methods=["POST"])
@@ -288,9 +318,12 @@ def delete_user(id_usuario: int):
 				items_deleted = s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 				responses_deleted = s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 			assignments_deleted = s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+		# índice de prefill del usuario
+		s.query(PrefillValue).filter(PrefillValue.user_code == codigo).delete(synchronize_session=False)
 		# eliminar usuario al final
 		s.delete(u)
 		s.commit()
+		ux_survey.forget(codigo)
 		return jsonify({
 			"message": "user_deleted",
 			"deleted": {"assignments": assignments_deleted, "responses": responses_deleted, "items": items_deleted}
@@ -331,6 +364,7 @@ def create_questionnaire():
 		v = QuestionnaireVersion(questionnaire=q, version_number=1, status="draft")
 		s.add(q)
 		s.commit()
+		invalidate_resolution()
 		return jsonify({
 			"message": "questionnaire_created",
 			"questionnaire": {"code": q.code, "title": q.title},
@@ -373,14 +407,10 @@ def clone_latest_published(code: str):
 		if not q:
 			return _error("not_found", 404)
 		# Prefer latest published; if none, fallback to latest existing version
-		published = [v for v in q.versions if v.status == "published"]
-		if published:
-			base = sorted(published, key=lambda v: v.version_number)[-1]
-		else:
-			if not q.versions:
-				return _error("no_versions", 409)
-			base = sorted(q.versions, key=lambda v: v.version_number)[-1]
-		new_number = max(v.version_number for v in q.versions) + 1
+		base = latest_version(s, q.id, published_only=True) or latest_version(s, q.id)
+		if not base:
+			return _error("no_versions", 409)
+		new_number = next_version_number(s, q.id)
 		new_v = QuestionnaireVersion(questionnaire=q, version_number=new_number, status="draft")
 		s.add(new_v)  # add early to avoid SAWarning on relationship operations
 		# deep copy sections/questions/options
@@ -406,6 +436,7 @@ def clone_latest_published(code: str):
 					new_op = Option(question=new_q, value=op.value, label=op.label, order=op.order, is_other_flag=op.is_other_flag, active_flag=op.active_flag)
 					s.add(new_op)
 		s.commit()
+		invalidate_resolution()
 		return jsonify({
 			"message": "cloned",
 			"version": {"id": new_v.id, "number": new_v.version_number, "status": new_v.status}
@@ -422,13 +453,11 @@ def create_new_blank_version(code: str):
 		q = s.execute(select(Questionnaire).where(Questionnaire.code==code)).scalar_one_or_none()
 		if not q:
 			return _error("not_found", 404)
-		if q.versions:
-			new_number = max(v.version_number for v in q.versions) + 1
-		else:
-			new_number = 1
+		new_number = next_version_number(s, q.id)
 		new_v = QuestionnaireVersion(questionnaire=q, version_number=new_number, status="draft")
 		s.add(new_v)
 		s.commit()
+		invalidate_resolution()
 		return jsonify({"message": "new_version_created", "version": {"id": new_v.id, "number": new_v.version_number, "status": new_v.status}}), 201
 
 @admin_dynamic_bp.route("/admin/versions/<int:version_id>", methods=["GET"])
@@ -467,8 +496,11 @@ def delete_version(version_id: int):
 					items_deleted = s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 					responses_deleted = s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 				assignments_deleted = s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+			prefill_index.forget_versions(s, [v.id])
 			s.delete(v)
 			s.commit()
+			invalidate_resolution()
+			invalidate_version(version_id)
 			return jsonify({"message": "version_force_deleted", "deleted": {"assignments": assignments_deleted, "responses": responses_deleted, "items": items_deleted}})
 		# Si no es force: permitir borrar si la versión NO está publicada, eliminando sus datos relacionados
 		if v.status in ("draft", "archived"):
@@ -480,26 +512,30 @@ def delete_version(version_id: int):
 					s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 					s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 				s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+			prefill_index.forget_versions(s, [v.id])
 			# ahora eliminar la versión
 			s.delete(v)
 			s.commit()
+			invalidate_resolution()
+			invalidate_version(version_id)
 			return jsonify({"message": "version_deleted"})
 		# Si es publicada: permitir borrar sólo si NO es la última publicada y no tiene asignaciones
 		if v.status == "published":
-			q = v.questionnaire
-			published_numbers = [vv.version_number for vv in q.versions if vv.status == "published"]
-			latest_published = max(published_numbers) if published_numbers else None
-			if latest_published is None or v.version_number == latest_published:
+			latest_published_id = latest_version_id(s, v.questionnaire_id, published_only=True)
+			if latest_published_id is None or latest_published_id == v.id:
 				return _error("cannot_delete_latest_published", 409)
 			has_assignments = s.query(QuestionnaireAssignment).filter_by(questionnaire_version_id=v.id).limit(1).count() > 0
 			if has_assignments:
 				return _error("version_has_assignments", 409)
 			try:
+				prefill_index.forget_versions(s, [v.id])
 				s.delete(v)
 				s.commit()
+				invalidate_resolution()
 			except IntegrityError:
 				s.rollback()
 				return _error("version_has_responses", 409)
+			invalidate_version(version_id)
 			return jsonify({"message": "version_deleted"})
 		# Si está archivada: permitir borrar solo si no tiene asignaciones
 		if v.status == "archived":
@@ -507,11 +543,14 @@ def delete_version(version_id: int):
 			if has_assignments:
 				return _error("version_has_assignments", 409)
 			try:
+				prefill_index.forget_versions(s, [v.id])
 				s.delete(v)
 				s.commit()
+				invalidate_resolution()
 			except IntegrityError:
 				s.rollback()
 				return _error("version_has_responses", 409)
+			invalidate_version(version_id)
 			return jsonify({"message": "version_deleted"})
 		return _error("unsupported_version_status", 409)
 
@@ -546,9 +585,12 @@ def force_delete_version(version_id: int):
 				items_deleted = s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 				responses_deleted = s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 			assignments_deleted = s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+		prefill_index.forget_versions(s, [v.id])
 		# Finally, delete the version
 		s.delete(v)
 		s.commit()
+		invalidate_resolution()
+		invalidate_version(version_id)
 		return jsonify({
 			"message": "version_force_deleted",
 			"deleted": {
@@ -581,20 +623,21 @@ def patch_version(version_id: int):
 			v.valid_from = None
 			v.valid_to = None
 			s.commit()
+			invalidate_resolution()
+			invalidate_version(version_id)
 			return jsonify({"message": "version_unpublished", "version": {"id": v.id, "status": v.status}})
 		if target_status == "published":
 			if v.status != "draft":
 				return _error("not_draft", 409)
 			# Demote siblings
-			siblings = v.questionnaire.versions if v.questionnaire else []
-			for sibl in siblings:
-				if sibl.id != v.id and sibl.status == "published":
-					sibl.status = "draft"
-					sibl.valid_from = None
-					sibl.valid_to = None
+			demoted = _demote_published_siblings(s, v)
 			v.status = "published"
 			v.valid_from = func.now()
 			s.commit()
+			invalidate_resolution()
+			invalidate_version(version_id)
+			for sibling_id in demoted:
+				invalidate_version(sibling_id)
 			return jsonify({"message": "published", "version": {"id": v.id, "status": v.status}})
 		if target_status == "archived":
 			if v.status != "draft":
@@ -602,6 +645,8 @@ def patch_version(version_id: int):
 			v.status = "archived"
 			v.valid_to = func.now()
 			s.commit()
+			invalidate_resolution()
+			invalidate_version(version_id)
 			return jsonify({"message": "archived", "version": {"id": v.id, "status": v.status}})
 	return _error("unsupported_operation", 409)
 
@@ -623,8 +668,39 @@ def patch_version_metadata(version_id: int):
 			return _error("version_not_found", 404)
 		v.metadata_json = metadata
 		s.commit()
+		invalidate_version(version_id)
 		return jsonify({"message": "metadata_updated", "version": {"id": v.id}})
 
+# --- Admin: validation diagnostics (per worker) ---
+
+@admin_dynamic_bp.route("/admin/diagnostics/validation", methods=["GET"])
+def validation_diagnostics():
+	"""Rule timings (when profiling is on), slow / quarantined / unsafe regexes of this worker,
+	plus every stored regex rule that is not enforced (all versions)."""
+	if not _enabled():
+		return _error("dynamic_disabled", 404)
+	body = PROFILE.snapshot()
+	body["regex"] = REGEX_GUARD.snapshot()
+	with Session(engine) as s:
+		body["regex"]["not_enforced"] = stored_unsafe_patterns(s)
+	body["cached_validators"] = len(_VALIDATORS)
+	return jsonify(body)
+
+
+@admin_dynamic_bp.route("/admin/diagnostics/validation", methods=["POST"])
+def configure_validation_diagnostics():
+	"""Body: {"enabled": bool, "reset": bool, "release_regex": bool} (this worker only)."""
+	if not _enabled():
+		return _error("dynamic_disabled", 404)
+	payload = request.get_json(force=True, silent=True) or {}
+	if "enabled" in payload:
+		PROFILE.enabled = bool(payload.get("enabled"))
+	if payload.get("reset"):
+		PROFILE.reset()
+	if payload.get("release_regex"):
+		REGEX_GUARD.release()
+	return jsonify({"message": "validation_diagnostics_updated", "enabled": PROFILE.enabled})
+
 # --- Admin: ML Models registry (for FeatureBindingWizard) ---
 
 @admin_dynamic_bp.route("/admin/ml/models", methods=["GET"])
@@ -681,11 +757,7 @@ def check_version_ml_binding(version_id: int):
 		import os
 		artifact_exists = bool(resolved_path and os.path.exists(resolved_path))
 
-		# Build question codes set for this version
-		qcodes = set()
-		for sec in v.sections:
-			for qu in sec.questions:
-				qcodes.add(qu.code)
+		qcodes = get_version_index(s, v).by_code
 
 		feats = []
 		unmapped = []
@@ -758,13 +830,9 @@ def recompute_version_ml(version_id: int):
 		v = s.get(QuestionnaireVersion, version_id)
 		if not v:
 			return _error("version_not_found", 404)
-		# Build code maps
-		qmap_by_code = {}
-		qid_to_code = {}
-		for sec in v.sections:
-			for qu in sec.questions:
-				qmap_by_code[qu.code] = qu
-				qid_to_code[qu.id] = qu.code
+		v_index = get_version_index(s, v)
+		qmap_by_code = v_index.by_code
+		qid_to_code = v_index.qid_to_code
 
 		q_assign = s.query(QuestionnaireAssignment).filter_by(questionnaire_version_id=v.id)
 		if only_finalized:
@@ -786,7 +854,7 @@ def recompute_version_ml(version_id: int):
 				code_key = qid_to_code.get(it.question_id)
 				if not code_key:
 					continue
-				answers[code_key] = _parse_value(it)
+				answers[code_key] = _parse_value(it, v_index, code_key)
 			ml_summary = try_infer_and_store(s, v, resp, answers, qmap_by_code)
 			if isinstance(ml_summary, dict) and ml_summary.get("status") == "ok":
 				updated += 1
@@ -808,7 +876,7 @@ def clone_version(version_id: int):
 		q = base.questionnaire
 		if not q:
 			return _error("questionnaire_not_found", 404)
-		new_number = (max(v.version_number for v in q.versions) + 1) if q.versions else 1
+		new_number = next_version_number(s, q.id)
 		new_v = QuestionnaireVersion(questionnaire=q, version_number=new_number, status="draft")
 		s.add(new_v)
 		for sec in sorted(base.sections, key=lambda s2: s2.order):
@@ -822,6 +890,7 @@ def clone_version(version_id: int):
 				for op in sorted(qu.options, key=lambda o2: o2.order):
 					s.add(Option(question=new_q, value=op.value, label=op.label, order=op.order, is_other_flag=op.is_other_flag, active_flag=op.active_flag))
 		s.commit()
+		invalidate_resolution()
 		return jsonify({"message": "cloned", "version": {"id": new_v.id, "number": new_v.version_number, "status": new_v.status}}), 201
 
 # --- Sections ---
@@ -848,6 +917,7 @@ def add_section(version_id: int):
 		sec = Section(version=v, title=title, description=payload.get("description"), order=order, active_flag=True)
 		s.add(sec)
 		s.commit()
+		invalidate_version(version_id)
 		return jsonify({"message": "section_added", "section": {"id": sec.id, "title": sec.title, "order": sec.order}}), 201
 
 # --- Questions ---
@@ -863,6 +933,12 @@ def add_question(section_id: int):
 	required = bool(payload.get("required", True))
 	if not text:
 		return _error("text_required")
+	expr_err = _expression_error(payload)
+	if expr_err:
+		return _error("invalid_expression", detail=expr_err)
+	regex_err = _regex_error(payload)
+	if regex_err:
+		return _error("invalid_regex", detail=regex_err)
 	with Session(engine) as s:
 		sec = s.get(Section, section_id)
 		if not sec:
@@ -896,9 +972,11 @@ def add_question(section_id: int):
 		if order is None:
 			order = (max(existing_orders)+1) if existing_orders else 1
 		qu = Question(section=sec, code=code, text=text, type=q_type, required=required, order=order,
-					   validation_rules=payload.get("validation_rules"), visible_if=payload.get("visible_if"))
+					   validation_rules=payload.get("validation_rules"), visible_if=payload.get("visible_if"),
+					   is_computed=bool(payload.get("is_computed", False)), computed_expression=payload.get("computed_expression"))
 		s.add(qu)
 		s.commit()
+		invalidate_version(sec.questionnaire_version_id)
 		return jsonify({"message": "question_added", "question": {"id": qu.id, "code": qu.code, "order": qu.order}}), 201
 
 # --- Options ---
@@ -928,6 +1006,7 @@ def add_option(question_id: int):
 		op = Option(question=qu, value=value, label=label, order=order, is_other_flag=bool(payload.get("is_other")))
 		s.add(op)
 		s.commit()
+		invalidate_version(qu.section.questionnaire_version_id)
 		return jsonify({"message": "option_added", "option": {"id": op.id, "value": op.value, "order": op.order}}), 201
 
 # --- Publish Version ---
@@ -956,15 +1035,14 @@ def publish_version(version_id: int):
 		if len(codes) != len(set(codes)):
 			return _error("duplicate_codes", 409)
 		# Demote other published siblings to draft
-		siblings = v.questionnaire.versions if v.questionnaire else []
-		for sibl in siblings:
-			if sibl.id != v.id and sibl.status == "published":
-				sibl.status = "draft"
-				sibl.valid_from = None
-				sibl.valid_to = None
+		demoted = _demote_published_siblings(s, v)
 		v.status = "published"
 		v.valid_from = func.now()
 		s.commit()
+		invalidate_resolution()
+		invalidate_version(version_id)
+		for sibling_id in demoted:
+			invalidate_version(sibling_id)
 		return jsonify({"message": "published", "version": {"id": v.id, "number": v.version_number}})
 
 # --- Admin: Responses viewer endpoints ---
@@ -1005,11 +1083,8 @@ def list_responses_wide(version_id: int):
 		v = s.get(QuestionnaireVersion, version_id)
 		if not v:
 			return _error("version_not_found", 404)
-		# Build map question_id -> code for this version
-		qid_to_code = {}
-		for sec in v.sections:
-			for qu in sec.questions:
-				qid_to_code[qu.id] = qu.code
+		v_index = get_version_index(s, v)
+		qid_to_code = v_index.qid_to_code
 
 		# Subquery: latest response per assignment
 		from sqlalchemy import select as _select
@@ -1053,7 +1128,7 @@ def list_responses_wide(version_id: int):
 				items_map.setdefault(it.response_id, []).append(it)
 		# Build rows
 		base_cols = ["response_id", "assignment_id", "user_code", "status", "started_at", "submitted_at", "finalized_at", "last_activity_at", "ml_prob", "ml_decision", "ml_label", "ml_status", "ml_reason"]
-		q_codes = [qid_to_code[q.id] for sec in sorted(v.sections, key=lambda ss: ss.order) for q in sorted(sec.questions, key=lambda qq: qq.order)]
+		q_codes = list(v_index.codes)
 		result_items = []
 		for (resp, assign) in rows:
 			row = {
@@ -1096,7 +1171,7 @@ def list_responses_wide(version_id: int):
 			for it in items_map.get(resp.id, []):
 				code = qid_to_code.get(it.question_id)
 				if code:
-					row[code] = _parse_value(it)
+					row[code] = _parse_value(it, v_index, code)
 			result_items.append(row)
 		return jsonify({
 			"page": page,
@@ -1107,6 +1182,27 @@ def list_responses_wide(version_id: int):
 			"items": result_items,
 		})
 
+@admin_dynamic_bp.route("/admin/versions/<int:version_id>/options/stats", methods=["GET"])
+def option_stats_for_version(version_id: int):
+	"""Per-option answer counts of the choice questions of a version.
+
+	Query params:
+	- only_finalized: 1 to count finalized assignments only
+
+	Response: { version_id, only_finalized, items: [ { code, type, answered, invalid, options: [ { value, label, count } ] } ] }
+	"""
+	if not _enabled():
+		return _error("dynamic_disabled", 404)
+	only_finalized = (request.args.get("only_finalized") or "").strip().lower() in ("1", "true", "yes")
+	with Session(engine) as s:
+		v = s.get(QuestionnaireVersion, version_id)
+		if not v:
+			return _error("version_not_found", 404)
+		v_index = get_version_index(s, v)
+		codecs = {code: f.codec for code, f in get_validator(v_index).fields.items() if f.codec is not None}
+		items = option_stats(s, v_index, codecs, only_finalized=only_finalized)
+		return jsonify({"version_id": version_id, "only_finalized": only_finalized, "items": items})
+
 @admin_dynamic_bp.route("/admin/responses/<int:response_id>", methods=["GET"])
 def get_response_detail(response_id: int):
 	"""Return a single response with normalized items keyed by question code."""
@@ -1117,20 +1213,19 @@ def get_response_detail(response_id: int):
 		if not resp:
 			return _error("not_found", 404)
 		assign = s.get(QuestionnaireAssignment, resp.assignment_id)
-		# Build code map for that version
+		# Code map for that version (cached index)
 		qid_to_code = {}
+		v_index = None
 		if assign:
-			v = s.get(QuestionnaireVersion, assign.questionnaire_version_id)
-			if v:
-				for sec in v.sections:
-					for qu in sec.questions:
-						qid_to_code[qu.id] = qu.code
+			v_index = get_version_index(s, assign.questionnaire_version_id)
+			if v_index:
+				qid_to_code = v_index.qid_to_code
 		items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
 		answers = {}
 		for it in items:
 			code = qid_to_code.get(it.question_id)
 			if code:
-				answers[code] = _parse_value(it)
+				answers[code] = _parse_value(it, v_index, code)
 		return jsonify({
 			"response": {
 				"id": resp.id,
@@ -1146,6 +1241,25 @@ def get_response_detail(response_id: int):
 
 # --- Edit / Delete entities (draft only) ---
 
+def _demote_published_siblings(s: Session, v: QuestionnaireVersion):
+	"""Set any other published version of the same questionnaire back to draft.
+
+	Returns the demoted version ids: their cached indexes (version_index) still say
+	"published", so callers invalidate them once the change is committed.
+	"""
+	demoted = s.execute(
+		select(QuestionnaireVersion.id).where(
+			QuestionnaireVersion.questionnaire_id == v.questionnaire_id,
+			QuestionnaireVersion.id != v.id,
+			QuestionnaireVersion.status == "published",
+		)
+	).scalars().all()
+	if demoted:
+		s.query(QuestionnaireVersion).filter(QuestionnaireVersion.id.in_(demoted)).update(
+			{"status": "draft", "valid_from": None, "valid_to": None}, synchronize_session="fetch"
+		)
+	return demoted
+
 def _ensure_draft(entity):
 	if isinstance(entity, Section):
 		return entity.version.status == "draft"
@@ -1177,6 +1291,7 @@ def patch_section(section_id: int):
 		if "order" in payload and isinstance(payload.get("order"), int):
 			sec.order = payload["order"]
 		s.commit()
+		invalidate_version(sec.questionnaire_version_id)
 		return jsonify({"message": "section_updated"})
 
 @admin_dynamic_bp.route("/admin/sections/<int:section_id>", methods=["DELETE"])
@@ -1198,12 +1313,14 @@ def delete_section(section_id: int):
 					return _error("section_has_responses", 409, responses=items)
 		except Exception:
 			pass
+		version_id = sec.questionnaire_version_id
 		try:
 			s.delete(sec)
 			s.commit()
 		except IntegrityError:
 			s.rollback()
 			return _error("section_has_responses", 409)
+		invalidate_version(version_id)
 		return jsonify({"message": "section_deleted"})
 
 @admin_dynamic_bp.route("/admin/questions/<int:question_id>", methods=["PATCH"])
@@ -1211,6 +1328,12 @@ def patch_question(question_id: int):
 	if not _enabled():
 		return _error("dynamic_disabled", 404)
 	payload = request.get_json(force=True, silent=True) or {}
+	expr_err = _expression_error(payload)
+	if expr_err:
+		return _error("invalid_expression", detail=expr_err)
+	regex_err = _regex_error(payload)
+	if regex_err:
+		return _error("invalid_regex", detail=regex_err)
 	with Session(engine) as s:
 		qu = s.get(Question, question_id)
 		if not qu:
@@ -1226,11 +1349,12 @@ def patch_question(question_id: int):
 			if new_code in sibling_codes:
 				return _error("code_exists", 409)
 			qu.code = new_code
-		editable_fields = ["text", "type", "required", "order", "validation_rules", "visible_if"]
+		editable_fields = ["text", "type", "required", "order", "validation_rules", "visible_if", "is_computed", "computed_expression"]
 		for field in editable_fields:
 			if field in payload:
 				setattr(qu, field, payload[field])
 		s.commit()
+		invalidate_version(qu.section.questionnaire_version_id)
 		return jsonify({"message": "question_updated"})
 
 @admin_dynamic_bp.route("/admin/questions/<int:question_id>", methods=["DELETE"])
@@ -1250,12 +1374,14 @@ def delete_question(question_id: int):
 				return _error("question_has_responses", 409, responses=items)
 		except Exception:
 			pass
+		version_id = qu.section.questionnaire_version_id
 		try:
 			s.delete(qu)
 			s.commit()
 		except IntegrityError:
 			s.rollback()
 			return _error("question_has_responses", 409)
+		invalidate_version(version_id)
 		return jsonify({"message": "question_deleted"})
 
 @admin_dynamic_bp.route("/admin/options/<int:option_id>", methods=["PATCH"])
@@ -1282,6 +1408,7 @@ def patch_option(option_id: int):
 		if "is_other" in payload:
 			op.is_other_flag = bool(payload.get("is_other"))
 		s.commit()
+		invalidate_version(op.question.section.questionnaire_version_id)
 		return jsonify({"message": "option_updated"})
 
 @admin_dynamic_bp.route("/admin/versions/<int:version_id>/insert-icfes-package", methods=["POST"])
@@ -1295,7 +1422,7 @@ def insert_icfes_package(version_id: int):
 	- puntaje_sociales_ciudadanas
 	- puntaje_ciencias_naturales
 	- puntaje_ingles
-	- puntaje_global_saber11 (optional, computed/optional)
+	- puntaje_global_saber11 (optional, computed from the components by its computed_expression)
 	"""
 	if not _enabled():
 		return _error("dynamic_disabled", 404)
@@ -1314,7 +1441,7 @@ def insert_icfes_package(version_id: int):
 		s.add(sec)
 		def _add_q(code, text, q_order):
 			q = Question(section=sec, code=code, text=text, type="number", required=False, order=q_order,
-						validation_rules={"min": 0, "max": 100})
+						validation_rules={"min": 0, "max": 100, "critical": ["out_of_range", "not_integer"]})
 			s.add(q)
 			return q
 		q1 = _add_q("puntaje_lectura_critica", "Puntaje Lectura Crítica (0-100)", 1)
@@ -1324,9 +1451,11 @@ def insert_icfes_package(version_id: int):
 		q5 = _add_q("puntaje_ingles", "Puntaje Inglés (0-100)", 5)
 		if include_global:
 			qg = Question(section=sec, code="puntaje_global_saber11", text="Puntaje Global Saber 11 (0-500)", type="number", required=False, order=6,
-						validation_rules={"min": 0, "max": 500}, is_computed=False)
+						validation_rules={"min": 0, "max": 500, "critical": ["out_of_range", "not_integer"]},
+						is_computed=True, computed_expression={"expr": ICFES_GLOBAL_EXPRESSION})
 			s.add(qg)
 		s.commit()
+		invalidate_version(version_id)
 		return jsonify({"message": "icfes_inserted", "section": {"id": sec.id, "title": sec.title}}), 201
 
 @admin_dynamic_bp.route("/admin/options/<int:option_id>", methods=["DELETE"])
@@ -1339,8 +1468,10 @@ def delete_option(option_id: int):
 			return _error("option_not_found", 404)
 		if not _ensure_draft(op):
 			return _error("version_not_draft", 409)
+		version_id = op.question.section.questionnaire_version_id
 		s.delete(op)
 		s.commit()
+		invalidate_version(version_id)
 		return jsonify({"message": "option_deleted"})
 
 @admin_dynamic_bp.route("/admin/questionnaires/<code>", methods=["DELETE"])
@@ -1368,11 +1499,13 @@ def delete_questionnaire(code: str):
 					total_items += s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 					total_responses += s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 				total_assignments += s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+		prefill_index.forget_versions(s, [v.id for v in versions])
 		# delete versions (cascade relationships will remove sections/questions/options)
 		for v in list(q.versions):
 			s.delete(v)
 		s.delete(q)
 		s.commit()
+		invalidate_resolution()
 		return jsonify({"message": "questionnaire_deleted", "deleted": {"versions": len(versions), "assignments": total_assignments, "responses": total_responses, "items": total_items}})
 
 @admin_dynamic_bp.route("/admin/questionnaires/<code>", methods=["PATCH"])
@@ -1390,6 +1523,7 @@ def patch_questionnaire(code: str):
 			return _error("not_found", 404)
 		q.status = new_status
 		s.commit()
+		invalidate_resolution()
 		return jsonify({"message": "questionnaire_updated", "status": q.status})
 
 @admin_dynamic_bp.route("/admin/questionnaires/<code>/force-delete", methods=["DELETE"])
@@ -1412,6 +1546,7 @@ def force_delete_questionnaire(code: str):
 		if not versions:
 			s.delete(q)
 			s.commit()
+			invalidate_resolution()
 			return jsonify({"message": "questionnaire_force_deleted", "deleted": {"versions": 0, "assignments": 0, "responses": 0, "items": 0}})
 		non_archived = [v.version_number for v in versions if v.status != "archived"]
 		if non_archived:
@@ -1428,12 +1563,14 @@ def force_delete_questionnaire(code: str):
 					total_items += s.query(ResponseItem).filter(ResponseItem.response_id.in_(response_ids)).delete(synchronize_session=False)
 					total_responses += s.query(Response).filter(Response.id.in_(response_ids)).delete(synchronize_session=False)
 				total_assignments += s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(assignment_ids)).delete(synchronize_session=False)
+		prefill_index.forget_versions(s, [v.id for v in versions])
 		# Delete versions (will cascade to sections/questions/options)
 		for v in versions:
 			s.delete(v)
 		# Finally delete questionnaire
 		s.delete(q)
 		s.commit()
+		invalidate_resolution()
 		return jsonify({
 			"message": "questionnaire_force_deleted",
 			"deleted": {"versions": len(versions), "assignments": total_assignments, "responses": total_responses, "items": total_items}
@@ -1,6 +1,7 @@
 """Public endpoints for dynamic questionnaire consumption.
 """
-from flask import Blueprint, jsonify, current_app, request
+from functools import wraps
+from flask import Blueprint, jsonify, current_app, request, make_response
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import selectinload
 from time import time
@@ -9,11 +10,22 @@ from database.dynamic_models import (
 	Questionnaire, QuestionnaireVersion, Section, Question, Option,
 	QuestionnaireAssignment, Response, ResponseItem
 )
-from backend.services.dynamic_validation import validate_answers
+from backend.services.dynamic_validation import validate_answers, get_validator
 from database.controller import get_usuario_by_codigo
-from sqlalchemy import desc
 from sqlalchemy.sql import func
-from backend.services.ml_inference_service import try_infer_and_store
+from backend.services.finalize_service import finalize_answers
+from backend.services import prefill_index
+from backend.services import response_store
+from backend.services import response_events
+from backend.services import payload_limits
+from backend.services import json_schema
+from backend.services import ux_survey
+from backend.services.autosave_buffer import AutosaveBuffer
+from backend.services.idempotency import IdempotencyStore
+from backend.services.version_index import get_version_index, peek_version_index
+from backend.services.questionnaire_resolver import (
+	resolve_code, resolve_primary, active_questionnaires, invalidate_resolution
+)
 from backend.extensions import limiter
 
 dynamic_questionnaire_bp = Blueprint("dynamic_questionnaire", __name__)
@@ -22,15 +34,87 @@ dynamic_questionnaire_bp = Blueprint("dynamic_questionnaire", __name__)
 _SER_CACHE = {}
 _SER_TTL_SECONDS = 10
 
-def _serialize_version_cached(version: "QuestionnaireVersion"):
+def _serialize_version_cached(s: Session, version_id: int):
 	now = time()
-	entry = _SER_CACHE.get(version.id)
+	entry = _SER_CACHE.get(version_id)
 	if entry and (now - entry[0] < _SER_TTL_SECONDS):
 		return entry[1]
+	# Only load the full tree on a cache miss
+	version = (
+		s.query(QuestionnaireVersion)
+		.options(selectinload(QuestionnaireVersion.sections).selectinload(Section.questions).selectinload(Question.options))
+		.filter(QuestionnaireVersion.id == version_id)
+		.first()
+	)
+	if not version:
+		return None
 	payload = _serialize_version(version)
-	_SER_CACHE[version.id] = (now, payload)
+	_SER_CACHE[version_id] = (now, payload)
 	return payload
 
+# --- Idempotency-Key support for save/finalize (absorbs keepalive duplicates and retries) ---
+_IDEMPOTENCY = IdempotencyStore.from_env()
+
+def _idempotent(view):
+	"""Replay the recorded JSON response for a repeated Idempotency-Key (scoped by path + user_code)."""
+	@wraps(view)
+	def wrapper(*args, **kwargs):
+		key = (request.headers.get("Idempotency-Key") or "").strip()
+		if not key:
+			return view(*args, **kwargs)
+		payload = request.get_json(force=True, silent=True) or {}
+		user_code = (payload.get("user_code") or "").strip() if isinstance(payload, dict) else ""
+		store_key = (request.path, user_code, key[:128])
+		replay, state = _IDEMPOTENCY.begin(store_key, _IDEMPOTENCY.fingerprint(payload))
+		if state == "replay":
+			resp = jsonify(replay.body)
+			resp.status_code = replay.status
+			resp.headers["Idempotent-Replayed"] = "true"
+			return resp
+		if state == "mismatch":
+			return jsonify({"error": "idempotency_key_reused"}), 422
+		if state == "in_progress":
+			return jsonify({"error": "request_in_progress"}), 409
+		try:
+			resp = make_response(view(*args, **kwargs))
+		except Exception:
+			_IDEMPOTENCY.abort(store_key)
+			raise
+		_IDEMPOTENCY.finish(store_key, resp.status_code, resp.get_json(silent=True))
+		return resp
+	return wrapper
+
+def _resolve_target(s: Session, code: str):
+	"""Resolve a questionnaire code to (ResolvedQuestionnaire, target version).
+
+	Target is the latest published version, else the latest draft. Uses the
+	resolution cache, so the only query is the primary-key load of the version.
+	"""
+	rq = resolve_code(s, code)
+	if rq and rq.target_version_id:
+		version = s.get(QuestionnaireVersion, rq.target_version_id)
+		if version is not None:
+			return rq, version
+		# Stale snapshot (version removed by another worker): rebuild once
+		invalidate_resolution()
+		rq = resolve_code(s, code)
+	if not rq:
+		return None, None
+	return rq, (s.get(QuestionnaireVersion, rq.target_version_id) if rq.target_version_id else None)
+
+def _resolve_target_index(s: Session, code: str):
+	"""Like _resolve_target but returns the cached VersionIndex of the target version.
+
+	A recently verified published index is used without loading the version row.
+	"""
+	rq = resolve_code(s, code)
+	if rq and rq.published_version_id:
+		v_index = peek_version_index(rq.published_version_id)
+		if v_index is not None:
+			return rq, v_index
+	rq, version = _resolve_target(s, code)
+	return rq, (get_version_index(s, version) if version is not None else None)
+
 @dynamic_questionnaire_bp.route("/dynamic/overview", methods=["GET"])
 def dynamic_overview():
 	"""Return combined data to minimize client round-trips.
@@ -47,72 +131,42 @@ def dynamic_overview():
 	with Session(engine) as s:
 		# Primary
 		primary_payload = {"questionnaire": None, "user": None}
-		q_primary = (
-			s.query(Questionnaire)
-			.options(selectinload(Questionnaire.versions).selectinload(QuestionnaireVersion.sections).selectinload(Section.questions).selectinload(Question.options))
-			.filter(Questionnaire.is_primary == True, Questionnaire.status == "active")
-			.first()
-		)
+		q_primary = resolve_primary(s)
 		if q_primary:
-			versions_sorted = sorted(q_primary.versions, key=lambda v: v.version_number, reverse=True)
-			v_primary = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
-			if v_primary:
-				primary_payload["questionnaire"] = _serialize_version_cached(v_primary)
+			v_primary_id = q_primary.target_version_id
+			if v_primary_id:
+				primary_payload["questionnaire"] = _serialize_version_cached(s, v_primary_id)
 				if user_code:
-					assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=v_primary.id).order_by(desc(QuestionnaireAssignment.last_activity_at)).first()
+					_flush_autosave(user_code, v_primary_id)
+					assign = response_store.find_assignment(s, user_code, v_primary_id)
 					if assign:
-						resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
+						resp = response_store.current_response(s, assign.id)
 						answers = {}
 						if resp:
-							qmap = {}
-							for sec in v_primary.sections:
-								for qu in sec.questions:
-									qmap[qu.id] = qu.code
-							items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
-							for it in items:
-								code_key = qmap.get(it.question_id)
-								if not code_key:
-									continue
-								answers[code_key] = _parse_value(it)
+							answers = _load_answers(s, resp, get_version_index(s, v_primary_id))
 						primary_payload["user"] = {"status": assign.status, "answers": answers}
 		# Items for user
 		result_items = []
-		qs = (
-			s.query(Questionnaire)
-			.options(selectinload(Questionnaire.versions).selectinload(QuestionnaireVersion.sections).selectinload(Section.questions))
-			.filter(Questionnaire.status == "active")
-			.all()
-		)
-		for q in qs:
+		for q in active_questionnaires(s):
 			# Ocultar cuestionario primario y encuesta de usabilidad
-			if getattr(q, 'is_primary', False) or q.code == 'ux_survey':
+			if q.is_primary or q.code == 'ux_survey':
 				continue
-			versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-			target_version = next((v for v in versions_sorted if v.status == "published"), None)
-			if not target_version:
+			if not q.published_version_id:
 				continue
-			total_questions = sum(len(sec.questions) for sec in target_version.sections)
 			status = "new"
 			progress = 0
 			finalized_at = None
 			submitted_at = None
 			if user_code:
-				assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=target_version.id).order_by(desc(QuestionnaireAssignment.last_activity_at)).first()
+				assign = response_store.find_assignment(s, user_code, q.published_version_id)
 				if assign:
 					status = assign.status
-					resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
-					answered = 0
+					# Materialized on save/finalize/submit; no item scan needed
+					progress = assign.progress_percent or 0
+					resp = response_store.current_response(s, assign.id)
 					if resp:
-						items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
-						for it in items:
-							if it.numeric_value is not None:
-								answered += 1
-							elif it.value is not None and str(it.value).strip() != "":
-								answered += 1
 						finalized_at = resp.finalized_at.isoformat() if resp.finalized_at else None
 						submitted_at = resp.submitted_at.isoformat() if resp.submitted_at else None
-					if total_questions > 0:
-						progress = max(0, min(100, int(round((answered / total_questions) * 100))))
 			result_items.append({
 				"code": q.code,
 				"title": q.title,
@@ -128,21 +182,14 @@ def list_questionnaires():
 	if not _feature_enabled():
 		return jsonify({"message": "Dynamic questionnaires disabled"}), 404
 	with Session(engine) as session:
-		qs = (
-			session.query(Questionnaire)
-			.options(selectinload(Questionnaire.versions))
-			.filter(Questionnaire.status == "active")
-			.all()
-		)
 		data = []
-		for q in qs:
+		for q in active_questionnaires(session):
 			# Ocultar el cuestionario principal del listado público
-			if getattr(q, 'is_primary', False) or q.code == 'ux_survey':
+			if q.is_primary or q.code == 'ux_survey':
 				continue
-			has_published = any(v.status == "published" for v in q.versions)
-			if not has_published:
+			if not q.published_version_id:
 				continue
-			data.append({"code": q.code, "title": q.title, "status": q.status, "versions": len(q.versions)})
+			data.append({"code": q.code, "title": q.title, "status": q.status, "versions": q.version_count})
 	return jsonify({"items": data})
 
 @dynamic_questionnaire_bp.route("/dynamic/primary", methods=["GET"])
@@ -151,19 +198,12 @@ def get_primary_questionnaire():
 	if not _feature_enabled():
 		return jsonify({"message": "Dynamic questionnaires disabled"}), 404
 	with Session(engine) as session:
-		q = (
-			session.query(Questionnaire)
-			.options(selectinload(Questionnaire.versions).selectinload(QuestionnaireVersion.sections).selectinload(Section.questions).selectinload(Question.options))
-			.filter(Questionnaire.is_primary == True, Questionnaire.status == "active")
-			.first()
-		)
+		q = resolve_primary(session)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		version = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
-		if not version:
+		structure = _serialize_version_cached(session, q.target_version_id) if q.target_version_id else None
+		if not structure:
 			return jsonify({"error": "no_versions"}), 404
-		structure = _serialize_version_cached(version)
 	return jsonify({"questionnaire": structure})
 
 @dynamic_questionnaire_bp.route("/dynamic/questionnaires/<code>", methods=["GET"])
@@ -171,20 +211,13 @@ def get_questionnaire(code: str):
 	if not _feature_enabled():
 		return jsonify({"message": "Dynamic questionnaires disabled"}), 404
 	with Session(engine) as session:
-		q = (
-			session.query(Questionnaire)
-			.options(selectinload(Questionnaire.versions).selectinload(QuestionnaireVersion.sections).selectinload(Section.questions).selectinload(Question.options))
-			.filter_by(code=code)
-			.first()
-		)
+		q = resolve_code(session, code)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
 		# prefer latest published; if none, fallback to latest draft
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		version = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
-		if not version:
+		structure = _serialize_version_cached(session, q.target_version_id) if q.target_version_id else None
+		if not structure:
 			return jsonify({"error": "no_versions"}), 404
-		structure = _serialize_version_cached(version)
 	return jsonify({"questionnaire": structure})
 
 @dynamic_questionnaire_bp.route("/dynamic/questionnaires/<code>/responses", methods=["POST"])
@@ -209,36 +242,35 @@ def submit_response(code: str):
 	from sqlalchemy.orm import Session
 	from database.controller import engine
 	with Session(engine) as s:
-		q = s.query(Questionnaire).filter_by(code=code).first()
+		q, target_version = _resolve_target(s, code)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
 		# choose version: prefer latest published else latest draft
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		target_version = None
-		for v in versions_sorted:
-			if v.status == "published":
-				target_version = v
-				break
-		if not target_version and versions_sorted:
-			target_version = versions_sorted[0]
 		if not target_version:
 			return jsonify({"error": "no_version"}), 409
-		ok, errs, normalized = validate_answers(target_version, answers)
+		v_index = get_version_index(s, target_version)
+		# Known codes only, per-field caps (cheap, before validation)
+		answers, limit_errs = payload_limits.bound_answers(v_index, answers)
+		if limit_errs:
+			return jsonify({"error": "validation", "details": limit_errs, "mode": "limits"}), 400
+		ok, errs, normalized = validate_answers(v_index, answers)
 		if not ok:
 			return jsonify({"error": "validation", "details": errs}), 400
-		# Rebuild question map for persistence
-		question_map = {}
-		for sec in target_version.sections:
-			for qu in sec.questions:
-				question_map[qu.code] = qu
+		question_map = v_index.by_code
 	# Persist
-		assign = QuestionnaireAssignment(user_code=user_code, questionnaire_version_id=target_version.id, status="submitted")
-		s.add(assign)
-		s.flush()
-		resp = Response(assignment_id=assign.id)
-		s.add(resp)
-		s.flush()
-		_upsert_items(s, resp.id, question_map, normalized)
+		# One assignment per (user_code, version); anonymous submissions always get a new one
+		assign, _ = response_store.get_or_create_assignment(s, user_code, target_version.id, status="submitted")
+		if assign.status == "finalized":
+			return jsonify({"error": "finalized"}), 409
+		assign.status = "submitted"
+		resp, _ = response_store.get_or_create_response(s, assign.id)
+		# Logged autosaves are older than this payload; fold them first so compaction cannot overwrite it
+		if _EVENTS.enabled and response_events.compact_response(s, resp, assign, v_index) is None:
+			s.rollback()
+			return jsonify({"error": "revision_conflict"}), 409
+		result = _upsert_items(s, resp.id, question_map, normalized)
+		_apply_progress(assign, result.answered_delta, len(question_map))
+		_record_prefill(s, user_code, question_map, normalized, target_version.id)
 		s.commit()
 		return jsonify({"message": "stored", "version_id": target_version.id, "response_id": resp.id, "assignment_id": assign.id}), 201
 
@@ -250,37 +282,19 @@ def get_my_dynamic_status(code: str):
 	if not user_code:
 		return jsonify({"error": "missing_user_code"}), 400
 	with Session(engine) as s:
-		q = s.query(Questionnaire).filter_by(code=code).first()
+		q, target_version = _resolve_target(s, code)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		target_version = None
-		for v in versions_sorted:
-			if v.status == "published":
-				target_version = v
-				break
-		if not target_version and versions_sorted:
-			target_version = versions_sorted[0]
 		if not target_version:
 			return jsonify({"error": "no_version"}), 409
-		assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=target_version.id).order_by(desc(QuestionnaireAssignment.last_activity_at)).first()
+		_flush_autosave(user_code, target_version.id)
+		assign = response_store.find_assignment(s, user_code, target_version.id)
 		if not assign:
 			return jsonify({"status": "new", "answers": {} })
-		# take latest response for assignment
-		resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
+		resp = response_store.current_response(s, assign.id)
 		answers = {}
 		if resp:
-			# build code map for question ids
-			question_map = {}
-			for sec in target_version.sections:
-				for qu in sec.questions:
-					question_map[qu.id] = qu.code
-			items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
-			for it in items:
-				code_key = question_map.get(it.question_id)
-				if not code_key:
-					continue
-				answers[code_key] = _parse_value(it)
+			answers = _load_answers(s, resp, get_version_index(s, target_version))
 		# include persisted ML summary (if any) so the student can always see their report in read-only mode
 		ml_payload = None
 		if resp and isinstance(getattr(resp, "summary_cache", None), dict):
@@ -291,96 +305,146 @@ def get_my_dynamic_status(code: str):
 		resp_payload = {
 			"status": assign.status,
 			"answers": answers,
-			"ml": ml_payload
+			"ml": ml_payload,
+			"revision": (resp.revision or 0) if resp else 0,
 		}
 		# Si el cuestionario es primario y está finalizado, verificar encuesta UX
 		try:
-			if assign.status == 'finalized':
-				q_primary = s.query(Questionnaire).filter_by(code=code).first()
-				if q_primary and getattr(q_primary, 'is_primary', False):
-					ux_q = s.query(Questionnaire).filter_by(code='ux_survey').first()
-					if ux_q:
-						vers_sorted = sorted(ux_q.versions, key=lambda v: v.version_number, reverse=True)
-						ux_pub = next((v for v in vers_sorted if v.status=='published'), vers_sorted[0] if vers_sorted else None)
-						if ux_pub:
-							assign_ux = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=ux_pub.id).first()
-							if not (assign_ux and assign_ux.status=='finalized'):
-								resp_payload['ux_survey_prompt'] = True
+			if assign.status == 'finalized' and q.is_primary:
+				if ux_survey.is_pending(s, user_code):
+					resp_payload['ux_survey_prompt'] = True
 		except Exception:
 			pass
 		return jsonify(resp_payload)
 
+@dynamic_questionnaire_bp.route("/dynamic/questionnaires/<code>/schema", methods=["GET"])
+def get_questionnaire_schema(code: str):
+	"""JSON Schema of the target version's validation rules (client pre-validation).
+
+	Cached per version index with a strong ETag; If-None-Match answers 304.
+	"""
+	if not _feature_enabled():
+		return jsonify({"error": "disabled"}), 404
+	with Session(engine) as s:
+		q, v_index = _resolve_target_index(s, code)
+		if not q:
+			return jsonify({"error": "not_found"}), 404
+		if v_index is None:
+			return jsonify({"error": "no_version"}), 409
+	doc = json_schema.schema_document(v_index)
+	if doc.matches(request.headers.get("If-None-Match")):
+		resp = make_response("", 304)
+	else:
+		resp = make_response(doc.body)
+		resp.headers["Content-Type"] = "application/schema+json"
+	resp.headers["ETag"] = doc.etag
+	# revalidate every time: a 304 costs no serialization and picks up new versions
+	resp.headers["Cache-Control"] = "no-cache"
+	return resp
+
 @dynamic_questionnaire_bp.route("/dynamic/questionnaires/<code>/save", methods=["POST"])
+@_idempotent
 def save_response(code: str):
+	"""Autosave (partial) answers.
+
+	Payload: { user_code, answers: {...} } (full snapshot, legacy) or
+	{ user_code, changes: {...}, base_revision: <int> } (delta).
+	Delta saves validate only the changed questions and their dependents, using the
+	stored answers as context. Only changed items are written; the response revision
+	is advanced with an optimistic check and a stale base_revision returns 409.
+	"""
 	if not _feature_enabled():
 		return jsonify({"error": "disabled"}), 404
 	payload = request.get_json(force=True, silent=True) or {}
 	user_code = (payload.get("user_code") or "").strip() or None
-	answers = payload.get("answers") or {}
+	changes = payload.get("changes")
+	delta_mode = changes is not None
+	answers = changes if delta_mode else (payload.get("answers") or {})
 	if not isinstance(answers, dict) or not user_code:
 		return jsonify({"error": "invalid_payload"}), 400
+	base_revision = payload.get("base_revision")
+	if base_revision is not None:
+		try:
+			base_revision = int(base_revision)
+		except (TypeError, ValueError):
+			return jsonify({"error": "invalid_payload"}), 400
 	with Session(engine) as s:
-		q = s.query(Questionnaire).filter_by(code=code).first()
+		q, target_version = _resolve_target(s, code)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		target_version = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
 		if not target_version:
 			return jsonify({"error": "no_version"}), 409
-		# Build question map
-		question_map = {}
-		for sec in target_version.sections:
-			for qu in sec.questions:
-				question_map[qu.code] = qu
-		# Find or create assignment
-		assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=target_version.id).first()
-		if assign and assign.status == "finalized":
+		v_index = get_version_index(s, target_version)
+		question_map = v_index.by_code
+		# Known codes only, per-field caps (cheap, before any write or validation)
+		answers, limit_errs = payload_limits.bound_answers(v_index, answers)
+		if limit_errs:
+			return jsonify({"error": "validation", "details": limit_errs, "mode": "limits"}), 400
+		# Find or create assignment/response (atomic insert-if-absent, unique per user + version)
+		assign, assign_created = response_store.get_or_create_assignment(s, user_code, target_version.id)
+		if assign.status == "finalized":
 			return jsonify({"error": "finalized"}), 409
-		if not assign:
-			assign = QuestionnaireAssignment(user_code=user_code, questionnaire_version_id=target_version.id, status="in_progress")
-			s.add(assign)
-			s.flush()
-		# Find or create response
-		resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
-		if not resp:
-			resp = Response(assignment_id=assign.id)
-			s.add(resp)
-			s.flush()
+		resp, resp_created = response_store.get_or_create_response(s, assign.id)
+		created = assign_created or resp_created
+		current_revision = resp.revision or 0
+		# Values still held by the write-behind buffer count as the current state
+		pending = _AUTOSAVE.peek(user_code, target_version.id) if _AUTOSAVE.enabled else None
+		if pending is not None and pending.response_id != resp.id:
+			pending = None
+		if pending is not None:
+			current_revision = pending.pending_revision
+		# Event log mode: snapshot + pending events is the current state (one read, reused below)
+		state = response_events.load_state(s, resp) if _EVENTS.enabled else None
+		if base_revision is not None and base_revision != current_revision:
+			return jsonify({"error": "revision_conflict", "revision": current_revision}), 409
 		# validation with strict partial rules: block certain critical errors
-		ok, errs, normalized = validate_answers(target_version, answers)
-		# Determine critical errors that must block save
-		icfes_codes = {
-			"puntaje_lectura_critica",
-			"puntaje_matematicas",
-			"puntaje_sociales_ciudadanas",
-			"puntaje_ciencias_naturales",
-			"puntaje_ingles",
-			"puntaje_global_saber11",
-		}
-		date_errs = {"invalid_date", "before_min_date", "after_max_date", "before_other_date", "after_other_date", "min_age", "max_age"}
-		critical = {}
-		for k, v in (errs or {}).items():
-			# Missing inline 'otro_' when selected
-			if isinstance(k, str) and k.startswith("otro_") and v == "required":
-				critical[k] = v; continue
-			# ICFES strict rules
-			if k in icfes_codes and v in ("out_of_range", "not_integer"):
-				critical[k] = v; continue
-			# Date bounds invalid
-			q = question_map.get(k)
-			if q is not None and getattr(q, "type", None) == "date" and isinstance(v, str) and v in date_errs:
-				critical[k] = v; continue
-			# Invalid options for choice/multi
-			if v == "invalid_option" or v == "not_array" or (isinstance(v, dict) and v.get("invalid_options")):
-				critical[k] = v; continue
+		validator = get_validator(v_index)
+		if delta_mode:
+			touched = {k for k in answers if k in question_map}
+			context = _load_answers(s, resp, v_index, state)
+			if pending is not None:
+				context.update(pending.values)
+			context.update(answers)
+			# changed questions + everything whose visibility/validation cascades from them
+			# null in changes = answer cleared (item emptied)
+			ok, errs, normalized = validator.validate_partial(context, answers.keys(), clear_nulls=True)
+			blocking_scope = touched | {f"otro_{k}" for k in touched} | {k for k in answers if k.startswith("otro_")}
+		else:
+			ok, errs, normalized = validator.validate_partial(answers, answers.keys())
+			blocking_scope = None
+		# Critical errors (per-question policy, see dynamic_validation) block the save
+		critical = validator.critical_errors(errs, blocking_scope)
 		if critical:
 			return jsonify({"error": "validation", "details": errs, "critical": critical, "mode": "save_strict"}), 400
-		_upsert_items(s, resp.id, question_map, normalized)
+		if _AUTOSAVE.enabled and not created:
+			# Coalesce with other saves of this response; written by the buffer within the window
+			revision = _AUTOSAVE.add(user_code, target_version.id, assign.id, resp.id, resp.revision or 0, normalized)
+			return jsonify({"message": "saved", "assignment_id": assign.id, "response_id": resp.id, "revision": revision, "buffered": True})
+		if _EVENTS.enabled:
+			# Append-only: changed answers become dq_response_event rows; compaction
+			# updates the items, progress and prefill index later
+			written = response_events.append_events(s, resp.id, question_map, normalized, state)
+			revision = _advance_revision(s, resp, response_store.UpsertResult(0, written))
+			if revision is None:
+				s.rollback()
+				return jsonify({"error": "revision_conflict"}), 409
+			assign.status = "in_progress"
+			s.commit()
+			_EVENTS.notify()
+			return jsonify({"message": "saved", "assignment_id": assign.id, "response_id": resp.id, "revision": revision})
+		result = _upsert_items(s, resp.id, question_map, normalized)
+		revision = _advance_revision(s, resp, result)
+		if revision is None:
+			s.rollback()
+			return jsonify({"error": "revision_conflict"}), 409
+		_apply_progress(assign, result.answered_delta, len(question_map))
+		_record_prefill(s, user_code, question_map, normalized, target_version.id)
 		assign.status = "in_progress"
 		s.commit()
-		return jsonify({"message": "saved", "assignment_id": assign.id, "response_id": resp.id})
+		return jsonify({"message": "saved", "assignment_id": assign.id, "response_id": resp.id, "revision": revision})
 
 @dynamic_questionnaire_bp.route("/dynamic/questionnaires/<code>/finalize", methods=["POST"])
+@_idempotent
 def finalize_response(code: str):
 	if not _feature_enabled():
 		return jsonify({"error": "disabled"}), 404
@@ -389,61 +453,38 @@ def finalize_response(code: str):
 	answers = payload.get("answers") or {}
 	if not isinstance(answers, dict) or not user_code:
 		return jsonify({"error": "invalid_payload"}), 400
-	with Session(engine) as s:
-		q = s.query(Questionnaire).filter_by(code=code).first()
+	# expire_on_commit=False: ids and summary are read after commit without refresh queries
+	with Session(engine, expire_on_commit=False) as s:
+		q, v_index = _resolve_target_index(s, code)
 		if not q:
 			return jsonify({"error": "not_found"}), 404
-		versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-		target_version = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
-		if not target_version:
+		if not v_index:
 			return jsonify({"error": "no_version"}), 409
+		# Known codes only, per-field caps (cheap, before validation)
+		answers, limit_errs = payload_limits.bound_answers(v_index, answers)
+		if limit_errs:
+			return jsonify({"error": "validation", "details": limit_errs, "mode": "limits"}), 400
+		# Buffered autosaves must land before finalize reads/writes the response
+		_flush_autosave(user_code, v_index.version_id)
 		# validate strictly
-		ok, errs, normalized = validate_answers(target_version, answers)
+		ok, errs, normalized = validate_answers(v_index, answers)
 		if not ok:
 			return jsonify({"error": "validation", "details": errs}), 400
-		# Build map
-		question_map = {}
-		for sec in target_version.sections:
-			for qu in sec.questions:
-				question_map[qu.code] = qu
-		# Find or create assignment
-		assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=target_version.id).first()
-		if not assign:
-			assign = QuestionnaireAssignment(user_code=user_code, questionnaire_version_id=target_version.id, status="in_progress")
-			s.add(assign)
-			s.flush()
-		# Response
-		resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
-		if not resp:
-			resp = Response(assignment_id=assign.id)
-			s.add(resp)
-			s.flush()
-		_upsert_items(s, resp.id, question_map, normalized)
-		# Attempt ML inference (safe no-op if no binding/config)
-		ml_summary = try_infer_and_store(s, target_version, resp, normalized, question_map)
-		assign.status = "finalized"
-		resp.finalized_at = func.now()
-		resp.submitted_at = func.now()
+		# UX survey assignment is fetched together with this one unless already known as answered
+		ux_vid = ux_survey.version_id(s) if q.is_primary else None
+		if ux_survey.is_known_completed(ux_vid, user_code):
+			ux_vid = None
+		outcome = finalize_answers(s, v_index, user_code, normalized, ux_vid, compact_events=_EVENTS.enabled)
+		if outcome.conflict:
+			s.rollback()
+			return jsonify({"error": "revision_conflict"}), 409
 		s.commit()
-		# Include ml summary
-		payload = {"message": "finalized", "assignment_id": assign.id, "response_id": resp.id}
-		if isinstance(getattr(resp, "summary_cache", None), dict) and resp.summary_cache.get("ml"):
-			payload["ml"] = resp.summary_cache.get("ml")
-		else:
-			payload["ml"] = ml_summary if isinstance(ml_summary, dict) else None
+		if ux_vid and not outcome.ux_pending:
+			ux_survey.mark_completed(ux_vid, user_code)
+		payload = {"message": "finalized", "assignment_id": outcome.assignment_id, "response_id": outcome.response_id, "ml": outcome.ml}
 		# Trigger encuesta UX si corresponde (primario y no contestada)
-		try:
-			if getattr(q, 'is_primary', False):
-				ux_q = s.query(Questionnaire).filter_by(code='ux_survey').first()
-				if ux_q:
-					vers_sorted = sorted(ux_q.versions, key=lambda v: v.version_number, reverse=True)
-					ux_pub = next((v for v in vers_sorted if v.status=='published'), vers_sorted[0] if vers_sorted else None)
-					if ux_pub:
-						assign_ux = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=ux_pub.id).first()
-						if not (assign_ux and assign_ux.status=='finalized'):
-							payload['ux_survey_prompt'] = True
-		except Exception:
-			pass
+		if outcome.ux_pending:
+			payload['ux_survey_prompt'] = True
 		return jsonify(payload)
 
 # --- Encuesta UX: estado y envío ---
@@ -456,26 +497,15 @@ def ux_survey_status():
 	if not user_code:
 		return jsonify({'error': 'missing_user_code'}), 400
 	with Session(engine) as s:
-		ux_q = s.query(Questionnaire).filter_by(code='ux_survey').first()
-		if not ux_q:
-			return jsonify({'error': 'not_configured'}), 404
-		vers_sorted = sorted(ux_q.versions, key=lambda v: v.version_number, reverse=True)
-		ux_pub = next((v for v in vers_sorted if v.status=='published'), vers_sorted[0] if vers_sorted else None)
-		if not ux_pub:
+		survey = ux_survey.get_survey(s)
+		if not survey:
+			if not resolve_code(s, ux_survey.UX_SURVEY_CODE):
+				return jsonify({'error': 'not_configured'}), 404
 			return jsonify({'error': 'no_version'}), 409
-		assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=ux_pub.id).first()
-		if assign and assign.status=='finalized':
+		if not ux_survey.is_pending(s, user_code):
 			return jsonify({'done': True})
-		# build estructura ligera
-		questions_payload = []
-		for sec in sorted(ux_pub.sections, key=lambda sc: sc.order):
-			for qu in sorted(sec.questions, key=lambda qq: qq.order):
-				questions_payload.append({
-					'code': qu.code,
-					'text': qu.text,
-					'options': [ {'value': op.value, 'label': op.label} for op in sorted(qu.options, key=lambda o: o.order) ]
-				})
-		return jsonify({'done': False, 'structure': {'code': 'ux_survey', 'title': ux_q.title, 'version_id': ux_pub.id, 'questions': questions_payload}})
+		# estructura ligera precalculada (cache por versión)
+		return jsonify({'done': False, 'structure': survey.structure()})
 
 @dynamic_questionnaire_bp.route('/dynamic/ux-survey/submit', methods=['POST'])
 @limiter.limit('5 per minute')
@@ -494,42 +524,23 @@ def ux_survey_submit():
 	if missing or invalid:
 		return jsonify({'error': 'validation', 'missing': missing, 'invalid': invalid}), 400
 	with Session(engine) as s:
-		ux_q = s.query(Questionnaire).filter_by(code='ux_survey').first()
-		if not ux_q:
-			return jsonify({'error': 'not_configured'}), 404
-		vers_sorted = sorted(ux_q.versions, key=lambda v: v.version_number, reverse=True)
-		ux_pub = next((v for v in vers_sorted if v.status=='published'), vers_sorted[0] if vers_sorted else None)
-		if not ux_pub:
+		survey = ux_survey.get_survey(s)
+		if not survey:
+			if not resolve_code(s, ux_survey.UX_SURVEY_CODE):
+				return jsonify({'error': 'not_configured'}), 404
 			return jsonify({'error': 'no_version'}), 409
-		assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=ux_pub.id).first()
-		if assign and assign.status=='finalized':
+		if ux_survey.is_known_completed(survey.version_id, user_code):
 			return jsonify({'message': 'already_finalized'}), 200
-		if not assign:
-			assign = QuestionnaireAssignment(user_code=user_code, questionnaire_version_id=ux_pub.id, status='in_progress')
-			s.add(assign)
-			s.flush()
-		resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
-		if not resp:
-			resp = Response(assignment_id=assign.id)
-			s.add(resp)
-			s.flush()
-		# map preguntas
-		qmap = {}
-		for sec in ux_pub.sections:
-			for qu in sec.questions:
-				qmap[qu.code] = qu
-		for code_key, value in answers.items():
-			qu = qmap.get(code_key)
-			if not qu:
-				continue
-			item = s.query(ResponseItem).filter_by(response_id=resp.id, question_id=qu.id).first()
-			val_str = str(value)
-			num_val = int(val_str)
-			if item:
-				item.value = val_str
-				item.numeric_value = num_val
-			else:
-				s.add(ResponseItem(response_id=resp.id, question_id=qu.id, value=val_str, numeric_value=num_val))
+		assign, _ = response_store.get_or_create_assignment(s, user_code, survey.version_id)
+		if assign.status=='finalized':
+			ux_survey.mark_completed(survey.version_id, user_code)
+			return jsonify({'message': 'already_finalized'}), 200
+		resp, _ = response_store.get_or_create_response(s, assign.id)
+		# map preguntas: validated Likert answers, stored with the columns of each question type
+		qmap = (peek_version_index(survey.version_id) or get_version_index(s, survey.version_id)).by_code
+		encoded = {qmap[c].id: _ux_encoded(qmap[c].type, answers[c]) for c in required_codes if c in qmap}
+		result = response_store.upsert_encoded(s, resp.id, encoded)
+		_apply_progress(assign, result.answered_delta, len(qmap))
 		assign.status = 'finalized'
 		resp.finalized_at = func.now()
 		# Optional comment stored in summary_cache (no change de estructura)
@@ -542,10 +553,21 @@ def ux_survey_submit():
 			pass
 		resp.submitted_at = func.now()
 		s.commit()
+		ux_survey.mark_completed(survey.version_id, user_code)
 		return jsonify({'message': 'stored', 'assignment_id': assign.id, 'response_id': resp.id}), 201
 
 # --- Helpers ---
 
+def _ux_encoded(qtype: str, value):
+	"""Likert answer ('1'..'5') -> EncodedValue: numbers for number/scale_1_5 questions, the option value otherwise."""
+	text = str(value)
+	return response_store.encode_value(qtype, int(text) if qtype in ('number', 'scale_1_5') else text)
+
+@dynamic_questionnaire_bp.app_errorhandler(413)
+def _payload_too_large(e):
+	# Body above MAX_CONTENT_LENGTH (DQ_MAX_REQUEST_BYTES); rejected before parsing
+	return jsonify({"error": "payload_too_large", "max_bytes": payload_limits.MAX_REQUEST_BYTES}), 413
+
 def _feature_enabled():
 	return True
 
@@ -572,6 +594,7 @@ def _serialize_version(version: QuestionnaireVersion):
 						"validation_rules": getattr(qu, "validation_rules", None),
 						"visible_if": getattr(qu, "visible_if", None),
 						"required": qu.required,
+						"is_computed": bool(getattr(qu, "is_computed", False)),
 						"order": qu.order,
 						"options": [
 							{"value": op.value, "label": op.label, "is_other": op.is_other_flag, "order": op.order}
@@ -585,42 +608,82 @@ def _serialize_version(version: QuestionnaireVersion):
 		],
 	}
 
-def _parse_value(item: ResponseItem):
-	if item.numeric_value is not None:
-		return item.numeric_value
-	if item.value is None:
+def _upsert_items(s: Session, response_id: int, question_map_by_code: dict, normalized: dict):
+	"""Insert/update items for a response (bulk: one read, one INSERT batch, one UPDATE batch).
+
+	Returns an UpsertResult; answered_delta (new answers minus cleared ones) lets callers
+	keep QuestionnaireAssignment.answered_count in sync within the same transaction.
+	"""
+	return response_store.upsert_items(s, response_id, question_map_by_code, normalized)
+
+def _advance_revision(s: Session, resp: Response, result):
+	"""Bump the response revision if items were written. None means a concurrent writer won."""
+	current = resp.revision or 0
+	if not result.written:
+		return current
+	if not response_store.bump_revision(s, resp.id, current):
 		return None
-	# handle boolean stored as string
-	if item.value in ("true", "false"):
-		return item.value == "true"
-	# handle CSV for multi_choice
-	if "," in item.value and item.value.count(",") >= 1:
-		return [v for v in item.value.split(",") if v]
-	return item.value
+	return current + 1
 
-def _upsert_items(s: Session, response_id: int, question_map_by_code: dict, normalized: dict):
-	# we need a map from code->question for ids
-	for code_key, value in normalized.items():
-		qu = question_map_by_code.get(code_key)
-		if not qu:
-			continue
-		item = s.query(ResponseItem).filter_by(response_id=response_id, question_id=qu.id).first()
-		item_kwargs = {"value": None, "numeric_value": None}
-		if qu.type in ("number", "scale_1_5") and isinstance(value, int):
-			item_kwargs["numeric_value"] = value
-			item_kwargs["value"] = str(value)
-		elif qu.type == "boolean":
-			item_kwargs["numeric_value"] = 1 if value else 0
-			item_kwargs["value"] = "true" if value else "false"
-		elif qu.type == "multi_choice":
-			item_kwargs["value"] = ",".join(value)
-		else:
-			item_kwargs["value"] = str(value) if value is not None else None
-		if item:
-			item.value = item_kwargs["value"]
-			item.numeric_value = item_kwargs["numeric_value"]
-		else:
-			s.add(ResponseItem(response_id=response_id, question_id=qu.id, **item_kwargs))
+# Optional append-only answer log (DQ_RESPONSE_EVENTS); compacted in the background
+_EVENTS = response_events.EventCompactor.from_env(lambda: Session(engine))
+
+def _write_buffered_save(entry):
+	"""AutosaveBuffer writer: persist coalesced values of one response in one transaction."""
+	with Session(engine) as s:
+		assign = s.get(QuestionnaireAssignment, entry.assignment_id)
+		resp = s.get(Response, entry.response_id)
+		if not assign or not resp or assign.status == "finalized":
+			return  # finalize (full payload) is authoritative; drop stale buffered values
+		question_map = get_version_index(s, entry.version_id).by_code
+		current = resp.revision or 0
+		# Keep the revision the client was given unless someone else wrote meanwhile
+		resp.revision = entry.pending_revision if current == entry.base_revision else current + 1
+		if _EVENTS.enabled:
+			response_events.append_events(s, resp.id, question_map, entry.values, response_events.load_state(s, resp))
+			s.commit()
+			_EVENTS.notify()
+			return
+		result = _upsert_items(s, resp.id, question_map, entry.values)
+		_apply_progress(assign, result.answered_delta, len(question_map))
+		_record_prefill(s, entry.user_code, question_map, entry.values, entry.version_id)
+		s.commit()
+
+_AUTOSAVE = AutosaveBuffer.from_env(_write_buffered_save)
+
+def _flush_autosave(user_code, version_id):
+	if _AUTOSAVE.enabled and user_code:
+		_AUTOSAVE.flush_key(user_code, version_id)
+
+def _load_answers(s: Session, resp: Response, v_index, state=None) -> dict:
+	"""Stored answers of a response keyed by question code (typed columns, no string heuristics).
+
+	In event log mode the pending events are applied on top of the items (``state``
+	from response_events.load_state can be passed when the caller already has it).
+	"""
+	if state is None and _EVENTS.enabled:
+		state = response_events.load_state(s, resp)
+	if state is not None:
+		return {
+			v_index.qid_to_code[qid]: response_store.decode_item(enc, v_index.by_code[v_index.qid_to_code[qid]].type)
+			for qid, enc in state.items()
+			if qid in v_index.qid_to_code
+		}
+	answers = {}
+	for it in s.query(ResponseItem).filter_by(response_id=resp.id).all():
+		code_key = v_index.qid_to_code.get(it.question_id)
+		if code_key:
+			answers[code_key] = response_store.decode_item(it, v_index.by_code[code_key].type)
+	return answers
+
+def _apply_progress(assign: QuestionnaireAssignment, answered_delta: int, total_questions: int):
+	"""Update the materialized answered_count/progress_percent of an assignment."""
+	response_store.apply_progress(assign, answered_delta, total_questions)
+
+def _record_prefill(s: Session, user_code, question_map_by_code: dict, normalized: dict, version_id: int):
+	"""Keep the prefill index in sync with the values just persisted."""
+	values = {code: value for code, value in normalized.items() if code in question_map_by_code}
+	prefill_index.record_values(s, user_code, values, version_id)
 
 
 @dynamic_questionnaire_bp.route("/dynamic/prefill", methods=["GET"])
@@ -636,35 +699,9 @@ def prefill_values():
 	codes = [c.strip() for c in codes_param.split(",") if c.strip()]
 	if not user_code or not codes:
 		return jsonify({"values": {}})
-	values = {c: None for c in codes}
-	# Strategy: find latest responses for this user, scan items for matching question codes
+	# Single indexed lookup on dq_prefill_value (maintained on save/finalize/submit)
 	with Session(engine) as s:
-		# Gather recent responses for this user across assignments, newest first
-		assigns = s.query(QuestionnaireAssignment).filter_by(user_code=user_code).order_by(desc(QuestionnaireAssignment.last_activity_at)).all()
-		# Build map question_id->code for versions lazily
-		qid_to_code_cache = {}
-		for a in assigns:
-			resp = s.query(Response).filter_by(assignment_id=a.id).order_by(desc(Response.id)).first()
-			if not resp:
-				continue
-			# Build version code map on demand
-			if a.questionnaire_version_id not in qid_to_code_cache:
-				v = s.get(QuestionnaireVersion, a.questionnaire_version_id)
-				cmap = {}
-				if v:
-					for sec in v.sections:
-						for qu in sec.questions:
-							cmap[qu.id] = qu.code
-				qid_to_code_cache[a.questionnaire_version_id] = cmap
-			cmap = qid_to_code_cache.get(a.questionnaire_version_id, {})
-			items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
-			for it in items:
-				c = cmap.get(it.question_id)
-				if c and (c in values) and values[c] is None:
-					values[c] = _parse_value(it)
-			# stop early if all found
-			if all(values[c] is not None for c in codes):
-				break
+		values = prefill_index.lookup_values(s, user_code, codes)
 	return jsonify({"values": values})
 
 
@@ -673,7 +710,7 @@ def my_questionnaires():
 	"""Aggregate list of dynamic questionnaires for a user with status and progress.
 	Query params: user_code
 	Excludes the principal questionnaire 'vocacional'. Only active + published ones are returned.
-	Progress: percentage of answered items (any value/numeric_value) over total questions in target version.
+	Progress: stored QuestionnaireAssignment.progress_percent (answered items over total questions in target version).
 	"""
 	if not _feature_enabled():
 		return jsonify({"error": "disabled"}), 404
@@ -682,32 +719,19 @@ def my_questionnaires():
 		return jsonify({"error": "missing_user_code"}), 400
 	with Session(engine) as s:
 		result = []
-		qs = s.query(Questionnaire).filter(Questionnaire.status == "active").all()
-		for q in qs:
-			if getattr(q, 'is_primary', False) or q.code == 'ux_survey':
+		for q in active_questionnaires(s):
+			if q.is_primary or q.code == 'ux_survey':
 				continue
-			versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-			target_version = next((v for v in versions_sorted if v.status == "published"), None)
-			if not target_version:
+			if not q.published_version_id:
 				continue
-			total_questions = sum(len(sec.questions) for sec in target_version.sections)
-			# find assignment & latest response
-			assign = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=target_version.id).order_by(desc(QuestionnaireAssignment.last_activity_at)).first()
+			# find assignment & its response (point lookups on the unique keys)
+			assign = response_store.find_assignment(s, user_code, q.published_version_id)
 			status = assign.status if assign else "new"
-			answered = 0
 			resp = None
-			if assign:
-				resp = s.query(Response).filter_by(assignment_id=assign.id).order_by(desc(Response.id)).first()
-				if resp:
-					items = s.query(ResponseItem).filter_by(response_id=resp.id).all()
-					for it in items:
-						if it.numeric_value is not None:
-							answered += 1
-						elif it.value is not None and str(it.value).strip() != "":
-							answered += 1
 			progress = 0
-			if total_questions > 0:
-				progress = max(0, min(100, int(round((answered / total_questions) * 100))))
+			if assign:
+				progress = assign.progress_percent or 0
+				resp = response_store.current_response(s, assign.id)
 			result.append({
 				"code": q.code,
 				"title": q.title,
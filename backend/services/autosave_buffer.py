@@ -0,0 +1,160 @@
+"""Optional per-worker write-behind buffer for autosaves.
+
+Students autosave on every step and again on page unload, so the same response
+receives bursts of near-identical writes. When enabled (``DQ_AUTOSAVE_BUFFER_SECONDS``
+> 0), validated save payloads are coalesced in memory per ``(user_code,
+version_id)`` and written in a single transaction by the ``writer`` callback:
+
+ - after the entry has been idle for the window (background timer),
+ - explicitly via ``flush_key`` (finalize / reading endpoints call it first),
+ - when the buffer is full (oldest entry is written synchronously), and
+ - on interpreter shutdown (``atexit``).
+
+Each entry carries a virtual revision (``pending_revision``) so clients can keep
+sending ``base_revision`` while their changes are still buffered; the writer is
+expected to persist that revision.
+
+The buffer is per process. The writer must therefore drop entries whose
+assignment was finalized meanwhile (possibly by another worker); finalize always
+receives the full answers and is authoritative.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from threading import Event, Lock, Thread
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
+import atexit
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+Key = Tuple[str, int]  # (user_code, version_id)
+
+
+@dataclass
+class PendingSave:
+    user_code: str
+    version_id: int
+    assignment_id: int
+    response_id: int
+    base_revision: int  # dq_response.revision when the entry was opened
+    pending_revision: int  # revision the client has been told
+    values: Dict[str, Any] = field(default_factory=dict)  # normalized code -> value (coalesced)
+    first_at: float = field(default_factory=time)
+    last_at: float = field(default_factory=time)
+    saves: int = 0
+
+
+class AutosaveBuffer:
+    def __init__(self, writer: Callable[[PendingSave], None], window_seconds: float, max_entries: int = 500):
+        self._writer = writer
+        self.window = float(window_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: Dict[Key, PendingSave] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @classmethod
+    def from_env(cls, writer: Callable[[PendingSave], None]) -> "AutosaveBuffer":
+        try:
+            window = float(os.environ.get("DQ_AUTOSAVE_BUFFER_SECONDS", "0") or 0)
+        except ValueError:
+            window = 0.0
+        try:
+            max_entries = int(os.environ.get("DQ_AUTOSAVE_BUFFER_MAX", "500") or 500)
+        except ValueError:
+            max_entries = 500
+        return cls(writer, window, max_entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, user_code: str, version_id: int) -> Optional[PendingSave]:
+        """Pending entry for a key (do not mutate)."""
+        return self._entries.get((user_code, version_id))
+
+    def add(self, user_code: str, version_id: int, assignment_id: int, response_id: int,
+            current_revision: int, values: Dict[str, Any]) -> int:
+        """Coalesce validated values into the buffer; returns the client-visible revision."""
+        key = (user_code, version_id)
+        overflow = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.response_id != response_id:
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k].last_at)
+                    overflow = self._entries.pop(oldest)
+                entry = PendingSave(user_code, version_id, assignment_id, response_id,
+                                    base_revision=current_revision, pending_revision=current_revision)
+                self._entries[key] = entry
+            entry.values.update(values)
+            entry.pending_revision += 1
+            entry.saves += 1
+            entry.last_at = time()
+            revision = entry.pending_revision
+        if overflow is not None:
+            self._write(overflow)
+        self._ensure_timer()
+        return revision
+
+    def flush_key(self, user_code: str, version_id: int) -> bool:
+        """Write the pending entry for a key now (no-op if none)."""
+        with self._lock:
+            entry = self._entries.pop((user_code, version_id), None)
+        if entry is None:
+            return False
+        self._write(entry)
+        return True
+
+    def flush_due(self, now: Optional[float] = None) -> int:
+        """Write entries idle for at least the window."""
+        now = time() if now is None else now
+        with self._lock:
+            due = [k for k, e in self._entries.items() if now - e.last_at >= self.window]
+            entries = [self._entries.pop(k) for k in due]
+        for entry in entries:
+            self._write(entry)
+        return len(entries)
+
+    def flush_all(self) -> int:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._write(entry)
+        return len(entries)
+
+    def _write(self, entry: PendingSave) -> None:
+        try:
+            self._writer(entry)
+        except Exception:
+            log.exception("autosave buffer flush failed for user=%s version=%s", entry.user_code, entry.version_id)
+
+    def _ensure_timer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run, name="dq-autosave-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self) -> None:
+        interval = max(0.5, self.window / 2)
+        while not self._stop.wait(interval):
+            self.flush_due()
+
+    def close(self) -> None:
+        """Stop the timer and write everything still buffered."""
+        self._stop.set()
+        self.flush_all()
+
+
+__all__ = ["AutosaveBuffer", "PendingSave"]
@@ -0,0 +1,173 @@
+"""Columnar validation of many answer sets of one questionnaire version.
+
+``validate_batch(version, rows)`` returns the same per-row ``errors`` /
+``normalized`` maps as calling ``validate_answers`` on every row, but the rules
+are compiled once and each question is checked as a column:
+
+ - visibility is evaluated per row with the compiled graph (skipped when the
+   version has no visible_if rules),
+ - number and scale_1_5 columns are coerced once and their range / step checks
+   run as NumPy array comparisons (values already typed as int/float skip the
+   per-value coercion),
+ - other types reuse the scalar checks of ``dynamic_validation`` (they need the
+   row as context: relative dates, options, regexes),
+ - domain rules (ICFES ranges, "otro" companions) only run on rows that can
+   trigger them; computed questions are evaluated per row.
+
+``rows`` is a list of answer dicts or a mapping ``{code: column}`` of equally
+long sequences, where ``MISSING`` marks an unanswered cell. Used by
+``python manage.py validate-responses`` (historical sweeps and CSV files).
+NumPy is optional: without it every column uses the scalar checks.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Mapping, NamedTuple, Sequence, Union
+
+from backend.services.dynamic_validation import (
+    _CHECKS, _ICFES_CODES, _apply_computed, _apply_domain_rules, _check_fallback, coerce_float, coerce_int, get_validator,
+)
+
+# Optional numpy; scalar checks are used without it
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+MISSING = object()  # unanswered cell in columnar input
+
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+_STEP_TOL = 1e-9
+_NO_RULES: Dict[str, bool] = {}
+
+
+class BatchResult(NamedTuple):
+    errors: List[Dict[str, Any]]  # per row, same vocabulary as validate_answers
+    normalized: List[Dict[str, Any]]
+
+    @property
+    def invalid_rows(self) -> int:
+        return sum(1 for e in self.errors if e)
+
+
+def _as_rows(data: Union[Sequence[Dict[str, Any]], Mapping[str, Sequence[Any]]]) -> List[Dict[str, Any]]:
+    if not isinstance(data, Mapping):
+        return list(data)
+    lengths = {len(col) for col in data.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must have the same length")
+    n = lengths.pop() if lengths else 0
+    return [{code: col[i] for code, col in data.items() if col[i] is not MISSING} for i in range(n)]
+
+
+def _scalar_column(f, values, contexts):
+    check = _CHECKS.get(f.type, _check_fallback)
+    return [check(f, raw, ctx) for raw, ctx in zip(values, contexts)]
+
+
+def _numeric_column(f, values, decimal: bool, low, high, range_errors, step=None):
+    """Coerce a number column once, then run bounds/step checks as array ops."""
+    if decimal:
+        try:
+            fast = all(type(v) in (int, float) for v in values)
+            parsed, coerce_errs = ([float(v) for v in values] if fast else None), None
+        except OverflowError:
+            fast = False  # ints beyond float range: coerce_float reports them per cell
+        if not fast:
+            pairs = [coerce_float(v) for v in values]
+            parsed, coerce_errs = [p[0] for p in pairs], [p[1] for p in pairs]
+    else:
+        if all(type(v) is int for v in values):
+            parsed, coerce_errs = list(values), None
+        else:
+            pairs = [coerce_int(v) for v in values]
+            parsed, coerce_errs = [p[0] for p in pairs], [p[1] for p in pairs]
+    failed = np.array([e is not None for e in coerce_errs], dtype=bool) if coerce_errs else np.zeros(len(values), dtype=bool)
+    filled = [0 if bad else v for v, bad in zip(parsed, failed)]
+    if decimal:
+        arr = np.array(filled, dtype=np.float64)
+    else:
+        if any(not (_INT64_MIN <= v <= _INT64_MAX) for v in filled):
+            return None  # beyond int64: exact scalar comparison
+        arr = np.array(filled, dtype=np.int64)
+    conditions, names = [failed], [None]
+    with np.errstate(invalid="ignore"):
+        if low is not None:
+            conditions.append(arr < low)
+            names.append(range_errors[0])
+        if high is not None:
+            conditions.append(arr > high)
+            names.append(range_errors[1])
+        if step is not None:
+            base = low if low is not None else 0.0
+            rem = np.abs(arr - base) % step
+            conditions.append(~((rem < _STEP_TOL) | (np.abs(rem - step) < _STEP_TOL)))
+            names.append("invalid_step")
+    outcome = np.select(conditions, np.arange(1, len(conditions) + 1), default=0)
+    results = []
+    for j, code in enumerate(outcome.tolist()):
+        if code == 0:
+            results.append((None, parsed[j]))
+        elif code == 1:
+            results.append((coerce_errs[j], None))
+        else:
+            results.append((names[code - 1], None))
+    return results
+
+
+def _check_column(f, values, contexts):
+    results = None
+    if np is not None and values:
+        if f.type == "number":
+            results = _numeric_column(f, values, f.allow_decimal, f.min_value, f.max_value, ("below_min", "above_max"), f.step)
+        elif f.type == "scale_1_5":
+            results = _numeric_column(f, values, False, 1, 5, ("out_of_range", "out_of_range"))
+    if results is None:
+        results = _scalar_column(f, values, contexts)
+    return results
+
+
+def _selects_other(fields, row) -> bool:
+    for f in fields:
+        ans = row.get(f.code)
+        if f.type == "multi_choice":
+            if isinstance(ans, (list, tuple)) and f.codec.selects_other(ans):
+                return True
+        elif f.codec.is_other(ans):
+            return True
+    return False
+
+
+def validate_batch(version, rows) -> BatchResult:
+    """Validate many answer sets of ``version`` (VersionIndex or ORM version) at once."""
+    validator = get_validator(version)
+    rows = _as_rows(rows)
+    n = len(rows)
+    errors: List[Dict[str, Any]] = [{} for _ in range(n)]
+    normalized: List[Dict[str, Any]] = [{} for _ in range(n)]
+    graph = validator.visibility
+    visible = [graph.evaluate(row) for row in rows] if graph.order else [_NO_RULES] * n
+    for code, f in validator.fields.items():
+        shown = range(n) if code not in graph.predicates else [i for i in range(n) if visible[i].get(code, True)]
+        if f.required:
+            for i in shown:
+                row = rows[i]
+                if code not in row or row[code] in (None, ""):
+                    errors[i][code] = "required"
+        present = [i for i in shown if code in rows[i]]
+        if not present:
+            continue
+        results = _check_column(f, [rows[i][code] for i in present], [rows[i] for i in present])
+        for i, (err, value) in zip(present, results):
+            if err is not None:
+                errors[i][code] = err
+            else:
+                normalized[i][code] = value
+    other_fields = validator.other_fields
+    for i, row in enumerate(rows):
+        if not _ICFES_CODES.isdisjoint(row) or _selects_other(other_fields, row):
+            _apply_domain_rules(other_fields, row, None, visible[i], errors[i], normalized[i])
+        if validator.computed:
+            _apply_computed(validator.computed, validator.fields, row, None, visible[i], errors[i], normalized[i])
+    return BatchResult(errors, normalized)
+
+
+__all__ = ["MISSING", "BatchResult", "validate_batch"]
@@ -0,0 +1,292 @@
+"""Computed questions: small, safe arithmetic expressions over other answers.
+
+``Question.computed_expression`` holds either an expression string or
+``{"expr": "<expression>"}``; it is evaluated when ``Question.is_computed`` is
+true. Expressions use Python syntax restricted to:
+
+ - numbers, strings, ``True``/``False``/``None`` and question codes as names,
+ - ``+ - * / // %``, unary ``-``/``+``/``not``, comparisons, ``and``/``or``,
+   ``a if cond else b``,
+ - the functions ``round(x[, digits])``, ``min``, ``max``, ``abs``,
+   ``clamp(x, low, high)`` and ``coalesce(a, b, ...)`` (first answered value).
+
+No attribute access, subscripts, lambdas or other calls are accepted.
+Arithmetic and the numeric functions only take numbers: a string, boolean or
+``None`` constant as an operand (``"ab" * 999999``) is rejected when the
+expression is compiled; such constants may only appear in comparisons and
+conditions.
+Expressions read validated answers (the normalized values of
+``dynamic_validation``): a question is an operand only when its value is an
+int or float, anything else (text, lists, booleans) counts as unanswered. A
+reference to an unanswered question makes the whole result ``None`` (nothing
+is computed) unless it is inside ``coalesce``; so do runtime errors (division
+by zero).
+
+``compile_expression`` parses the source once with ``ast`` and turns the tree
+into nested closures, so evaluating it is a handful of Python calls with no
+re-parsing. ``compile_computed`` does that for every computed question of a
+version (cached with the validator, see ``dynamic_validation``) and orders them
+so computed questions can read other computed questions.
+
+Example (ICFES global score, see ``ICFES_GLOBAL_EXPRESSION``)::
+
+    clamp(round((3 * (puntaje_lectura_critica + ...) + puntaje_ingles) / 13 * 5), 0, 500)
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, FrozenSet, Mapping, Optional, Tuple
+import ast
+import operator
+
+MAX_EXPRESSION_CHARS = 1000
+
+ICFES_GLOBAL_EXPRESSION = (
+    "clamp(round((3 * (puntaje_lectura_critica + puntaje_matematicas + puntaje_sociales_ciudadanas"
+    " + puntaje_ciencias_naturales) + puntaje_ingles) / 13 * 5), 0, 500)"
+)
+
+
+class ExpressionError(ValueError):
+    """Invalid or unsupported computed_expression."""
+
+
+class _Unanswered(Exception):
+    pass
+
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+_UNARY = {ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Not: operator.not_}
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+_FUNCTIONS = {
+    "round": (round, 1, 2),
+    "min": (min, 2, None),
+    "max": (max, 2, None),
+    "abs": (abs, 1, 1),
+    "clamp": (_clamp, 3, 3),
+}
+
+Compiled = Callable[[Mapping[str, Any]], Any]
+
+
+def _answer(value):
+    if type(value) not in (int, float):  # bool, text, lists, None: not a validated number
+        raise _Unanswered()
+    return value
+
+
+def _compile(node, names: set) -> Compiled:
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float, str, bool, type(None))):
+            raise ExpressionError("unsupported_constant")
+        value = node.value
+        return lambda answers: value
+    if isinstance(node, ast.Name):
+        code = node.id
+        names.add(code)
+        return lambda answers: _answer(answers.get(code))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        op = _BINARY[type(node.op)]
+        left, right = _compile(node.left, names), _compile(node.right, names)
+        if isinstance(node.right, ast.Constant):
+            const = node.right.value
+            return lambda answers: op(left(answers), const)
+        if isinstance(node.left, ast.Constant):
+            const = node.left.value
+            return lambda answers: op(const, right(answers))
+        return lambda answers: op(left(answers), right(answers))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        op = _UNARY[type(node.op)]
+        operand = _compile(node.operand, names)
+        return lambda answers: op(operand(answers))
+    if isinstance(node, ast.BoolOp):
+        parts = tuple(_compile(v, names) for v in node.values)
+        if isinstance(node.op, ast.And):
+            return lambda answers: all(p(answers) for p in parts)
+        return lambda answers: any(p(answers) for p in parts)
+    if isinstance(node, ast.Compare):
+        if not all(type(op) in _COMPARE for op in node.ops):
+            raise ExpressionError("unsupported_operator")
+        ops = tuple(_COMPARE[type(op)] for op in node.ops)
+        first = _compile(node.left, names)
+        rest = tuple(_compile(c, names) for c in node.comparators)
+
+        def compare(answers):
+            left = first(answers)
+            for op, right_fn in zip(ops, rest):
+                right = right_fn(answers)
+                if not op(left, right):
+                    return False
+                left = right
+            return True
+        return compare
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile(node.test, names), _compile(node.body, names), _compile(node.orelse, names)
+        return lambda answers: body(answers) if test(answers) else orelse(answers)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        args = tuple(_compile(a, names) for a in node.args)
+        name = node.func.id
+        if name == "coalesce":
+            if not args:
+                raise ExpressionError("bad_arguments")
+
+            def coalesce(answers):
+                for arg in args:
+                    try:
+                        return arg(answers)
+                    except _Unanswered:
+                        continue
+                raise _Unanswered()
+            return coalesce
+        if name not in _FUNCTIONS:
+            raise ExpressionError("unknown_function")
+        fn, low, high = _FUNCTIONS[name]
+        if len(args) < low or (high is not None and len(args) > high):
+            raise ExpressionError("bad_arguments")
+        if len(args) == 1:
+            (a1,) = args
+            return lambda answers: fn(a1(answers))
+        if len(args) == 3:
+            a1, a2, a3 = args
+            return lambda answers: fn(a1(answers), a2(answers), a3(answers))
+        return lambda answers: fn(*[a(answers) for a in args])
+    raise ExpressionError("unsupported_syntax")
+
+
+def _numeric(node) -> bool:
+    """True when ``node`` always yields a number; raises ExpressionError when a
+    non-numeric value would reach arithmetic (unbounded string/sequence growth)."""
+    if isinstance(node, ast.Constant):
+        return type(node.value) in (int, float)
+    if isinstance(node, ast.Name):
+        return True  # answers are validated numbers (see _answer)
+    if isinstance(node, ast.BinOp):
+        if not (_numeric(node.left) and _numeric(node.right)):
+            raise ExpressionError("non_numeric_operand")
+        return True
+    if isinstance(node, ast.UnaryOp):
+        operand = _numeric(node.operand)
+        if isinstance(node.op, ast.Not):
+            return False
+        if not operand:
+            raise ExpressionError("non_numeric_operand")
+        return True
+    if isinstance(node, (ast.BoolOp, ast.Compare)):
+        for child in (node.values if isinstance(node, ast.BoolOp) else (node.left, *node.comparators)):
+            _numeric(child)
+        return False
+    if isinstance(node, ast.IfExp):
+        _numeric(node.test)
+        body, orelse = _numeric(node.body), _numeric(node.orelse)
+        return body and orelse
+    if isinstance(node, ast.Call):
+        kinds = [_numeric(a) for a in node.args]
+        if node.func.id == "coalesce":
+            return all(kinds)
+        if not all(kinds):
+            raise ExpressionError("non_numeric_operand")
+        return True
+    return False
+
+
+@dataclass(frozen=True)
+class Expression:
+    source: str
+    inputs: FrozenSet[str]  # question codes the expression reads
+    _fn: Compiled
+
+    def evaluate(self, answers: Mapping[str, Any]) -> Optional[Any]:
+        """Result, or None when an input is unanswered or the arithmetic fails."""
+        try:
+            return self._fn(answers)
+        except _Unanswered:
+            return None
+        except (ArithmeticError, TypeError, ValueError):
+            return None
+
+
+def expression_source(stored) -> Optional[str]:
+    """computed_expression JSON -> expression text (None when absent)."""
+    if isinstance(stored, dict):
+        stored = stored.get("expr")
+    if isinstance(stored, str) and stored.strip():
+        return stored.strip()
+    return None
+
+
+def compile_expression(source: str) -> Expression:
+    """Parse and compile once; raises ExpressionError for anything outside the grammar."""
+    if not isinstance(source, str) or not source.strip():
+        raise ExpressionError("empty_expression")
+    if len(source) > MAX_EXPRESSION_CHARS:
+        raise ExpressionError("expression_too_long")
+    names: set = set()
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+        fn = _compile(tree.body, names)
+        _numeric(tree.body)
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        if isinstance(e, ExpressionError):
+            raise
+        raise ExpressionError("syntax_error")
+    return Expression(source=source.strip(), inputs=frozenset(names), _fn=fn)
+
+
+@dataclass(frozen=True)
+class ComputedField:
+    code: str
+    expression: Expression
+
+
+def compile_computed(questions: Mapping[str, Any]) -> Tuple[ComputedField, ...]:
+    """{code: QuestionMeta/Question} -> computed questions in evaluation order.
+
+    Invalid stored expressions are skipped (the admin API rejects them on save).
+    Computed questions that read other computed questions come after them;
+    cycles keep display order.
+    """
+    compiled = {}
+    for code, qu in questions.items():
+        if not getattr(qu, "is_computed", False):
+            continue
+        source = expression_source(getattr(qu, "computed_expression", None))
+        if source is None:
+            continue
+        try:
+            compiled[code] = compile_expression(source)
+        except ExpressionError:
+            continue
+    order = []
+    pending = dict(compiled)
+    while pending:
+        ready = [c for c, e in pending.items() if not (e.inputs & (pending.keys() - {c}))]
+        if not ready:
+            ready = list(pending)  # cycle
+        for code in ready:
+            order.append(ComputedField(code, pending.pop(code)))
+    return tuple(order)
+
+
+__all__ = [
+    "ICFES_GLOBAL_EXPRESSION", "ExpressionError", "Expression", "ComputedField",
+    "expression_source", "compile_expression", "compile_computed",
+]
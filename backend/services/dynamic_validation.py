@@ -1,37 +1,57 @@
 """Validation service for dynamic questionnaire responses.
 
-Core function: validate_answers(version, answers_dict)
+Core function: validate_answers(version, answers_dict, only=None)
 Returns (ok: bool, errors: dict, normalized: dict)
+``version`` may be an ORM QuestionnaireVersion or a cached VersionIndex.
+``only`` restricts checks to a set of question codes (delta saves); the full
+``answers`` dict is still used as context for visibility and cross-field rules.
+
+``compile_validator`` parses every question's ``validation_rules`` once
+(numeric bounds, compiled regexes, date bounds, option / "other" value sets)
+and the visible_if rules into an immutable ``CompiledValidator``. ``get_validator`` caches it per
+VersionIndex, so for a published version the rules are compiled once per
+worker and validation is a loop over the submitted answers.
+
+Autosaves use ``CompiledValidator.validate_partial``: only the changed codes,
+their ``otro_`` companions and what depends on them are checked, with the
+same error vocabulary, and ``critical_errors`` picks the errors that block a
+save. Which errors are critical is per-question metadata:
+``validation_rules["critical"]`` (list of error codes, ``true`` for any error,
+``false``/``[]`` for none), defaulting to invalid options for choice
+questions, every date error for dates and out_of_range/not_integer for the
+ICFES score codes. A missing ``otro_<code>`` companion always blocks.
 
 Rules implemented now:
  - Required presence (unless hidden by visible_if rule evaluating to False)
  - Type coercion for number, scale_1_5, boolean, date (basic ISO), multi_choice arrays
  - single_choice / multi_choice option membership check
  - scale_1_5 range 1..5
- - visible_if simple evaluator supporting structure: {"code": <question_code>, "equals": <value>}
-   or {"and": [<rule>, ...]} / {"or": [<rule>, ...]}
+ - date bounds, relative dates and age limits compared as date ordinals: answers
+   are parsed once (``date_ordinal`` is memoized) and the limits that depend on
+   today (not_after_today, min/max age) are computed once per day per question
+ - computed questions (is_computed + computed_expression, see ``computed_fields``)
+   evaluated after the other checks; the ICFES global score is one of them
+ - visible_if rules compiled into a dependency graph (see ``visibility``): operators
+   equals, not_equals, in, not_in, gt/gte/lt/lte, answered, combined with and/or;
+   a question whose referenced questions are hidden is hidden too
 
 Future extensions: regex, min/max length, numeric ranges, custom expressions.
 """
 from __future__ import annotations
-from datetime import datetime, date
-from typing import Dict, Any, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from threading import Lock
+from types import MappingProxyType
+from typing import Dict, Any, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Pattern, Tuple
 import re
+import time
+from time import perf_counter_ns
 
-
-def evaluate_visibility(rule, answers: Dict[str, Any]) -> bool:
-    if not rule:
-        return True
-    if isinstance(rule, dict):
-        if "and" in rule:
-            return all(evaluate_visibility(r, answers) for r in rule["and"])
-        if "or" in rule:
-            return any(evaluate_visibility(r, answers) for r in rule["or"])
-        code = rule.get("code")
-        if code:
-            expected = rule.get("equals")
-            return answers.get(code) == expected
-    return True  # fallback permissive
+from backend.services.computed_fields import ComputedField, compile_computed
+from backend.services.option_index import OptionCodec
+from backend.services.validation_profile import PROFILE, REGEX_GUARD, regex_risk
+from backend.services.visibility import VisibilityGraph, build_graph, evaluate_visibility, referenced_codes
 
 
 def coerce_boolean(val):
@@ -64,15 +84,32 @@ def coerce_float(val):
         return None, "not_number"
 
 
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+
+@lru_cache(maxsize=8192)
+def date_ordinal(val: str) -> Optional[int]:
+    """'YYYY-MM-DD' -> date.toordinal() (None if invalid); memoized, answers repeat a lot.
+
+    Accepts exactly what ``strptime(val, "%Y-%m-%d")`` accepts: zero padded
+    values take a fast path, the rest (e.g. "2020-1-5") go through strptime.
+    """
+    m = _ISO_DATE_RE.fullmatch(val)
+    try:
+        if m:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3))).toordinal()
+        return datetime.strptime(val, "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
 def coerce_date(val):
     if not val:
         return None, "empty"
-    try:
-        # accept YYYY-MM-DD
-        datetime.strptime(val, "%Y-%m-%d")
-        return val, None
-    except Exception:
+    # accept YYYY-MM-DD
+    if date_ordinal(str(val)) is None:
         return None, "invalid_date"
+    return val, None
 
 
 def _add_years(d: date, years: int) -> date:
@@ -83,277 +120,491 @@ def _add_years(d: date, years: int) -> date:
         return d.replace(month=2, day=28, year=d.year + years)
 
 
-def validate_answers(version, answers: Dict[str, Any]) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
-    errors = {}
-    normalized = {}
-    # Build lookup by code
-    code_map = {}
-    for sec in version.sections:
-        for qu in sec.questions:
-            code_map[qu.code] = qu
-
-    # Determine visibility (simple pre-pass using raw answers)
-    visible_cache = {}
-    for code, qu in code_map.items():
-        visible_cache[code] = evaluate_visibility(qu.visible_if, answers)
-
-    # Required checks
-    for code, qu in code_map.items():
-        if qu.required and visible_cache.get(code, True):
-            if code not in answers or answers[code] in (None, ""):
-                errors[code] = "required"
-
-    # Iterate answers
-    for code, raw in answers.items():
-        qu = code_map.get(code)
-        if not qu:
-            continue  # ignore unknown
-        if not visible_cache.get(code, True):
-            # If not visible, ignore and do not mark error
-            continue
-        qtype = qu.type
-        rules = qu.validation_rules or {}
-        if qtype in ("text", "textarea"):
-            sval = str(raw) if raw is not None else ""
-            # length rules
-            try:
-                min_len = int(rules.get("minLength")) if rules and "minLength" in rules else None
-            except Exception:
-                min_len = None
-            try:
-                max_len = int(rules.get("maxLength")) if rules and "maxLength" in rules else None
-            except Exception:
-                max_len = None
-            if min_len is not None and len(sval) < min_len:
-                errors[code] = "too_short"
-            elif max_len is not None and len(sval) > max_len:
-                errors[code] = "too_long"
-            else:
-                # regex
-                pattern = rules.get("regex") if isinstance(rules, dict) else None
-                if pattern:
-                    try:
-                        if not re.fullmatch(str(pattern), sval or ""):
-                            errors[code] = "regex_no_match"
-                        else:
-                            normalized[code] = sval
-                    except re.error:
-                        # invalid pattern => ignore
-                        normalized[code] = sval
-                else:
-                    normalized[code] = sval
-        elif qtype == "email":
-            sval = str(raw) if raw is not None else ""
-            # Simple but robust email regex per HTML spec approximation
-            email_regex = r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$"
-            if not re.fullmatch(email_regex, sval or ""):
-                errors[code] = "invalid_email"
-            else:
-                normalized[code] = sval
-        elif qtype == "number":
-            # Allow decimals via validation_rules.allow_decimal
-            allow_decimal = False
+# (today's ordinal, epoch seconds of the next local midnight)
+_TODAY = [0, float("-inf")]
+
+
+def _today_ordinal() -> int:
+    """date.today().toordinal(), recomputed only when the day changes."""
+    now = time.time()
+    if now >= _TODAY[1]:
+        today = date.today()
+        midnight = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+        _TODAY[:] = [today.toordinal(), midnight]
+    return _TODAY[0]
+
+
+def _age_cutoff(today: int, years: int, oldest: bool) -> Optional[int]:
+    """Birth date ordinal limit of an age rule on ``today``.
+
+    ``oldest=False`` (min_age): last ordinal with _add_years(d, years) <= today,
+    later dates are too young. ``oldest=True`` (max_age): first ordinal with
+    _add_years(d, years) >= today, earlier dates are too old. _add_years is
+    monotonic, so the limit is found next to today - years. None when the
+    arithmetic leaves the date range (the rule is not enforced, as before).
+    """
+    try:
+        d = _add_years(date.fromordinal(today), -years).toordinal()
+        if not oldest:
+            while _add_years(date.fromordinal(d + 1), years).toordinal() <= today:
+                d += 1
+            while _add_years(date.fromordinal(d), years).toordinal() > today:
+                d -= 1
+        else:
+            while _add_years(date.fromordinal(d - 1), years).toordinal() >= today:
+                d -= 1
+            while _add_years(date.fromordinal(d), years).toordinal() < today:
+                d += 1
+        return d
+    except (ValueError, OverflowError):
+        return None
+
+
+class _DayBounds(NamedTuple):
+    """Integer limits of a date question for one day (all optional, inclusive)."""
+    today: int
+    min_day: Optional[int]
+    max_day: Optional[int]  # max_date folded with today for not_after_today
+    youngest: Optional[int]  # min_age: birth dates after this are too young
+    oldest: Optional[int]  # max_age: birth dates before this are too old
+
+
+# Simple but robust email regex per HTML spec approximation
+_EMAIL_RE = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
+_ICFES_COMPONENTS = (
+    "puntaje_lectura_critica",
+    "puntaje_matematicas",
+    "puntaje_sociales_ciudadanas",
+    "puntaje_ciencias_naturales",
+    "puntaje_ingles",
+)
+_ICFES_CODES = frozenset(_ICFES_COMPONENTS + ("puntaje_global_saber11",))
+
+# Errors that block an autosave unless validation_rules["critical"] says otherwise
+_DATE_ERRORS = frozenset({"invalid_date", "before_min_date", "after_max_date", "before_other_date", "after_other_date", "min_age", "max_age"})
+_CRITICAL_BY_TYPE = {
+    "single_choice": frozenset({"invalid_option"}),
+    "choice": frozenset({"invalid_option"}),
+    "multi_choice": frozenset({"not_array", "invalid_options"}),
+    "date": _DATE_ERRORS,
+}
+_ICFES_CRITICAL = frozenset({"out_of_range", "not_integer"})
+ANY_ERROR = "*"
+_CHOICE_TYPES = ("single_choice", "choice", "multi_choice")
+
+
+def error_code(err) -> str:
+    """Error value -> its code ({"invalid_options": [...]} -> "invalid_options")."""
+    if isinstance(err, dict):
+        return next(iter(err), "")
+    return str(err)
+
+
+def _critical_policy(code: str, qtype: str, rules: dict) -> FrozenSet[str]:
+    if "critical" in rules:
+        value = rules.get("critical")
+        if value is True:
+            return frozenset({ANY_ERROR})
+        if isinstance(value, (list, tuple)):
+            return frozenset(str(v) for v in value)
+        return frozenset()
+    if code in _ICFES_CODES:
+        return _ICFES_CRITICAL
+    return _CRITICAL_BY_TYPE.get(qtype, frozenset())
+
+
+def _rule_int(rules: dict, key: str) -> Optional[int]:
+    try:
+        return int(rules.get(key)) if key in rules else None
+    except Exception:
+        return None
+
+
+def _rule_float(rules: dict, key: str) -> Optional[float]:
+    try:
+        return float(rules.get(key)) if key in rules else None
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True)
+class FieldRules:
+    """Parsed validation rules of one question (built by ``compile_validator``)."""
+    code: str
+    type: str
+    required: bool
+    visible_if: Any = None
+    # text / textarea
+    min_len: Optional[int] = None
+    max_len: Optional[int] = None
+    pattern: Optional[Pattern] = None  # invalid / unsafe patterns are dropped (never enforced)
+    # number (int bounds unless allow_decimal)
+    allow_decimal: bool = False
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    step: Optional[float] = None
+    # date (YYYY-MM-DD strings; min_year/max_year already folded in; invalid bounds dropped)
+    min_date: Optional[str] = None
+    max_date: Optional[str] = None
+    min_day: Optional[int] = None  # same bounds as date ordinals
+    max_day: Optional[int] = None
+    not_after_today: bool = False
+    not_before_code: Optional[str] = None
+    not_after_code: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    # choices
+    options: FrozenSet[str] = frozenset()
+    other_values: Tuple[str, ...] = ()
+    codec: Optional[OptionCodec] = None  # option bit positions (choice types)
+    # error codes that block an autosave ("*": any)
+    critical: FrozenSet[str] = frozenset()
+    # [_DayBounds] of the last day a date was checked (recomputed when the day changes)
+    day_cache: List[Any] = field(default_factory=lambda: [None], compare=False, hash=False, repr=False)
+
+    def day_bounds(self) -> _DayBounds:
+        """Date limits as ordinals for today; computed once per day per question."""
+        today = _today_ordinal()
+        cached = self.day_cache[0]
+        if cached is not None and cached.today == today:
+            return cached
+        max_day = self.max_day
+        if self.not_after_today:
+            max_day = today if max_day is None else min(max_day, today)
+        bounds = _DayBounds(
+            today=today,
+            min_day=self.min_day,
+            max_day=max_day,
+            youngest=_age_cutoff(today, self.min_age, False) if self.min_age is not None else None,
+            oldest=_age_cutoff(today, self.max_age, True) if self.max_age is not None else None,
+        )
+        self.day_cache[0] = bounds
+        return bounds
+
+
+def compile_field(qu) -> FieldRules:
+    """QuestionMeta / ORM Question -> FieldRules."""
+    rules = qu.validation_rules if isinstance(qu.validation_rules, dict) else {}
+    qtype = qu.type
+    kwargs: Dict[str, Any] = {}
+    if qtype in ("text", "textarea"):
+        kwargs["min_len"] = _rule_int(rules, "minLength")
+        kwargs["max_len"] = _rule_int(rules, "maxLength")
+        if rules.get("regex"):
+            source = str(rules.get("regex"))
+            risk = regex_risk(source)
+            if risk is None:
+                try:
+                    kwargs["pattern"] = re.compile(source)
+                except re.error:
+                    pass  # invalid pattern => ignore
+            elif risk != "syntax_error":
+                REGEX_GUARD.note_unsafe(qu.code, source, risk)  # catastrophic backtracking => ignore
+    elif qtype == "number":
+        allow_decimal = bool(rules.get("allow_decimal"))
+        kwargs["allow_decimal"] = allow_decimal
+        if allow_decimal:
+            kwargs["min_value"] = _rule_float(rules, "min")
+            kwargs["max_value"] = _rule_float(rules, "max")
+            step_raw = rules.get("step")
             try:
-                if isinstance(rules, dict) and rules.get("allow_decimal"):
-                    allow_decimal = True
+                step = float(step_raw) if step_raw is not None and str(step_raw).strip() != "" else None
             except Exception:
-                allow_decimal = False
-            if allow_decimal:
-                val, err = coerce_float(raw)
-                if err:
-                    errors[code] = err
-                else:
-                    # min/max may be float
-                    try:
-                        min_v = float(rules.get("min")) if rules and "min" in rules else None
-                    except Exception:
-                        min_v = None
-                    try:
-                        max_v = float(rules.get("max")) if rules and "max" in rules else None
-                    except Exception:
-                        max_v = None
-                    if min_v is not None and val < min_v:
-                        errors[code] = "below_min"
-                    elif max_v is not None and val > max_v:
-                        errors[code] = "above_max"
-                    else:
-                        # optional step validation for decimals (relative to min or 0)
-                        step_ok = True
-                        try:
-                            step_raw = rules.get("step") if isinstance(rules, dict) else None
-                            step = float(step_raw) if step_raw is not None and str(step_raw).strip() != "" else None
-                        except Exception:
-                            step = None
-                        if step is not None and step > 0:
-                            base = min_v if (min_v is not None) else 0.0
-                            # avoid FP issues with a tolerance
-                            diff = abs(val - base)
-                            rem = diff % step
-                            tol = 1e-9
-                            if not (rem < tol or abs(rem - step) < tol):
-                                step_ok = False
-                        if not step_ok:
-                            errors[code] = "invalid_step"
-                        else:
-                            # Note: DB numeric_value es entero; para decimales se almacena como string en value
-                            normalized[code] = val
-            else:
-                val, err = coerce_int(raw)
-                if err:
-                    errors[code] = err
-                else:
-                    # numeric range via rules (int)
-                    try:
-                        min_v = int(rules.get("min")) if rules and "min" in rules else None
-                    except Exception:
-                        min_v = None
-                    try:
-                        max_v = int(rules.get("max")) if rules and "max" in rules else None
-                    except Exception:
-                        max_v = None
-                    if min_v is not None and val < min_v:
-                        errors[code] = "below_min"
-                    elif max_v is not None and val > max_v:
-                        errors[code] = "above_max"
-                    else:
-                        normalized[code] = val
-        elif qtype == "scale_1_5":
-            val, err = coerce_int(raw)
-            if err:
-                errors[code] = err
-            else:
-                if 1 <= val <= 5:
-                    normalized[code] = val
-                else:
-                    errors[code] = "out_of_range"
-        elif qtype == "boolean":
-            val, err = coerce_boolean(raw)
-            if err:
-                errors[code] = err
+                step = None
+            kwargs["step"] = step if step is not None and step > 0 else None
+        else:
+            kwargs["min_value"] = _rule_int(rules, "min")
+            kwargs["max_value"] = _rule_int(rules, "max")
+    elif qtype == "date":
+        min_day = date_ordinal(str(rules["min_date"])) if rules.get("min_date") else None
+        max_day = date_ordinal(str(rules["max_date"])) if rules.get("max_date") else None
+        # presets: min_year, max_year (not_after_today depends on the day; applied at validation time)
+        try:
+            if "min_year" in rules:
+                y = date(int(rules.get("min_year")), 1, 1).toordinal()
+                min_day = max(min_day, y) if min_day is not None else y
+            if "max_year" in rules:
+                y = date(int(rules.get("max_year")), 12, 31).toordinal()
+                max_day = min(max_day, y) if max_day is not None else y
+        except Exception:
+            pass
+        kwargs.update(
+            min_date=date.fromordinal(min_day).isoformat() if min_day is not None else None,
+            max_date=date.fromordinal(max_day).isoformat() if max_day is not None else None,
+            min_day=min_day,
+            max_day=max_day,
+            not_after_today=bool(rules.get("not_after_today")),
+            not_before_code=str(rules["not_before_code"]) if rules.get("not_before_code") else None,
+            not_after_code=str(rules["not_after_code"]) if rules.get("not_after_code") else None,
+            min_age=_rule_int(rules, "min_age_years"),
+            max_age=_rule_int(rules, "max_age_years"),
+        )
+    options = getattr(qu, "options", None) or ()
+    if qtype in ("single_choice", "choice", "multi_choice"):
+        kwargs["options"] = frozenset(o.value for o in options)
+        kwargs["codec"] = OptionCodec.from_options(options)
+    other = tuple(v for v in (getattr(o, "value", None) for o in options if getattr(o, "is_other_flag", False)) if v)
+    return FieldRules(
+        code=qu.code, type=qtype, required=bool(qu.required), visible_if=qu.visible_if,
+        other_values=other, critical=_critical_policy(qu.code, qtype, rules), **kwargs,
+    )
+
+
+def _check_text(f: FieldRules, raw, answers):
+    sval = str(raw) if raw is not None else ""
+    if f.min_len is not None and len(sval) < f.min_len:
+        return "too_short", None
+    if f.max_len is not None and len(sval) > f.max_len:
+        return "too_long", None
+    if f.pattern is not None:
+        matched = REGEX_GUARD.fullmatch(f.code, f.pattern, sval)
+        if matched is None:
+            return "regex_unavailable", None  # quarantined pattern: not accepted unchecked
+        if not matched:
+            return "regex_no_match", None
+    return None, sval
+
+
+def _check_email(f: FieldRules, raw, answers):
+    sval = str(raw) if raw is not None else ""
+    if not _EMAIL_RE.fullmatch(sval):
+        return "invalid_email", None
+    return None, sval
+
+
+def _check_number(f: FieldRules, raw, answers):
+    val, err = coerce_float(raw) if f.allow_decimal else coerce_int(raw)
+    if err:
+        return err, None
+    if f.min_value is not None and val < f.min_value:
+        return "below_min", None
+    if f.max_value is not None and val > f.max_value:
+        return "above_max", None
+    if f.step is not None:
+        # step relative to min or 0; avoid FP issues with a tolerance
+        base = f.min_value if f.min_value is not None else 0.0
+        rem = abs(val - base) % f.step
+        tol = 1e-9
+        if not (rem < tol or abs(rem - f.step) < tol):
+            return "invalid_step", None
+    # Decimales se guardan en float_value (numeric_value es entero)
+    return None, val
+
+
+def _check_scale(f: FieldRules, raw, answers):
+    val, err = coerce_int(raw)
+    if err:
+        return err, None
+    if not 1 <= val <= 5:
+        return "out_of_range", None
+    return None, val
+
+
+def _check_boolean(f: FieldRules, raw, answers):
+    val, err = coerce_boolean(raw)
+    return (err, None) if err else (None, val)
+
+
+def _check_date(f: FieldRules, raw, answers):
+    val = str(raw)
+    if not val:
+        return "empty", None
+    day = date_ordinal(val)
+    if day is None:
+        return "invalid_date", None
+    # every bound is an ordinal (int) computed once per day
+    b = f.day_bounds()
+    if b.min_day is not None and day < b.min_day:
+        return "before_min_date", None
+    if b.max_day is not None and day > b.max_day:
+        return "after_max_date", None
+    # relative rules against another date answer in same payload
+    if f.not_before_code:
+        other_val = answers.get(f.not_before_code)
+        if other_val:
+            other = date_ordinal(str(other_val))
+            if other is not None and day < other:
+                return "before_other_date", None
+    if f.not_after_code:
+        other_val = answers.get(f.not_after_code)
+        if other_val:
+            other = date_ordinal(str(other_val))
+            if other is not None and day > other:
+                return "after_other_date", None
+    # age-based rules relative to today (e.g., DOB must be at least N years old)
+    if b.youngest is not None and day > b.youngest:
+        return "min_age", None
+    # age must be <= max_age: violation if birth date + max_age is already past
+    if b.oldest is not None and day < b.oldest:
+        return "max_age", None
+    return None, val
+
+
+def _check_choice(f: FieldRules, raw, answers):
+    sval = str(raw)
+    if sval not in f.options:
+        return "invalid_option", None
+    return None, sval
+
+
+def _check_multi(f: FieldRules, raw, answers):
+    if not isinstance(raw, (list, tuple)):
+        return "not_array", None
+    if f.codec.mask(raw) is None:
+        return {"invalid_options": [v for v in raw if v not in f.options]}, None
+    return None, list(raw)
+
+
+def _check_fallback(f: FieldRules, raw, answers):
+    # fallback: store as string
+    return None, str(raw)
+
+
+_CHECKS = {
+    "text": _check_text,
+    "textarea": _check_text,
+    "email": _check_email,
+    "number": _check_number,
+    "scale_1_5": _check_scale,
+    "boolean": _check_boolean,
+    "date": _check_date,
+    "single_choice": _check_choice,
+    "choice": _check_choice,
+    "multi_choice": _check_multi,
+}
+
+
+@dataclass(frozen=True)
+class CompiledValidator:
+    """Immutable, precompiled rules of one questionnaire version."""
+    version_id: Optional[int]
+    fields: Mapping[str, FieldRules]
+    # questions with "other" options (companion text answer required when selected)
+    other_fields: Tuple[FieldRules, ...] = ()
+    visibility: VisibilityGraph = field(default_factory=lambda: build_graph({}))
+    # code -> codes whose visibility/validation reads it (same graph as VersionIndex.dependents)
+    dependents: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    # code -> every code reachable through ``dependents`` (cascading visibility, date rules)
+    reach: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    position: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))  # display order
+    computed: Tuple[ComputedField, ...] = ()  # is_computed questions, in evaluation order
+
+    def affected(self, codes: Iterable[str]) -> set:
+        """Changed codes plus every question whose visibility/validation can change with them."""
+        scope = set(codes)
+        for code in list(scope):
+            scope |= self.reach.get(code, frozenset())
+        return scope
+
+    def validate(self, answers: Dict[str, Any], only: Optional[Iterable[str]] = None) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
+        errors: Dict[str, Any] = {}
+        normalized: Dict[str, Any] = {}
+        only = set(only) if only is not None else None
+        fields = self.fields
+        if only is None:
+            scoped = list(fields.values())
+            pending = answers.items()
+        else:
+            # cost follows the scope, not the questionnaire
+            scoped = [fields[c] for c in sorted((c for c in only if c in fields), key=self.position.__getitem__)]
+            pending = [(f.code, answers[f.code]) for f in scoped if f.code in answers]
+
+        profile = PROFILE if PROFILE.enabled else None  # opt-in timings (validation_profile)
+        lap = perf_counter_ns() if profile else 0
+
+        # Visibility in dependency order (scope + ancestors only), then required checks
+        visible = self.visibility.evaluate(answers, only)
+        if profile:
+            lap = profile.lap("visibility", lap)
+        for f in scoped:
+            if f.required and visible.get(f.code, True):
+                if f.code not in answers or answers[f.code] in (None, ""):
+                    errors[f.code] = "required"
+        if profile:
+            lap = profile.lap("required", lap)
+
+        # Iterate answers
+        for code, raw in pending:
+            f = fields.get(code)
+            if f is None or (only is not None and code not in only) or not visible.get(code, True):
+                continue  # unknown / out of scope / hidden
+            check = _CHECKS.get(f.type, _check_fallback)
+            if profile:
+                started = perf_counter_ns()
+                err, value = check(f, raw, answers)
+                profile.record(f.type, perf_counter_ns() - started, err is not None)
             else:
-                normalized[code] = val
-        elif qtype == "date":
-            val, err = coerce_date(str(raw))
-            if err:
+                err, value = check(f, raw, answers)
+            if err is not None:
                 errors[code] = err
             else:
-                # optional date bounds YYYY-MM-DD in rules
-                min_d = rules.get("min_date") if isinstance(rules, dict) else None
-                max_d = rules.get("max_date") if isinstance(rules, dict) else None
-                # presets: not_after_today, min_year, max_year
-                try:
-                    if isinstance(rules, dict) and rules.get("not_after_today"):
-                        today_s = date.today().strftime("%Y-%m-%d")
-                        max_d = min(max_d, today_s) if max_d else today_s
-                    if isinstance(rules, dict) and ("min_year" in rules):
-                        y = int(rules.get("min_year"))
-                        min_d = max(min_d, f"{y:04d}-01-01") if min_d else f"{y:04d}-01-01"
-                    if isinstance(rules, dict) and ("max_year" in rules):
-                        y = int(rules.get("max_year"))
-                        max_d = min(max_d, f"{y:04d}-12-31") if max_d else f"{y:04d}-12-31"
-                except Exception:
-                    pass
-                ok_bounds = True
-                try:
-                    if min_d and val < str(min_d):
-                        errors[code] = "before_min_date"; ok_bounds = False
-                    if ok_bounds and max_d and val > str(max_d):
-                        errors[code] = "after_max_date"; ok_bounds = False
-                    # relative rules against another date answer in same payload
-                    if ok_bounds and isinstance(rules, dict) and rules.get("not_before_code"):
-                        other_code = str(rules.get("not_before_code"))
-                        other_val = answers.get(other_code)
-                        if other_val:
-                            ov, oerr = coerce_date(str(other_val))
-                            if not oerr and ov and val < ov:
-                                errors[code] = "before_other_date"; ok_bounds = False
-                    if ok_bounds and isinstance(rules, dict) and rules.get("not_after_code"):
-                        other_code = str(rules.get("not_after_code"))
-                        other_val = answers.get(other_code)
-                        if other_val:
-                            ov, oerr = coerce_date(str(other_val))
-                            if not oerr and ov and val > ov:
-                                errors[code] = "after_other_date"; ok_bounds = False
-                    # age-based rules relative to today (e.g., DOB must be at least N years old)
-                    if ok_bounds and isinstance(rules, dict) and ("min_age_years" in rules or "max_age_years" in rules):
-                        d_obj = datetime.strptime(val, "%Y-%m-%d").date()
-                        today = date.today()
-                        if "min_age_years" in rules:
-                            try:
-                                min_age = int(rules.get("min_age_years"))
-                                if _add_years(d_obj, min_age) > today:
-                                    errors[code] = "min_age"; ok_bounds = False
-                            except Exception:
-                                pass
-                        if ok_bounds and "max_age_years" in rules:
-                            try:
-                                max_age = int(rules.get("max_age_years"))
-                                # if older than max_age (i.e., birth date + max_age < today), that's still valid; we flag only if younger than allowed max_age? Generally, max_age means age <= max.
-                                # Here interpret: age must be <= max_age -> if add max_age years is before today, still ok. If add max_age years is before a date further than today? We'll consider violation if age > max.
-                                if _add_years(d_obj, max_age) < today:
-                                    errors[code] = "max_age"; ok_bounds = False
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-                if ok_bounds:
-                    normalized[code] = val
-        elif qtype in ("single_choice", "choice"):
-            opts = {o.value for o in qu.options}
-            sval = str(raw)
-            if sval not in opts:
-                errors[code] = "invalid_option"
-            else:
-                normalized[code] = sval
-        elif qtype == "multi_choice":
-            if not isinstance(raw, (list, tuple)):
-                errors[code] = "not_array"
-            else:
-                opts = {o.value for o in qu.options}
-                invalid = [v for v in raw if v not in opts]
-                if invalid:
-                    errors[code] = {"invalid_options": invalid}
-                else:
-                    normalized[code] = list(raw)
-        else:
-            # fallback: store as string
-            normalized[code] = str(raw)
+                normalized[code] = value
+
+        if profile:
+            lap = perf_counter_ns()
+        other_fields = self.other_fields if only is None else [f for f in scoped if f.other_values and f.type in _CHOICE_TYPES]
+        _apply_domain_rules(other_fields, answers, only, visible, errors, normalized)
+        if profile:
+            lap = profile.lap("domain", lap)
+        if self.computed:
+            _apply_computed(self.computed, fields, answers, only, visible, errors, normalized)
+            if profile:
+                profile.lap("computed", lap)
+        return len(errors) == 0, errors, normalized
+
+    def validate_partial(self, answers: Dict[str, Any], changed: Iterable[str], clear_nulls: bool = False) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
+        """Validate only ``changed`` codes (plus ``otro_`` companions and dependents).
+
+        ``answers`` is the full context (stored answers with the changes applied).
+        Dependents are re-checked against the new context but, as their values did
+        not change, only the changed codes (and computed fields) are normalized.
+        With ``clear_nulls`` (delta saves) a changed code whose value is None is a
+        cleared answer: it is normalized to None (the stored item is emptied) and
+        only a "required" error is reported for it.
+        """
+        changed = set(changed)
+        base = {c for c in changed if c in self.fields}
+        base |= {c[5:] for c in changed if c.startswith("otro_") and c[5:] in self.fields}
+        scope = self.affected(base)
+        ok, errors, normalized = self.validate(answers, only=scope)
+        keep = changed | {cf.code for cf in self.computed}  # computed values follow their inputs
+        normalized = {k: v for k, v in normalized.items() if k in keep or k not in scope}
+        if clear_nulls:
+            for code in base & changed:
+                if code in answers and answers[code] is None:
+                    if errors.get(code) != "required":
+                        errors.pop(code, None)
+                    normalized[code] = None
+            ok = not errors
+        return ok, errors, normalized
+
+    def critical_errors(self, errors: Mapping[str, Any], among: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Subset of ``errors`` that must block a save (per-question policy)."""
+        among = set(among) if among is not None else None
+        critical = {}
+        for key, err in errors.items():
+            if among is not None and key not in among:
+                continue
+            if key.startswith("otro_") and err == "required":
+                critical[key] = err  # missing inline 'otro_' when "other" is selected
+                continue
+            f = self.fields.get(key)
+            policy = f.critical if f is not None else (_ICFES_CRITICAL if key in _ICFES_CODES else frozenset())
+            if ANY_ERROR in policy or error_code(err) in policy:
+                critical[key] = err
+        return critical
+
+
+def _apply_domain_rules(other_fields, answers, only, visible, errors, normalized) -> None:
+    """Domain-specific validations (migrated from legacy rules)."""
+    def in_scope(code):
+        # hidden questions are not validated (same as the type checks)
+        return (only is None or code in only) and visible.get(code, True)
 
-    # --- Domain-specific validations and computed fields (migrated from legacy rules) ---
     try:
-        # ICFES global score auto-calc if component scores present
-        comps = []
-        comp_codes = [
-            "puntaje_lectura_critica",
-            "puntaje_matematicas",
-            "puntaje_sociales_ciudadanas",
-            "puntaje_ciencias_naturales",
-            "puntaje_ingles",
-        ]
-        for cc in comp_codes:
-            v = answers.get(cc)
-            try:
-                v = int(v) if v is not None and v != "" else None
-            except Exception:
-                v = None
-            comps.append(v)
-        if all(v is not None for v in comps):
-            lc, m, sc, cn, i = comps
-            ponderado = 3 * (lc + m + sc + cn) + i
-            indice = ponderado / 13
-            global_calc = round(indice * 5)
-            # normalize within 0..500 just in case
-            global_calc = max(0, min(500, int(global_calc)))
-            normalized["puntaje_global_saber11"] = global_calc
         # Range checks for score components (0..100)
-        for cc in [
-            "puntaje_lectura_critica",
-            "puntaje_matematicas",
-            "puntaje_sociales_ciudadanas",
-            "puntaje_ciencias_naturales",
-            "puntaje_ingles",
-        ]:
-            if cc in answers and answers.get(cc) not in (None, ""):
+        for cc in _ICFES_COMPONENTS:
+            if in_scope(cc) and cc in answers and answers.get(cc) not in (None, ""):
                 try:
                     vi = int(answers.get(cc))
                     if not (0 <= vi <= 100):
@@ -363,7 +614,7 @@ def validate_answers(version, answers: Dict[str, Any]) -> Tuple[bool, Dict[str,
                 except Exception:
                     errors[cc] = "not_integer"
         # Range check for global (0..500) if provided explicitly
-        if "puntaje_global_saber11" in answers and answers.get("puntaje_global_saber11") not in (None, ""):
+        if in_scope("puntaje_global_saber11") and "puntaje_global_saber11" in answers and answers.get("puntaje_global_saber11") not in (None, ""):
             try:
                 gv = int(answers.get("puntaje_global_saber11"))
                 if not (0 <= gv <= 500):
@@ -374,30 +625,121 @@ def validate_answers(version, answers: Dict[str, Any]) -> Tuple[bool, Dict[str,
                 errors["puntaje_global_saber11"] = "not_integer"
         # Generic handling for "Otro": if a question has options flagged as is_other and the answer selects any of them,
         # require a companion text answer in answers["otro_<code>"] to be non-empty.
-        for code, qu in code_map.items():
-            if not visible_cache.get(code, True):
-                continue
-            if not getattr(qu, "options", None):
-                continue
-            other_values = [getattr(o, "value", None) for o in qu.options if getattr(o, "is_other_flag", False)]
-            other_values = [v for v in other_values if v]
-            if not other_values:
+        for f in other_fields:
+            if not in_scope(f.code):
                 continue
-            ans = answers.get(code)
-            selected_other = False
-            if qu.type in ("single_choice", "choice"):
-                selected_other = ans in other_values
-            elif qu.type == "multi_choice" and isinstance(ans, (list, tuple)):
-                selected_other = any(v in other_values for v in ans)
+            ans = answers.get(f.code)
+            if f.type == "multi_choice":
+                selected_other = isinstance(ans, (list, tuple)) and f.codec.selects_other(ans)
+            else:
+                selected_other = f.codec.is_other(ans)
             if selected_other:
-                companion_key = f"otro_{code}"
+                companion_key = f"otro_{f.code}"
                 if not str(answers.get(companion_key) or "").strip():
                     errors[companion_key] = "required"
     except Exception:
         # Defensive: domain rules should not crash validation
         pass
 
-    ok = len(errors) == 0
-    return ok, errors, normalized
 
-__all__ = ["validate_answers"]
\ No newline at end of file
+def _apply_computed(computed, fields, answers, only, visible, errors, normalized) -> None:
+    """Evaluate computed questions (see ``computed_fields``); their value replaces any submitted one.
+
+    Expressions read normalized values only, so unvalidated or hidden answers
+    never reach the arithmetic. In a scoped run, inputs outside the scope were
+    not normalized: they are checked here on demand.
+    """
+    env = dict(normalized)
+    for cf in computed:
+        code = cf.code
+        if (only is not None and code not in only) or not visible.get(code, True):
+            continue
+        if only is not None:
+            for name in cf.expression.inputs:
+                if name in only or name in env or name not in answers or name not in fields or not visible.get(name, True):
+                    continue
+                err, value = _CHECKS.get(fields[name].type, _check_fallback)(fields[name], answers[name], answers)
+                if err is None:
+                    env[name] = value
+        value = cf.expression.evaluate(env)
+        if value is None:
+            continue  # inputs incomplete: the submitted value (if any) was validated as usual
+        f = fields[code]
+        err, value = _CHECKS.get(f.type, _check_fallback)(f, value, answers)
+        errors.pop(code, None)
+        if err is not None:
+            errors[code] = err
+            normalized.pop(code, None)
+            env.pop(code, None)
+            continue
+        normalized[code] = env[code] = value  # later computed questions read this value
+
+
+def compile_validator(version) -> CompiledValidator:
+    """Compile the rules of a VersionIndex (or ORM QuestionnaireVersion)."""
+    code_map = getattr(version, "by_code", None)
+    if code_map is None:
+        code_map = {}
+        for sec in version.sections:
+            for qu in sec.questions:
+                code_map[qu.code] = qu
+    fields = {code: compile_field(qu) for code, qu in code_map.items()}
+    computed = compile_computed(code_map)
+    computed_inputs = {cf.code: cf.expression.inputs for cf in computed}
+    dependents = getattr(version, "dependents", None)
+    if dependents is None:
+        graph: Dict[str, set] = {}
+        for f in fields.values():
+            refs = referenced_codes(f.visible_if) | {c for c in (f.not_before_code, f.not_after_code) if c}
+            refs |= computed_inputs.get(f.code, frozenset())
+            for ref in refs - {f.code}:
+                graph.setdefault(ref, set()).add(f.code)
+        dependents = MappingProxyType({k: frozenset(v) for k, v in graph.items()})
+    reach = {}
+    for code in dependents:
+        seen, stack = set(), list(dependents[code])
+        while stack:
+            node = stack.pop()
+            if node not in seen and node != code:
+                seen.add(node)
+                stack.extend(dependents.get(node, ()))
+        reach[code] = frozenset(seen)
+    return CompiledValidator(
+        version_id=getattr(version, "version_id", getattr(version, "id", None)),
+        fields=MappingProxyType(fields),
+        other_fields=tuple(f for f in fields.values() if f.other_values and f.type in _CHOICE_TYPES),
+        visibility=build_graph({code: f.visible_if for code, f in fields.items()}),
+        dependents=dependents,
+        reach=MappingProxyType(reach),
+        position=MappingProxyType({code: i for i, code in enumerate(fields)}),
+        computed=computed,
+    )
+
+
+# version_id -> (VersionIndex the validator was compiled from, validator)
+_VALIDATORS: Dict[int, Tuple[Any, CompiledValidator]] = {}
+_LOCK = Lock()
+
+
+def get_validator(version) -> CompiledValidator:
+    """Cached validator for a VersionIndex; recompiled when the index is rebuilt.
+
+    ORM versions are compiled on every call (no stable identity to key on).
+    """
+    version_id = getattr(version, "version_id", None)
+    if version_id is None or getattr(version, "by_code", None) is None:
+        return compile_validator(version)
+    entry = _VALIDATORS.get(version_id)
+    if entry is not None and entry[0] is version:
+        return entry[1]
+    validator = compile_validator(version)
+    with _LOCK:
+        _VALIDATORS[version_id] = (version, validator)
+    return validator
+
+
+def validate_answers(version, answers: Dict[str, Any], only: Optional[Iterable[str]] = None) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
+    return get_validator(version).validate(answers, only)
+
+
+__all__ = ["validate_answers", "evaluate_visibility", "compile_validator", "get_validator", "CompiledValidator", "FieldRules"]
@@ -0,0 +1,82 @@
+"""Finalize a dynamic questionnaire response with a fixed number of statements.
+
+Works on the cached ``VersionIndex`` (no structure queries) and batches the
+remaining reads:
+
+ 1. assignment + response of the target version (and the UX survey assignment,
+    used for the post-finalize prompt) in one query,
+ 2. the existing response items (bulk upsert diff),
+ 3. the existing prefill rows of the user.
+
+In event log mode (``compact_events``) the pending answer events of the response
+are read as well and folded into the same item upsert (payload values win), and
+the new watermark travels with the response UPDATE.
+
+Writes are one executemany per item batch, the prefill rows, one UPDATE of the
+assignment and one revision-guarded UPDATE of the response. The caller commits.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from backend.services import prefill_index, response_events, response_store
+from backend.services.ml_inference_service import try_infer_and_store
+from backend.services.version_index import VersionIndex
+
+
+@dataclass
+class FinalizeOutcome:
+    assignment_id: Optional[int] = None
+    response_id: Optional[int] = None
+    ml: Optional[Dict[str, Any]] = None
+    ux_pending: bool = False
+    conflict: bool = False  # a concurrent writer advanced the revision; caller rolls back
+
+
+def finalize_answers(s, v_index: VersionIndex, user_code: str, normalized: Dict[str, Any],
+                     ux_version_id: Optional[int] = None, compact_events: bool = False) -> FinalizeOutcome:
+    """Persist validated answers, run ML and mark the assignment finalized (no commit).
+
+    ``ux_version_id`` (target version of the UX survey) is looked up in the same
+    query as the assignment so ``ux_pending`` costs nothing extra.
+    """
+    version_id = v_index.version_id
+    question_map = v_index.by_code
+    state = response_store.load_assignments(s, user_code, (version_id, ux_version_id))
+    assign, resp = state.get(version_id, (None, None))
+    if assign is None:
+        assign, _ = response_store.get_or_create_assignment(s, user_code, version_id)
+    if resp is None:
+        resp, _ = response_store.get_or_create_response(s, assign.id)
+    encoded = response_store.encode_items(question_map, normalized)
+    compacted_event_id = None
+    if compact_events:
+        pending = response_events.pending_events(s, resp.id, resp.compacted_event_id or 0)
+        encoded = {
+            **{qid: enc for qid, enc in pending.values.items() if qid in v_index.qid_to_code},
+            **encoded,
+        }
+        compacted_event_id = pending.last_id
+    result = response_store.upsert_encoded(s, resp.id, encoded)
+    prefill_index.record_values(s, user_code, {k: v for k, v in normalized.items() if k in question_map}, version_id)
+    # ML only reads the binding (index metadata) and the normalized answers
+    ml_summary = try_infer_and_store(s, v_index, resp, normalized, question_map)
+    response_store.apply_progress(assign, result.answered_delta, len(question_map))
+    assign.status = "finalized"
+    if not response_store.close_response(s, resp, resp.revision or 0, bump=bool(result.written),
+                                         compacted_event_id=compacted_event_id):
+        return FinalizeOutcome(conflict=True)
+    ml = resp.summary_cache.get("ml") if isinstance(resp.summary_cache, dict) else None
+    ux_pending = False
+    if ux_version_id and ux_version_id != version_id:
+        ux_assign = state.get(ux_version_id, (None, None))[0]
+        ux_pending = not (ux_assign is not None and ux_assign.status == "finalized")
+    return FinalizeOutcome(
+        assignment_id=assign.id,
+        response_id=resp.id,
+        ml=ml or (ml_summary if isinstance(ml_summary, dict) else None),
+        ux_pending=ux_pending,
+    )
+
+
+__all__ = ["FinalizeOutcome", "finalize_answers"]
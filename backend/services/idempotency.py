@@ -0,0 +1,127 @@
+"""Short-lived idempotency-key result store.
+
+Clients may send an ``Idempotency-Key`` header on save/finalize. The first
+request with a key runs normally and its JSON response is recorded; replays of
+the same key (keepalive duplicates, client retries) get the recorded response
+without touching the database or the ML model.
+
+ - Entries expire after ``ttl_seconds`` and the store keeps at most
+   ``max_entries`` (least recently used are evicted first).
+ - ``begin`` returns ``(replay, state)``. A replay that arrives while the first
+   request is still running waits for it briefly. If that request is still
+   running, or was aborted, it then gets ``(None, "in_progress")``.
+ - Reusing a key with a different payload gets ``(None, "mismatch")``.
+ - 5xx responses are not recorded, so a retry after a server error runs again.
+
+The store is per worker process; a replay routed to another worker runs
+normally (saves/finalize stay correct, just not deduplicated).
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from time import time
+from typing import Any, Hashable, Optional, Tuple
+import hashlib
+import json
+import os
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    created_at: float
+    done: Event = field(default_factory=Event)
+    status: Optional[int] = None
+    body: Any = None
+
+
+@dataclass(frozen=True)
+class Replay:
+    status: int
+    body: Any
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 2000, wait_seconds: float = 5):
+        self.ttl = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self.wait_seconds = float(wait_seconds)
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        try:
+            ttl = float(os.environ.get("DQ_IDEMPOTENCY_TTL_SECONDS", "300") or 300)
+        except ValueError:
+            ttl = 300.0
+        try:
+            max_entries = int(os.environ.get("DQ_IDEMPOTENCY_MAX", "2000") or 2000)
+        except ValueError:
+            max_entries = 2000
+        return cls(ttl, max_entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _purge(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created_at < self.ttl and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def begin(self, key: Hashable, fingerprint: str) -> Tuple[Optional[Replay], str]:
+        """Reserve a key or return its recorded result.
+
+        Returns (replay, state) where state is one of:
+          "new"         -> caller runs the request and must call finish()/abort()
+          "replay"      -> replay holds the recorded response
+          "mismatch"    -> key reused with a different payload
+          "in_progress" -> first request still running after waiting (or aborted meanwhile)
+        """
+        now = time()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(fingerprint=fingerprint, created_at=now)
+                self._purge(now)
+                return None, "new"
+            self._entries.move_to_end(key)
+        if entry.fingerprint != fingerprint:
+            return None, "mismatch"
+        if not entry.done.wait(self.wait_seconds):
+            return None, "in_progress"
+        if entry.status is None:
+            return None, "in_progress"
+        return Replay(entry.status, entry.body), "replay"
+
+    def finish(self, key: Hashable, status: int, body: Any) -> None:
+        """Record the response of a reserved key (5xx responses release the key instead)."""
+        if status >= 500:
+            self.abort(key)
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.status = status
+        entry.body = body
+        entry.done.set()
+
+    def abort(self, key: Hashable) -> None:
+        """Release a reservation without recording (request failed)."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+
+__all__ = ["IdempotencyStore", "Replay"]
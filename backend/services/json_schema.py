@@ -0,0 +1,289 @@
+"""JSON Schema (draft 2020-12) export of a version's validation rules.
+
+``schema_document(v_index)`` compiles the rules that the server enforces
+(``dynamic_validation.FieldRules``) into one schema for the answers object, so
+clients can pre-validate before save/finalize:
+
+ - types: text/textarea/email -> string, number -> integer or number,
+   scale_1_5 -> integer 1..5, boolean, date -> string/date, choices -> enum,
+   multi_choice -> array of enum; strings and lists also carry the payload caps
+   of ``payload_limits``;
+ - minLength/maxLength, regex (anchored ``pattern``, translated from Python
+   ``re`` to ECMA-262 syntax; patterns with Python-only constructs such as
+   inline flags are exported as ``x-pattern`` and only checked by the server),
+   minimum/maximum,
+   ``multipleOf`` for steps that divide exactly in binary floating point and are
+   aligned with 0 (``x-step`` with the base otherwise, e.g. 0.1), date bounds
+   as ``formatMinimum``/``formatMaximum``;
+ - required questions without visible_if are listed in ``required``; the ones
+   with a rule become ``if``/``then`` blocks built from the rule (the cascade
+   through hidden parents is not expressible; the raw rule is kept as
+   ``x-visible-if`` for the client evaluator);
+ - "other" options require ``otro_<code>`` through ``if``/``then`` as well;
+ - rules JSON Schema has no keyword for (not_after_today, relative dates, age
+   limits, critical error codes) are exported as ``x-`` annotations;
+ - computed questions are ``readOnly``.
+
+Documents are cached per VersionIndex (same lifetime as the validator) with an
+ETag derived from the serialized body, so the endpoint can answer 304.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+
+from backend.services import payload_limits
+from backend.services.dynamic_validation import _ICFES_COMPONENTS, ANY_ERROR, get_validator
+
+SCHEMA_DIALECT = "https://json-schema.org/draft/2020-12/schema"
+_EMPTY_VALUES = [None, "", []]
+
+
+def _leaf(code: str, op: str, expected) -> Dict[str, Any]:
+    present = {"required": [code]}
+    if op == "equals":
+        if expected is None:
+            return {"anyOf": [{"not": present}, {"properties": {code: {"const": None}}}]}
+        return {**present, "properties": {code: {"const": expected}}}
+    if op == "not_equals":
+        return {"not": _leaf(code, "equals", expected)}
+    if op in ("in", "not_in"):
+        allowed = list(expected) if isinstance(expected, (list, tuple)) else [expected]
+        member = {**present, "properties": {code: {"anyOf": [{"enum": allowed}, {"type": "array", "contains": {"enum": allowed}}]}}}
+        return member if op == "in" else {"not": member}
+    if op == "answered":
+        answered = {**present, "properties": {code: {"not": {"enum": _EMPTY_VALUES}}}}
+        return answered if expected else {"not": answered}
+    try:
+        bound = float(expected)
+    except (TypeError, ValueError):
+        return {"not": {}}  # never matches (as on the server)
+    keyword = {"gt": "exclusiveMinimum", "gte": "minimum", "lt": "exclusiveMaximum", "lte": "maximum"}[op]
+    return {**present, "properties": {code: {"type": "number", keyword: bound}}}
+
+
+def rule_to_schema(rule) -> Dict[str, Any]:
+    """visible_if rule -> schema that the answers object satisfies when the question is visible."""
+    if not rule or not isinstance(rule, dict):
+        return {}
+    if "and" in rule:
+        return {"allOf": [rule_to_schema(r) for r in (rule["and"] or [])]}
+    if "or" in rule:
+        parts = [rule_to_schema(r) for r in (rule["or"] or [])]
+        return {"anyOf": parts} if parts else {"not": {}}
+    code = rule.get("code")
+    if not code:
+        return {}
+    ops = [op for op in ("equals", "not_equals", "in", "not_in", "gt", "gte", "lt", "lte", "answered") if op in rule]
+    if not ops:
+        return _leaf(str(code), "equals", None)
+    parts = [_leaf(str(code), op, rule[op]) for op in ops]
+    return parts[0] if len(parts) == 1 else {"allOf": parts}
+
+
+# Python-only group syntax after "(?": named group/backref and inline flags,
+# comments, conditionals, atomic groups (ECMA-262 has named groups as "(?<")
+_PY_GROUP_FLAGS = set("aiLmsux-")
+
+
+def ecma_pattern(source: str) -> Optional[str]:
+    """Python ``re`` source -> ECMA-262 equivalent, or None when it cannot be translated.
+
+    Rewrites ``(?P<name>``, ``(?P=name)``, ``\\A`` and ``\\Z``; inline flags,
+    ``(?#...)``, conditionals and atomic groups have no ECMA-262 equivalent.
+    """
+    out: List[str] = []
+    i, n, in_class = 0, len(source), False
+    while i < n:
+        ch = source[i]
+        if ch == "\\":
+            esc = source[i:i + 2]
+            if not in_class and esc == "\\A":
+                out.append("^")
+            elif not in_class and esc == "\\Z":
+                out.append("$")
+            else:
+                out.append(esc)
+            i += 2
+            continue
+        if in_class:
+            in_class = ch != "]"
+            out.append(ch)
+            i += 1
+            continue
+        if ch == "[":
+            # a leading "]" is literal in Python ("[]a]", "[^]a]") but closes an empty class in ECMA-262
+            j = i + 1
+            j += source.startswith("^", j)
+            out.append(source[i:j])
+            if source.startswith("]", j):
+                out.append("\\]")
+                j += 1
+            i, in_class = j, True
+            continue
+        if source.startswith("(?", i):
+            nxt = source[i + 2:i + 3]
+            if source.startswith("(?P<", i):
+                out.append("(?<")
+                i += 4
+                continue
+            if source.startswith("(?P=", i):
+                end = source.find(")", i)
+                if end < 0:
+                    return None
+                out.append("\\k<%s>" % source[i + 4:end])
+                i = end + 1
+                continue
+            if nxt in _PY_GROUP_FLAGS or nxt in ("#", "(", ">"):
+                return None
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _string(schema: Dict[str, Any], min_len=None, max_len=None) -> Dict[str, Any]:
+    schema["type"] = "string"
+    if min_len is not None:
+        schema["minLength"] = min_len
+    limit = payload_limits.MAX_ANSWER_CHARS
+    schema["maxLength"] = min(max_len, limit) if max_len is not None else limit
+    return schema
+
+
+def field_schema(f, qu) -> Dict[str, Any]:
+    """FieldRules (+ question meta for labels) -> property schema."""
+    schema: Dict[str, Any] = {"title": getattr(qu, "text", None) or f.code}
+    qtype = f.type
+    if qtype in ("text", "textarea"):
+        _string(schema, f.min_len, f.max_len)
+        if f.pattern is not None:
+            translated = ecma_pattern(f.pattern.pattern)
+            if translated is None:
+                schema["x-pattern"] = f.pattern.pattern
+            else:
+                schema["pattern"] = f"^(?:{translated})$"
+    elif qtype == "email":
+        _string(schema)
+        schema["format"] = "email"
+    elif qtype == "number":
+        schema["type"] = "number" if f.allow_decimal else "integer"
+        if f.min_value is not None:
+            schema["minimum"] = f.min_value
+        if f.max_value is not None:
+            schema["maximum"] = f.max_value
+        if f.step is not None:
+            base = f.min_value or 0.0
+            # multipleOf only when float division is exact (0.5, 2, ...); 0.1 would reject 4.3
+            if (f.step * 1024).is_integer() and (base / f.step).is_integer():
+                schema["multipleOf"] = f.step
+            else:
+                schema["x-step"] = {"step": f.step, "base": base}
+    elif qtype == "scale_1_5":
+        schema.update(type="integer", minimum=1, maximum=5)
+    elif qtype == "boolean":
+        schema["type"] = "boolean"
+    elif qtype == "date":
+        schema.update(type="string", format="date")
+        if f.min_date:
+            schema["formatMinimum"] = f.min_date
+        if f.max_date:
+            schema["formatMaximum"] = f.max_date
+        for key, value in (
+            ("x-not-after-today", f.not_after_today or None),
+            ("x-not-before-code", f.not_before_code),
+            ("x-not-after-code", f.not_after_code),
+            ("x-min-age-years", f.min_age),
+            ("x-max-age-years", f.max_age),
+        ):
+            if value is not None:
+                schema[key] = value
+    elif qtype in ("single_choice", "choice"):
+        schema["enum"] = sorted(f.options)
+    elif qtype == "multi_choice":
+        schema.update(type="array", items={"enum": sorted(f.options)}, maxItems=payload_limits.MAX_ANSWER_ITEMS)
+    else:
+        _string(schema)
+    if f.code in _ICFES_COMPONENTS:
+        schema.update(type="integer", minimum=0, maximum=100)
+    elif f.code == "puntaje_global_saber11":
+        schema.update(type="integer", minimum=0, maximum=500)
+    if f.visible_if:
+        schema["x-visible-if"] = f.visible_if
+    if f.critical:
+        schema["x-critical"] = ["*"] if ANY_ERROR in f.critical else sorted(f.critical)
+    return schema
+
+
+def build_schema(v_index) -> Dict[str, Any]:
+    validator = get_validator(v_index)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    conditions: List[Dict[str, Any]] = []
+    computed = {cf.code for cf in validator.computed}
+    for code, f in validator.fields.items():
+        prop = field_schema(f, v_index.by_code.get(code))
+        if code in computed:
+            prop["readOnly"] = True
+        properties[code] = prop
+        if f.required and code not in computed:
+            if f.visible_if:
+                conditions.append({"if": rule_to_schema(f.visible_if), "then": {"required": [code]}})
+            else:
+                required.append(code)
+    for f in validator.other_fields:
+        companion = f"otro_{f.code}"
+        properties[companion] = _string({"title": f"{f.code}: otro"})
+        others = list(f.other_values)
+        selects = {"enum": others} if f.type != "multi_choice" else {"type": "array", "contains": {"enum": others}}
+        conditions.append({
+            "if": {"required": [f.code], "properties": {f.code: selects}},
+            "then": {"required": [companion], "properties": {companion: {"pattern": "\\S"}}},
+        })
+    schema: Dict[str, Any] = {
+        "$schema": SCHEMA_DIALECT,
+        "title": f"Questionnaire version {v_index.version_id}",
+        "type": "object",
+        "x-version-id": v_index.version_id,
+        "x-version-number": v_index.version_number,
+        "properties": properties,
+    }
+    if required:
+        schema["required"] = required
+    if conditions:
+        schema["allOf"] = conditions
+    return schema
+
+
+@dataclass(frozen=True)
+class SchemaDocument:
+    body: bytes  # serialized JSON, served as is
+    etag: str  # quoted strong ETag
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True when an If-None-Match header already names this document."""
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+# version_id -> (VersionIndex the document was built from, document)
+_DOCUMENTS: Dict[int, Tuple[Any, SchemaDocument]] = {}
+_LOCK = Lock()
+
+
+def schema_document(v_index) -> SchemaDocument:
+    """Cached schema of a VersionIndex; rebuilt when the index is rebuilt."""
+    entry = _DOCUMENTS.get(v_index.version_id)
+    if entry is not None and entry[0] is v_index:
+        return entry[1]
+    body = json.dumps(build_schema(v_index), ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    doc = SchemaDocument(body=body, etag='"%s"' % hashlib.sha256(body).hexdigest()[:32])
+    with _LOCK:
+        _DOCUMENTS[v_index.version_id] = (v_index, doc)
+    return doc
+
+
+__all__ = ["SCHEMA_DIALECT", "SchemaDocument", "rule_to_schema", "ecma_pattern", "field_schema", "build_schema", "schema_document"]
@@ -0,0 +1,151 @@
+"""Choice options of a question as compact bit positions.
+
+``OptionCodec`` numbers the options of a single_choice / multi_choice question
+in display order (bit 0 = first option) so an answer becomes one integer:
+membership is a dict lookup, "selected an other option" is ``mask & other_mask``
+and a multi_choice selection is a bitmask (duplicates collapse). Codecs are
+built once per question by ``dynamic_validation.compile_field`` and cached with
+the validator of the version.
+
+Answers stay stored as values (``dq_response_item.value`` / ``values_json``):
+bit positions follow the option order, which drafts can still change, so masks
+are derived when reading instead of persisted.
+
+``option_stats`` counts how many responses of a version picked each option:
+answers are turned into masks and counted per bit (NumPy when available, up to
+63 options per question; plain integers otherwise).
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Optional numpy; per-bit counting falls back to integers without it
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+_NUMPY_BITS = 63  # int64 without the sign bit
+
+
+@dataclass(frozen=True)
+class OptionCodec:
+    values: Tuple[str, ...]  # bit -> value (display order)
+    bits: Mapping[str, int]  # value -> bit
+    other_mask: int = 0  # options flagged is_other
+
+    @classmethod
+    def from_options(cls, options: Iterable[Any]) -> "OptionCodec":
+        """OptionMeta / ORM Option rows (already in display order)."""
+        values: List[str] = []
+        bits: Dict[str, int] = {}
+        other_mask = 0
+        for o in options:
+            value = getattr(o, "value", None)
+            if value is None or value in bits:
+                continue
+            bits[value] = len(values)
+            values.append(value)
+            if getattr(o, "is_other_flag", False) and value:
+                other_mask |= 1 << bits[value]
+        return cls(values=tuple(values), bits=MappingProxyType(bits), other_mask=other_mask)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def mask(self, selected) -> Optional[int]:
+        """Value or list of values -> bitmask; None if any value is not an option."""
+        bits = self.bits
+        if not isinstance(selected, (list, tuple)):
+            bit = bits.get(selected) if isinstance(selected, str) else None
+            return None if bit is None else 1 << bit
+        mask = 0
+        for value in selected:
+            bit = bits.get(value) if isinstance(value, str) else None
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def decode(self, mask: int) -> List[str]:
+        """Bitmask -> selected values in display order."""
+        return [v for i, v in enumerate(self.values) if mask >> i & 1]
+
+    def is_other(self, value) -> bool:
+        bit = self.bits.get(value) if isinstance(value, str) else None
+        return bit is not None and bool(self.other_mask >> bit & 1)
+
+    def selects_other(self, answer) -> bool:
+        """True when the answer (value or list of values) picks an option flagged is_other."""
+        if not self.other_mask:
+            return False
+        if isinstance(answer, (list, tuple)):
+            return any(self.is_other(v) for v in answer)
+        return self.is_other(answer)
+
+
+def count_bits(masks: List[int], width: int) -> List[int]:
+    """Per-bit totals of a list of masks (index i = how many masks have bit i)."""
+    if not masks or not width:
+        return [0] * width
+    if np is not None and width <= _NUMPY_BITS:
+        arr = np.array(masks, dtype=np.int64)
+        shifts = np.arange(width, dtype=np.int64)
+        return ((arr[:, None] >> shifts) & 1).sum(axis=0).tolist()
+    return [sum(1 for m in masks if m >> i & 1) for i in range(width)]
+
+
+def option_stats(s, v_index, codec_by_code: Mapping[str, OptionCodec], only_finalized: bool = False) -> List[Dict[str, Any]]:
+    """Option counts of every choice question of a version (stored dq_response_item snapshot).
+
+    Returns one entry per question, in display order:
+    ``{code, type, answered, invalid, options: [{value, label, count}]}``;
+    ``invalid`` counts answers that are not (or no longer) options.
+    """
+    from sqlalchemy import select
+    from database.dynamic_models import QuestionnaireAssignment, Response, ResponseItem
+    from backend.services.response_store import decode_item
+
+    choice = {qu.id: code for code, qu in v_index.by_code.items() if code in codec_by_code}
+    masks: Dict[str, List[int]] = {code: [] for code in choice.values()}
+    invalid: Dict[str, int] = {code: 0 for code in choice.values()}
+    if choice:
+        query = (
+            select(ResponseItem.question_id, ResponseItem.value, ResponseItem.numeric_value,
+                   ResponseItem.float_value, ResponseItem.values_json)
+            .join(Response, Response.id == ResponseItem.response_id)
+            .join(QuestionnaireAssignment, QuestionnaireAssignment.id == Response.assignment_id)
+            .where(QuestionnaireAssignment.questionnaire_version_id == v_index.version_id,
+                   ResponseItem.question_id.in_(list(choice)))
+        )
+        if only_finalized:
+            query = query.where(QuestionnaireAssignment.status == "finalized")
+        for it in s.execute(query):
+            code = choice[it.question_id]
+            value = decode_item(it, v_index.by_code[code].type)
+            if value is None or value == "" or value == []:
+                continue
+            mask = codec_by_code[code].mask(value)
+            if mask is None:
+                invalid[code] += 1
+            else:
+                masks[code].append(mask)
+    result = []
+    for code in v_index.codes:
+        if code not in masks:
+            continue
+        codec = codec_by_code[code]
+        labels = {o.value: o.label for o in v_index.by_code[code].options}
+        counts = count_bits(masks[code], len(codec))
+        result.append({
+            "code": code,
+            "type": v_index.by_code[code].type,
+            "answered": len(masks[code]) + invalid[code],
+            "invalid": invalid[code],
+            "options": [{"value": v, "label": labels.get(v, v), "count": n} for v, n in zip(codec.values, counts)],
+        })
+    return result
+
+
+__all__ = ["OptionCodec", "count_bits", "option_stats"]
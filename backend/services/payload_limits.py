@@ -0,0 +1,70 @@
+"""Cheap bounds applied to answer payloads before validation.
+
+``create_app`` sets Flask's ``MAX_CONTENT_LENGTH`` from ``DQ_MAX_REQUEST_BYTES``
+(default 256 KiB), so oversized bodies are rejected with 413 from the
+Content-Length header / while streaming, before any JSON is parsed.
+
+``bound_answers`` then trims a parsed ``answers``/``changes`` dict to the codes
+of the target version (plus their ``otro_<code>`` companions) using the cached
+VersionIndex, and enforces per-field caps so validation never walks huge
+strings or lists:
+
+ - strings (and each list item) up to ``DQ_MAX_ANSWER_CHARS`` characters
+   (default 2000, the size of dq_response_item.value),
+ - lists up to ``DQ_MAX_ANSWER_ITEMS`` entries (default 100),
+ - objects are never valid answers.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Tuple
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        value = int(os.environ.get(name, default) or default)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+MAX_REQUEST_BYTES = _env_int("DQ_MAX_REQUEST_BYTES", 256 * 1024)
+MAX_ANSWER_CHARS = _env_int("DQ_MAX_ANSWER_CHARS", 2000)
+MAX_ANSWER_ITEMS = _env_int("DQ_MAX_ANSWER_ITEMS", 100)
+
+
+def _field_error(value: Any):
+    if isinstance(value, str):
+        return "too_long" if len(value) > MAX_ANSWER_CHARS else None
+    if isinstance(value, (list, tuple)):
+        if len(value) > MAX_ANSWER_ITEMS:
+            return "too_many_items"
+        for item in value:
+            if isinstance(item, (dict, list, tuple)):
+                return "invalid_value"
+            if isinstance(item, str) and len(item) > MAX_ANSWER_CHARS:
+                return "too_long"
+        return None
+    if isinstance(value, dict):
+        return "invalid_value"
+    return None
+
+
+def bound_answers(v_index, answers: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Return (answers limited to known codes, {code: error}) for a payload dict."""
+    known = v_index.by_code
+    bounded: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for code, value in answers.items():
+        if not isinstance(code, str):
+            continue
+        if code not in known and not (code.startswith("otro_") and code[5:] in known):
+            continue  # unknown codes never reach validation
+        err = _field_error(value)
+        if err:
+            errors[code] = err
+        else:
+            bounded[code] = value
+    return bounded, errors
+
+
+__all__ = ["MAX_REQUEST_BYTES", "MAX_ANSWER_CHARS", "MAX_ANSWER_ITEMS", "bound_answers"]
@@ -0,0 +1,122 @@
+"""Prefill index maintenance and lookup.
+
+The prefill index (dq_prefill_value) keeps the latest value a user gave for each
+question code, independent of the questionnaire it came from. Writers call
+record_values() inside their own transaction (one SELECT plus at most one
+batched INSERT, one batched UPDATE and one DELETE for cleared answers; an INSERT
+that loses a race against a concurrent writer falls back to updating that row).
+Admin deletes of versions call forget_versions() so the index never outlives
+its source answers. /dynamic/prefill calls
+lookup_values() which is a single query on the (user_code, question_code)
+unique index.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database.dynamic_models import PrefillValue
+
+
+def _is_blank(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str) and value.strip() == "":
+        return True
+    if isinstance(value, (list, tuple)) and len(value) == 0:
+        return True
+    return False
+
+
+def _existing_rows(s, user_code: str, codes: Iterable[str]) -> Dict[str, Any]:
+    return {
+        row.question_code: row
+        for row in s.execute(
+            select(PrefillValue.id, PrefillValue.question_code, PrefillValue.value_json, PrefillValue.source_version_id)
+            .where(PrefillValue.user_code == user_code, PrefillValue.question_code.in_(list(codes)))
+        )
+    }
+
+
+def _insert_or_update(s, inserts) -> None:
+    """Batched INSERT; rows another writer inserted meanwhile (two tabs, autosave + finalize)
+    hit the (user_code, question_code) unique index and are updated instead."""
+    try:
+        with s.begin_nested():
+            s.execute(insert(PrefillValue), inserts)
+        return
+    except IntegrityError:
+        pass
+    for row in inserts:
+        try:
+            with s.begin_nested():
+                s.execute(insert(PrefillValue), [row])
+        except IntegrityError:
+            s.execute(
+                update(PrefillValue)
+                .where(PrefillValue.user_code == row["user_code"], PrefillValue.question_code == row["question_code"])
+                .values(value_json=row["value_json"], source_version_id=row["source_version_id"])
+                .execution_options(synchronize_session=False)
+            )
+
+
+def record_values(s, user_code: Optional[str], values: Dict[str, Any], version_id: Optional[int] = None) -> int:
+    """Upsert the given code->value pairs for a user.
+
+    A blank value is a cleared answer: the stored row for that code is deleted so
+    it stops being prefilled elsewhere. Does not commit; returns the number of
+    rows written or deleted.
+    """
+    if not user_code or not values:
+        return 0
+    pending = {code: (list(v) if isinstance(v, tuple) else v) for code, v in values.items()}
+    existing = _existing_rows(s, user_code, pending.keys())
+    inserts = []
+    updates = []
+    cleared = []
+    for code, value in pending.items():
+        row = existing.get(code)
+        if _is_blank(value):
+            if row is not None:
+                cleared.append(row.id)
+        elif row is None:
+            inserts.append({"user_code": user_code, "question_code": code, "value_json": value, "source_version_id": version_id})
+        elif row.value_json != value or row.source_version_id != version_id:
+            updates.append({"id": row.id, "value_json": value, "source_version_id": version_id})
+    if inserts:
+        _insert_or_update(s, inserts)
+    if updates:
+        s.execute(update(PrefillValue), updates)
+    if cleared:
+        s.execute(delete(PrefillValue).where(PrefillValue.id.in_(cleared)).execution_options(synchronize_session=False))
+    return len(inserts) + len(updates) + len(cleared)
+
+
+def forget_versions(s, version_ids: Iterable[int]) -> int:
+    """Delete prefill rows sourced from the given versions (no commit); returns the rows deleted."""
+    version_ids = [v for v in version_ids if v is not None]
+    if not version_ids:
+        return 0
+    return s.execute(
+        delete(PrefillValue).where(PrefillValue.source_version_id.in_(version_ids)).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def lookup_values(s, user_code: str, codes: Iterable[str]) -> Dict[str, Any]:
+    """Return {code: value|None} for the requested codes in one indexed query."""
+    codes = [c for c in dict.fromkeys(codes) if c]
+    values: Dict[str, Any] = {c: None for c in codes}
+    if not user_code or not codes:
+        return values
+    rows = (
+        s.query(PrefillValue.question_code, PrefillValue.value_json)
+        .filter(PrefillValue.user_code == user_code, PrefillValue.question_code.in_(codes))
+        .all()
+    )
+    for code, value in rows:
+        values[code] = value
+    return values
+
+
+__all__ = ["record_values", "lookup_values", "forget_versions"]
@@ -0,0 +1,156 @@
+"""Resolution cache: questionnaire code -> target version id.
+
+Student endpoints need to map a questionnaire code (or "the primary one", or
+``ux_survey``) to the version they should read/write. Doing that by loading
+``Questionnaire.versions`` and sorting in Python on every request is wasteful,
+so this module keeps a small snapshot of every questionnaire with its latest
+published / latest overall version id.
+
+The snapshot is rebuilt when it is missing or older than ``_TTL_SECONDS``
+(covers changes made through another worker process). Admin endpoints that change what a code resolves to (publish,
+unpublish, set-primary, status changes, new/deleted versions) call
+``invalidate_resolution`` right after committing.
+
+``latest_version`` / ``target_version`` are the uncached lookups: a single
+``TOP 1 ... ORDER BY version_number DESC`` seek on
+``ix_dq_qv_questionnaire_status_version`` instead of loading every historical
+version and sorting in Python.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from threading import Lock
+from time import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from database.dynamic_models import Questionnaire, QuestionnaireVersion
+
+_TTL_SECONDS = 30
+
+
+@dataclass(frozen=True)
+class ResolvedQuestionnaire:
+    id: int
+    code: str
+    title: str
+    status: str
+    is_primary: bool
+    published_version_id: Optional[int]  # latest published version, if any
+    latest_version_id: Optional[int]  # latest version regardless of status
+    version_count: int
+
+    @property
+    def target_version_id(self) -> Optional[int]:
+        """Latest published version, falling back to the latest version (draft)."""
+        return self.published_version_id or self.latest_version_id
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    built_at: float
+    by_code: Dict[str, ResolvedQuestionnaire]
+    ordered: Tuple[ResolvedQuestionnaire, ...]  # by questionnaire id
+    primary_code: Optional[str]  # active + is_primary
+
+
+_SNAPSHOT: Optional[_Snapshot] = None
+_LOCK = Lock()
+
+
+def _latest_version_stmt(columns, questionnaire_id: int, published_only: bool):
+    stmt = select(*columns).where(QuestionnaireVersion.questionnaire_id == questionnaire_id)
+    if published_only:
+        stmt = stmt.where(QuestionnaireVersion.status == "published")
+    return stmt.order_by(QuestionnaireVersion.version_number.desc(), QuestionnaireVersion.id.desc()).limit(1)
+
+
+def latest_version_id(s, questionnaire_id: int, published_only: bool = False) -> Optional[int]:
+    """Id of the highest version_number (optionally only published); one index seek."""
+    return s.execute(_latest_version_stmt([QuestionnaireVersion.id], questionnaire_id, published_only)).scalar()
+
+
+def latest_version(s, questionnaire_id: int, published_only: bool = False) -> Optional[QuestionnaireVersion]:
+    """Same as ``latest_version_id`` but returns the ORM version."""
+    return s.execute(_latest_version_stmt([QuestionnaireVersion], questionnaire_id, published_only)).scalar()
+
+
+def target_version(s, questionnaire_id: int) -> Optional[QuestionnaireVersion]:
+    """Latest published version, else the latest version of any status."""
+    return latest_version(s, questionnaire_id, published_only=True) or latest_version(s, questionnaire_id)
+
+
+def next_version_number(s, questionnaire_id: int) -> int:
+    """version_number for a new version (max + 1, or 1 when there are none)."""
+    current = s.execute(
+        select(func.max(QuestionnaireVersion.version_number)).where(QuestionnaireVersion.questionnaire_id == questionnaire_id)
+    ).scalar()
+    return (current or 0) + 1
+
+
+def _build_snapshot(s) -> _Snapshot:
+    q_rows = s.query(
+        Questionnaire.id, Questionnaire.code, Questionnaire.title, Questionnaire.status, Questionnaire.is_primary
+    ).all()
+    counts: Dict[int, int] = dict(
+        s.query(QuestionnaireVersion.questionnaire_id, func.count(QuestionnaireVersion.id))
+        .group_by(QuestionnaireVersion.questionnaire_id)
+        .all()
+    )
+    by_code: Dict[str, ResolvedQuestionnaire] = {}
+    primary_code = None
+    for q in sorted(q_rows, key=lambda r: r.id):
+        item = ResolvedQuestionnaire(
+            id=q.id,
+            code=q.code,
+            title=q.title,
+            status=q.status,
+            is_primary=bool(q.is_primary),
+            published_version_id=latest_version_id(s, q.id, published_only=True) if counts.get(q.id) else None,
+            latest_version_id=latest_version_id(s, q.id) if counts.get(q.id) else None,
+            version_count=counts.get(q.id, 0),
+        )
+        by_code[q.code] = item
+        if item.is_primary and item.status == "active" and primary_code is None:
+            primary_code = item.code
+    return _Snapshot(built_at=time(), by_code=by_code, ordered=tuple(by_code.values()), primary_code=primary_code)
+
+
+def _snapshot(s) -> _Snapshot:
+    global _SNAPSHOT
+    snap = _SNAPSHOT
+    if snap is not None and (time() - snap.built_at) < _TTL_SECONDS:
+        return snap
+    snap = _build_snapshot(s)
+    with _LOCK:
+        _SNAPSHOT = snap
+    return snap
+
+
+def resolve_code(s, code: str) -> Optional[ResolvedQuestionnaire]:
+    """Resolve a questionnaire by code (any status)."""
+    return _snapshot(s).by_code.get(code)
+
+
+def resolve_primary(s) -> Optional[ResolvedQuestionnaire]:
+    """Resolve the active primary questionnaire, if one is configured."""
+    snap = _snapshot(s)
+    return snap.by_code.get(snap.primary_code) if snap.primary_code else None
+
+
+def active_questionnaires(s) -> Tuple[ResolvedQuestionnaire, ...]:
+    """All questionnaires with status 'active', in creation order."""
+    return tuple(q for q in _snapshot(s).ordered if q.status == "active")
+
+
+def invalidate_resolution() -> None:
+    """Drop the snapshot; the next lookup rebuilds it."""
+    global _SNAPSHOT
+    with _LOCK:
+        _SNAPSHOT = None
+
+
+__all__ = [
+    "ResolvedQuestionnaire", "resolve_code", "resolve_primary", "active_questionnaires", "invalidate_resolution",
+    "latest_version_id", "latest_version", "target_version", "next_version_number",
+]
@@ -0,0 +1,227 @@
+"""Optional append-only answer log for autosaves (event log mode).
+
+With ``DQ_RESPONSE_EVENTS=1`` an autosave no longer updates dq_response_item in
+place. The changed answers are appended to dq_response_event with one
+executemany INSERT, so the hot path only does sequential inserts (plus the
+revision bump). The item table becomes a snapshot that is brought up to date by
+compaction:
+
+ - ``compact_response`` folds the events of one response (last value per
+   question wins) into dq_response_item with the bulk upsert, applies the
+   progress delta and the prefill index, and moves
+   ``dq_response.compacted_event_id`` forward with a guarded UPDATE;
+ - ``EventCompactor`` runs ``compact_pending`` in a daemon thread every
+   ``DQ_RESPONSE_EVENTS_COMPACT_SECONDS`` (and at interpreter exit);
+ - finalize folds the pending events of its response in the same transaction
+   (see ``finalize_service``), so finalized responses are always compacted;
+ - ``python manage.py compact-response-events`` compacts on demand and can prune
+   old folded events.
+
+Readers of the public API overlay pending events on the snapshot
+(``load_state``). Progress, prefill values and admin/export views that read
+dq_response_item directly lag behind by at most one compaction interval.
+"""
+from __future__ import annotations
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional
+import atexit
+import logging
+import os
+
+from sqlalchemy import insert, select, update, delete
+
+from database.dynamic_models import QuestionnaireAssignment, Response, ResponseEvent, ResponseItem
+from backend.services import prefill_index
+from backend.services.response_store import EncodedValue, decode_item, encode_value, upsert_encoded, apply_progress
+from backend.services.version_index import get_version_index
+
+log = logging.getLogger(__name__)
+
+_VALUE_COLUMNS = (ResponseEvent.value, ResponseEvent.numeric_value, ResponseEvent.float_value, ResponseEvent.values_json)
+
+
+class PendingEvents(NamedTuple):
+    values: Dict[int, EncodedValue]  # question_id -> last logged value
+    last_id: int  # highest event id read (0 when there is none)
+
+
+def pending_events(s, response_id: int, after_id: int) -> PendingEvents:
+    """Events of a response newer than ``after_id``, folded (last one per question wins)."""
+    values: Dict[int, EncodedValue] = {}
+    last_id = after_id or 0
+    rows = s.execute(
+        select(ResponseEvent.id, ResponseEvent.question_id, *_VALUE_COLUMNS)
+        .where(ResponseEvent.response_id == response_id, ResponseEvent.id > (after_id or 0))
+        .order_by(ResponseEvent.id)
+    )
+    for row in rows:
+        values[row.question_id] = EncodedValue(row.value, row.numeric_value, row.float_value, row.values_json)
+        last_id = row.id
+    return PendingEvents(values, last_id)
+
+
+def load_state(s, resp: Response) -> Dict[int, EncodedValue]:
+    """{question_id: EncodedValue} of the snapshot with the pending events applied on top."""
+    state = {
+        row.question_id: EncodedValue(row.value, row.numeric_value, row.float_value, row.values_json)
+        for row in s.execute(
+            select(
+                ResponseItem.question_id, ResponseItem.value, ResponseItem.numeric_value,
+                ResponseItem.float_value, ResponseItem.values_json,
+            )
+            .where(ResponseItem.response_id == resp.id)
+        )
+    }
+    state.update(pending_events(s, resp.id, resp.compacted_event_id).values)
+    return state
+
+
+def append_events(s, response_id: int, question_map_by_code: Mapping[str, Any], normalized: Dict[str, Any],
+                  state: Mapping[int, EncodedValue]) -> int:
+    """Append the answers that differ from ``state`` (see ``load_state``); returns rows written."""
+    rows = []
+    for code_key, value in normalized.items():
+        qu = question_map_by_code.get(code_key)
+        if not qu:
+            continue
+        enc = encode_value(qu.type, value)
+        if state.get(qu.id) == enc:
+            continue
+        rows.append({"response_id": response_id, "question_id": qu.id, **enc._asdict()})
+    if rows:
+        s.execute(insert(ResponseEvent), rows)
+    return len(rows)
+
+
+def advance_watermark(s, response_id: int, expected: int, last_id: int) -> bool:
+    """Move compacted_event_id from ``expected`` to ``last_id``; False if another compaction won."""
+    if last_id == expected:
+        return True
+    result = s.execute(
+        update(Response)
+        .where(Response.id == response_id, Response.compacted_event_id == expected)
+        .values(compacted_event_id=last_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def compact_response(s, resp: Response, assign: QuestionnaireAssignment, v_index) -> Optional[int]:
+    """Fold pending events into dq_response_item (no commit).
+
+    Returns the number of events folded, or None when a concurrent compaction
+    (or finalize) moved the watermark first; the caller should roll back.
+    Events of a finalized assignment are stale and only skipped.
+    """
+    expected = resp.compacted_event_id or 0
+    pending = pending_events(s, resp.id, expected)
+    if not pending.values:
+        return 0
+    if assign.status != "finalized":
+        encoded = {qid: enc for qid, enc in pending.values.items() if qid in v_index.qid_to_code}
+        result = upsert_encoded(s, resp.id, encoded)
+        apply_progress(assign, result.answered_delta, v_index.total_questions)
+        values = {}
+        for qid, enc in encoded.items():
+            code_key = v_index.qid_to_code[qid]
+            values[code_key] = decode_item(enc, v_index.by_code[code_key].type)
+        prefill_index.record_values(s, assign.user_code, values, v_index.version_id)
+    if not advance_watermark(s, resp.id, expected, pending.last_id):
+        return None
+    return len(pending.values)
+
+
+def compact_pending(session_factory: Callable[[], Any], limit: int = 200) -> int:
+    """Compact up to ``limit`` responses with pending events, one transaction each."""
+    with session_factory() as s:
+        response_ids = s.execute(
+            select(ResponseEvent.response_id)
+            .join(Response, Response.id == ResponseEvent.response_id)
+            .where(ResponseEvent.id > Response.compacted_event_id)
+            .distinct()
+            .limit(limit)
+        ).scalars().all()
+    compacted = 0
+    for response_id in response_ids:
+        with session_factory() as s:
+            resp = s.get(Response, response_id)
+            assign = s.get(QuestionnaireAssignment, resp.assignment_id) if resp else None
+            v_index = get_version_index(s, assign.questionnaire_version_id) if assign else None
+            if v_index is None:
+                continue
+            if compact_response(s, resp, assign, v_index) is None:
+                s.rollback()
+                continue
+            s.commit()
+            compacted += 1
+    return compacted
+
+
+def prune_events(s, older_than) -> int:
+    """Delete folded events created before ``older_than`` (no commit)."""
+    folded = (
+        select(Response.id)
+        .where(Response.id == ResponseEvent.response_id, ResponseEvent.id <= Response.compacted_event_id)
+        .exists()
+    )
+    result = s.execute(
+        delete(ResponseEvent)
+        .where(ResponseEvent.created_at < older_than, folded)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+class EventCompactor:
+    """Per-worker background compaction (started lazily by the first ``notify``)."""
+
+    def __init__(self, session_factory: Callable[[], Any], enabled: bool, interval_seconds: float = 30.0, batch: int = 200):
+        self._session_factory = session_factory
+        self.enabled = bool(enabled)
+        self.interval = max(1.0, float(interval_seconds))
+        self.batch = max(1, int(batch))
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @classmethod
+    def from_env(cls, session_factory: Callable[[], Any]) -> "EventCompactor":
+        enabled = (os.environ.get("DQ_RESPONSE_EVENTS", "0") or "0").strip().lower() in ("1", "true", "yes", "on")
+        try:
+            interval = float(os.environ.get("DQ_RESPONSE_EVENTS_COMPACT_SECONDS", "30") or 30)
+        except ValueError:
+            interval = 30.0
+        return cls(session_factory, enabled, interval)
+
+    def run_once(self) -> int:
+        try:
+            return compact_pending(self._session_factory, self.batch)
+        except Exception:
+            log.exception("response event compaction failed")
+            return 0
+
+    def notify(self) -> None:
+        """Called after events were appended; makes sure the timer is running."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run, name="dq-event-compaction", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def close(self) -> None:
+        """Stop the timer and compact what this worker left behind."""
+        self._stop.set()
+        self.run_once()
+
+
+__all__ = [
+    "PendingEvents", "pending_events", "load_state", "append_events", "advance_watermark",
+    "compact_response", "compact_pending", "prune_events", "EventCompactor",
+]
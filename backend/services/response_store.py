@@ -0,0 +1,314 @@
+"""Bulk persistence of response items.
+
+Saving a response used to cost one SELECT plus one INSERT/UPDATE per answered
+question. ``upsert_items`` instead:
+
+ 1. loads every existing item of the response with one query,
+ 2. diffs the incoming values in memory (unchanged items are skipped), and
+ 3. writes all new rows with one executemany INSERT and all changed rows with
+    one executemany UPDATE by primary key.
+
+Callers own the transaction (nothing here commits). Both upsert functions
+return an ``UpsertResult`` with the change in answered items (to keep
+QuestionnaireAssignment.answered_count in sync) and the number of rows written.
+
+``bump_revision`` implements optimistic concurrency on dq_response: a writer
+only succeeds if the revision it read is still current.
+
+Assignments are unique per (user_code, version) and responses per assignment
+(uq_dq_assignment_user_version / uq_dq_response_assignment). ``get_or_create_*``
+create rows with a single ``INSERT ... SELECT ... WHERE NOT EXISTS`` (UPDLOCK,
+HOLDLOCK on SQL Server) and fall back to re-reading on a unique-index violation,
+so concurrent saves from two tabs converge on the same rows.
+
+``load_assignments`` fetches a user's assignments for several versions together
+with their responses in one query; ``close_response`` finalizes a response and
+advances its revision in one guarded UPDATE.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database.dynamic_models import QuestionnaireAssignment, Response, ResponseItem
+
+class EncodedValue(NamedTuple):
+    """Storage columns of one dq_response_item."""
+    value: Optional[str]
+    numeric_value: Optional[int]
+    float_value: Optional[float] = None
+    values_json: Optional[list] = None
+
+
+class UpsertResult(NamedTuple):
+    answered_delta: int
+    written: int
+
+
+_NUMERIC_TYPES = ("number", "scale_1_5")
+
+
+def is_answered(value, numeric_value, float_value=None, values_json=None) -> bool:
+    """Same rule used by progress: any typed value or a non-blank string."""
+    if numeric_value is not None or float_value is not None or values_json:
+        return True
+    return value is not None and str(value).strip() != ""
+
+
+def encode_value(question_type: str, value: Any) -> EncodedValue:
+    """Map a normalized answer to the storage columns.
+
+    ``value`` keeps the text form for every type; numbers also go to float_value
+    (and numeric_value when integral), multi_choice to values_json. None (a
+    cleared answer) empties every column.
+    """
+    if value is None:
+        return EncodedValue(None, None)
+    if question_type in _NUMERIC_TYPES and isinstance(value, (int, float)) and not isinstance(value, bool):
+        if isinstance(value, int):
+            return EncodedValue(str(value), value, float(value))
+        return EncodedValue(str(value), None, float(value))
+    if question_type == "boolean":
+        return EncodedValue(("true" if value else "false"), (1 if value else 0))
+    if question_type == "multi_choice":
+        return EncodedValue(",".join(value), None, None, list(value))
+    return EncodedValue((str(value) if value is not None else None), None)
+
+
+def _legacy_split(text: str):
+    # rows written before values_json existed stored multi_choice comma-joined
+    return [v for v in text.split(",") if v]
+
+
+def decode_item(item, question_type: Optional[str] = None) -> Any:
+    """Stored item (ORM row or column Row) -> value shape of the public API.
+
+    Typed columns win; rows that predate them (see ``backfill-typed-values``)
+    fall back to parsing ``value``. Without ``question_type`` the legacy
+    heuristics apply (comma -> list, "true"/"false" -> bool).
+    """
+    values_json = getattr(item, "values_json", None)
+    if values_json is not None:
+        return list(values_json)
+    numeric_value = item.numeric_value
+    if question_type == "boolean" and numeric_value is not None:
+        return bool(numeric_value)
+    if numeric_value is not None:
+        return numeric_value
+    float_value = getattr(item, "float_value", None)
+    if float_value is not None:
+        return float_value
+    text_value = item.value
+    if text_value is None:
+        return None
+    if question_type is None:
+        if text_value in ("true", "false"):
+            return text_value == "true"
+        if "," in text_value:
+            return _legacy_split(text_value)
+        return text_value
+    if question_type == "multi_choice":
+        return _legacy_split(text_value)
+    if question_type == "boolean":
+        return text_value == "true"
+    if question_type in _NUMERIC_TYPES:
+        try:
+            return float(text_value)
+        except ValueError:
+            return text_value
+    return text_value
+
+
+def upsert_encoded(s, response_id: int, encoded: Mapping[int, EncodedValue]) -> UpsertResult:
+    """Write {question_id: EncodedValue} for a response in bulk."""
+    if not encoded:
+        return UpsertResult(0, 0)
+    existing = {
+        row.question_id: row
+        for row in s.execute(
+            select(
+                ResponseItem.id, ResponseItem.question_id, ResponseItem.value, ResponseItem.numeric_value,
+                ResponseItem.float_value, ResponseItem.values_json,
+            )
+            .where(ResponseItem.response_id == response_id)
+        )
+    }
+    inserts = []
+    updates = []
+    answered_delta = 0
+    for question_id, enc in encoded.items():
+        enc = EncodedValue(*enc)
+        now_answered = is_answered(*enc)
+        row = existing.get(question_id)
+        if row is None:
+            inserts.append({"response_id": response_id, "question_id": question_id, **enc._asdict()})
+            answered_delta += int(now_answered)
+            continue
+        if (row.value, row.numeric_value, row.float_value, row.values_json) == tuple(enc):
+            continue
+        updates.append({"id": row.id, **enc._asdict()})
+        answered_delta += int(now_answered) - int(is_answered(row.value, row.numeric_value, row.float_value, row.values_json))
+    if inserts:
+        s.execute(insert(ResponseItem), inserts)
+    if updates:
+        s.execute(update(ResponseItem), updates)
+    return UpsertResult(answered_delta, len(inserts) + len(updates))
+
+
+def encode_items(question_map_by_code: Mapping[str, Any], normalized: Dict[str, Any]) -> Dict[int, EncodedValue]:
+    """{question_id: EncodedValue} for normalized answers; unknown codes are ignored."""
+    encoded: Dict[int, EncodedValue] = {}
+    for code_key, value in normalized.items():
+        qu = question_map_by_code.get(code_key)
+        if not qu:
+            continue
+        encoded[qu.id] = encode_value(qu.type, value)
+    return encoded
+
+
+def upsert_items(s, response_id: int, question_map_by_code: Mapping[str, Any], normalized: Dict[str, Any]) -> UpsertResult:
+    """Encode normalized answers (by question code) and upsert them in bulk.
+
+    Codes not present in ``question_map_by_code`` are ignored.
+    """
+    return upsert_encoded(s, response_id, encode_items(question_map_by_code, normalized))
+
+
+def bump_revision(s, response_id: int, expected: int) -> bool:
+    """UPDATE dq_response SET revision = expected + 1 WHERE id = ? AND revision = expected.
+
+    Returns False when another writer got there first (the caller should roll back).
+    """
+    result = s.execute(
+        update(Response)
+        .where(Response.id == response_id, Response.revision == expected)
+        .values(revision=expected + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def progress_percent(answered: int, total_questions: int) -> int:
+    if total_questions <= 0:
+        return 0
+    return max(0, min(100, int(round((answered / total_questions) * 100))))
+
+
+def apply_progress(assign: QuestionnaireAssignment, answered_delta: int, total_questions: int) -> None:
+    """Update the materialized answered_count/progress_percent of an assignment."""
+    answered = max(0, (assign.answered_count or 0) + answered_delta)
+    if total_questions > 0:
+        answered = min(answered, total_questions)
+    assign.answered_count = answered
+    assign.progress_percent = progress_percent(answered, total_questions)
+
+
+def close_response(s, resp: Response, expected: int, bump: bool, compacted_event_id: Optional[int] = None) -> bool:
+    """Finalize a response in one UPDATE guarded by its revision.
+
+    Writes finalized_at/submitted_at, the in-memory summary_cache and (when
+    ``bump``) revision + 1, only if the stored revision is still ``expected``.
+    ``compacted_event_id`` records the answer events folded by finalize.
+    Returns False when another writer got there first.
+    """
+    summary = resp.summary_cache
+    revision = expected + 1 if bump else expected
+    values = {"revision": revision, "summary_cache": summary, "finalized_at": func.now(), "submitted_at": func.now()}
+    # The UPDATE below carries these values; keep the ORM from flushing them again
+    set_committed_value(resp, "summary_cache", summary)
+    set_committed_value(resp, "revision", revision)
+    if compacted_event_id is not None:
+        set_committed_value(resp, "compacted_event_id", compacted_event_id)
+        values["compacted_event_id"] = compacted_event_id
+    result = s.execute(
+        update(Response)
+        .where(Response.id == resp.id, Response.revision == expected)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def load_assignments(s, user_code: str, version_ids: Iterable[int]) -> Dict[int, Tuple[QuestionnaireAssignment, Optional[Response]]]:
+    """{version_id: (assignment, response|None)} for a user, in a single query."""
+    ids = [int(v) for v in dict.fromkeys(version_ids) if v]
+    if not user_code or not ids:
+        return {}
+    rows = (
+        s.query(QuestionnaireAssignment, Response)
+        .outerjoin(Response, Response.assignment_id == QuestionnaireAssignment.id)
+        .filter(QuestionnaireAssignment.user_code == user_code, QuestionnaireAssignment.questionnaire_version_id.in_(ids))
+        .all()
+    )
+    return {assign.questionnaire_version_id: (assign, resp) for assign, resp in rows}
+
+
+def find_assignment(s, user_code: str, version_id: int) -> Optional[QuestionnaireAssignment]:
+    """Point lookup on the (user_code, questionnaire_version_id) unique key."""
+    return (
+        s.query(QuestionnaireAssignment)
+        .filter_by(user_code=user_code, questionnaire_version_id=version_id)
+        .order_by(QuestionnaireAssignment.id)
+        .first()
+    )
+
+
+def current_response(s, assignment_id: int) -> Optional[Response]:
+    """Point lookup of the (single) response of an assignment."""
+    return s.query(Response).filter_by(assignment_id=assignment_id).first()
+
+
+def _insert_if_absent(s, model, values: Dict[str, Any], match) -> bool:
+    """INSERT INTO model (...) SELECT ... WHERE NOT EXISTS (match). True if a row was inserted."""
+    table = model.__table__
+    probe = (
+        select(literal(1))
+        .select_from(table)
+        .where(*match)
+        .with_hint(table, "WITH (UPDLOCK, HOLDLOCK)", dialect_name="mssql")
+    )
+    source = select(*[literal(v) for v in values.values()]).where(~probe.exists())
+    try:
+        with s.begin_nested():
+            result = s.execute(insert(model).from_select(list(values.keys()), source))
+    except IntegrityError:
+        # Lost the race against another writer; the unique index kept a single row
+        return False
+    return bool(result.rowcount)
+
+
+def get_or_create_assignment(s, user_code: Optional[str], version_id: int, status: str = "in_progress"):
+    """Return (assignment, created). Anonymous (user_code None) calls always create a new row."""
+    if not user_code:
+        assign = QuestionnaireAssignment(user_code=None, questionnaire_version_id=version_id, status=status)
+        s.add(assign)
+        s.flush()
+        return assign, True
+    assign = find_assignment(s, user_code, version_id)
+    if assign is not None:
+        return assign, False
+    created = _insert_if_absent(
+        s, QuestionnaireAssignment,
+        {"user_code": user_code, "questionnaire_version_id": version_id, "status": status},
+        (QuestionnaireAssignment.user_code == user_code, QuestionnaireAssignment.questionnaire_version_id == version_id),
+    )
+    return find_assignment(s, user_code, version_id), created
+
+
+def get_or_create_response(s, assignment_id: int):
+    """Return (response, created) for the single current response of an assignment."""
+    resp = current_response(s, assignment_id)
+    if resp is not None:
+        return resp, False
+    created = _insert_if_absent(s, Response, {"assignment_id": assignment_id}, (Response.assignment_id == assignment_id,))
+    return current_response(s, assignment_id), created
+
+
+__all__ = [
+    "find_assignment", "current_response", "get_or_create_assignment", "get_or_create_response",
+    "load_assignments", "close_response", "apply_progress", "progress_percent",
+    "EncodedValue", "UpsertResult", "is_answered", "encode_value", "decode_item", "encode_items", "upsert_encoded", "upsert_items",
+    "bump_revision",
+]
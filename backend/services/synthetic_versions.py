@@ -0,0 +1,174 @@
+"""Random questionnaire versions and answer payloads (property tests, benchmarks).
+
+``random_version(rng, questions)`` builds an in-memory ``VersionIndex`` that
+uses every question type the validator knows (plus an unknown one), random
+``validation_rules`` (lengths, safe regexes, numeric bounds and steps, date
+bounds / age limits / relative dates, critical policies), choice options with
+"otro" flags, ICFES score codes, computed questions and ``visible_if`` trees
+(leaf operators combined with and/or) over earlier questions.
+
+``random_answers(rng, v_index)`` returns a payload mixing plausible values and
+garbage (wrong types, out of range, unknown options, empty values, unknown
+codes). Everything is driven by the given ``random.Random`` so a seed
+reproduces a failing case. Used by the property tests
+(``tests/test_backend/test_services/test_validation_fuzz.py``) and
+``python manage.py bench-validation``; nothing here touches the database.
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from random import Random
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional
+
+from backend.services.dynamic_validation import _ICFES_COMPONENTS
+from backend.services.version_index import OptionMeta, QuestionMeta, SectionMeta, VersionIndex, build_dependents
+
+QUESTION_TYPES = (
+    "text", "textarea", "email", "number", "scale_1_5", "boolean", "date",
+    "single_choice", "multi_choice", "slider",
+)
+_REGEXES = ("[a-z ]+", "[A-Z][a-z]*", r"\d{3,6}", "[a-z]+(-[a-z]+)?")
+_WORDS = ("ana", "Bogota", "12345", "x", "hola mundo", "a-b", "", "  ", "ÑANDÚ", "123abc")
+_GARBAGE = (None, "", "abc", -1, 10 ** 20, [], ["x"], True, "2020-02-30", 3.7, "  ", "otro", 0, "1e3", ["o0", 5])
+
+
+def _random_date(rng: Random) -> str:
+    return (date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 90))).isoformat()
+
+
+def _rules(rng: Random, qtype: str, earlier: List[QuestionMeta]) -> Dict[str, Any]:
+    rules: Dict[str, Any] = {}
+    if qtype in ("text", "textarea"):
+        if rng.random() < 0.5:
+            rules["minLength"] = rng.randint(0, 3)
+        if rng.random() < 0.5:
+            rules["maxLength"] = rng.randint(5, 20)
+        if rng.random() < 0.4:
+            rules["regex"] = rng.choice(_REGEXES)
+    elif qtype == "number":
+        if rng.random() < 0.4:
+            rules.update(allow_decimal=True, min=0, max=5, step=rng.choice([0.5, 0.1, 0.25, None]))
+        else:
+            rules.update(min=rng.randint(-5, 10), max=rng.randint(20, 200))
+    elif qtype == "date":
+        kind = rng.randrange(3)
+        if kind == 0:
+            rules.update(min_year=rng.randint(1940, 2000), max_year=rng.randint(2001, 2030))
+        elif kind == 1:
+            rules.update(not_after_today=True, min_age_years=rng.randint(5, 20), max_age_years=rng.randint(30, 90))
+        else:
+            dates = [q.code for q in earlier if q.type == "date"]
+            if dates:
+                rules[rng.choice(("not_before_code", "not_after_code"))] = rng.choice(dates)
+    if rng.random() < 0.2:
+        rules["critical"] = rng.choice([True, False, ["invalid_option"], ["below_min", "above_max"]])
+    return rules
+
+
+def _leaf(rng: Random, earlier: List[QuestionMeta]) -> Dict[str, Any]:
+    ref = rng.choice(earlier)
+    if ref.option_values:
+        values = sorted(ref.option_values)
+        op = rng.choice(("equals", "not_equals", "in", "not_in", "answered"))
+        if op in ("in", "not_in"):
+            return {"code": ref.code, op: rng.sample(values, k=min(len(values), rng.randint(1, 2)))}
+        if op == "answered":
+            return {"code": ref.code, op: rng.random() < 0.7}
+        return {"code": ref.code, op: rng.choice(values)}
+    if ref.type in ("number", "scale_1_5"):
+        return {"code": ref.code, rng.choice(("gt", "gte", "lt", "lte")): rng.randint(0, 50)}
+    if ref.type == "boolean":
+        return {"code": ref.code, "equals": rng.random() < 0.5}
+    return {"code": ref.code, "answered": rng.random() < 0.7}
+
+
+def _visible_if(rng: Random, earlier: List[QuestionMeta], depth: int = 0) -> Optional[Dict[str, Any]]:
+    if not earlier:
+        return None
+    if depth < 2 and rng.random() < 0.3:
+        return {rng.choice(("and", "or")): [_visible_if(rng, earlier, depth + 1) for _ in range(rng.randint(1, 3))]}
+    return _leaf(rng, earlier)
+
+
+def random_version(rng: Random, questions: int = 40, version_id: int = 1) -> VersionIndex:
+    """Random VersionIndex with ``questions`` questions (display order = creation order)."""
+    metas: List[QuestionMeta] = []
+    icfes = list(_ICFES_COMPONENTS)
+    for i in range(max(1, int(questions))):
+        qtype = rng.choice(QUESTION_TYPES)
+        code = f"q{i}"
+        if icfes and rng.random() < 0.05:
+            qtype, code = "number", icfes.pop(0)
+        options = ()
+        if qtype in ("single_choice", "multi_choice"):
+            values = [f"o{j}" for j in range(rng.randint(2, 6))] + (["otro"] if rng.random() < 0.4 else [])
+            options = tuple(
+                OptionMeta(id=version_id * 100000 + i * 100 + j, value=v, label=v.upper(), order=j, is_other_flag=(v == "otro"))
+                for j, v in enumerate(values)
+            )
+        is_computed, expression = False, None
+        numbers = [q.code for q in metas if q.type == "number" and not (q.validation_rules or {}).get("allow_decimal")]
+        if qtype == "number" and numbers and rng.random() < 0.15:
+            a, b = rng.choice(numbers), rng.choice(numbers)
+            is_computed = True
+            expression = {"expr": rng.choice((f"{a} + {b}", f"round({a} * 2 / 3)", f"clamp({a}, 0, 10)", f"coalesce({a}, 0) - 1"))}
+        metas.append(QuestionMeta(
+            id=version_id * 1000 + i, code=code, text=f"Pregunta {i}", type=qtype, required=rng.random() < 0.4,
+            order=i, section_id=version_id, section_order=1,
+            validation_rules=None if is_computed else (_rules(rng, qtype, metas) or None),
+            visible_if=_visible_if(rng, metas) if rng.random() < 0.4 else None,
+            is_computed=is_computed, computed_expression=expression, options=options,
+            option_values=frozenset(o.value for o in options),
+            other_values=frozenset(o.value for o in options if o.is_other_flag),
+        ))
+    by_code = {q.code: q for q in metas}
+    codes = tuple(by_code)
+    return VersionIndex(
+        version_id=version_id, questionnaire_id=1, version_number=1, status="published",
+        sections=(SectionMeta(id=version_id, title="S", description=None, order=1, codes=codes),),
+        codes=codes,
+        by_code=MappingProxyType(by_code),
+        qid_to_code=MappingProxyType({q.id: q.code for q in metas}),
+        option_values=MappingProxyType({q.code: q.option_values for q in metas}),
+        dependents=build_dependents(by_code),
+    )
+
+
+def _plausible(rng: Random, qu: QuestionMeta) -> Any:
+    rules = qu.validation_rules or {}
+    qtype = qu.type
+    if qtype in ("text", "textarea", "slider"):
+        return rng.choice(_WORDS)
+    if qtype == "email":
+        return rng.choice(("ana@example.com", "x@y.co", "no-at-sign", "a@b"))
+    if qtype == "number":
+        if rules.get("allow_decimal"):
+            return rng.choice((rng.randint(0, 10) / 2, round(rng.uniform(-1, 6), 2), str(rng.randint(0, 5))))
+        return rng.choice((rng.randint(-10, 250), str(rng.randint(0, 120)), rng.randint(0, 100)))
+    if qtype == "scale_1_5":
+        return rng.choice((rng.randint(0, 6), str(rng.randint(1, 5))))
+    if qtype == "boolean":
+        return rng.choice((True, False, "si", "no", "true", 1))
+    if qtype == "date":
+        return rng.choice((_random_date(rng), _random_date(rng), "2024-2-29", ""))
+    values = sorted(qu.option_values) or ["o0"]
+    if qtype == "multi_choice":
+        return rng.sample(values, k=rng.randint(0, len(values)))
+    return rng.choice(values)
+
+
+def random_answers(rng: Random, v_index: VersionIndex, answered: float = 0.8, garbage: float = 0.15) -> Dict[str, Any]:
+    """Random payload for ``v_index``: ``answered`` of the questions, ``garbage`` of them with junk values."""
+    answers: Dict[str, Any] = {}
+    for code, qu in v_index.by_code.items():
+        if rng.random() >= answered:
+            continue
+        answers[code] = rng.choice(_GARBAGE) if rng.random() < garbage else _plausible(rng, qu)
+        if qu.other_values and rng.random() < 0.7:
+            answers[f"otro_{code}"] = rng.choice(("", "  ", "otra cosa"))
+    if rng.random() < 0.2:
+        answers["zz_unknown"] = "x"
+    return answers
+
+
+__all__ = ["QUESTION_TYPES", "random_version", "random_answers"]
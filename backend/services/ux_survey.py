@@ -0,0 +1,146 @@
+"""Cached UX survey structure and per-user completion set.
+
+The usability survey (code ``ux_survey``) is created once at startup by
+``_ensure_ux_survey`` and never edited, yet every primary ``mine``/finalize call
+asks whether the user still has to answer it and ``/dynamic/ux-survey/status``
+returns its structure. This module keeps, per worker process:
+
+ - the survey payload (version id, title, ordered questions with options),
+   built from the cached VersionIndex and rebuilt only when the resolver points
+   ``ux_survey`` at another version;
+ - the set of user codes known to have finalized that version. It is loaded with
+   one query at startup (``warm``), extended on submit (``mark_completed``) and
+   on lookup hits; misses fall back to the (user_code, version) unique index.
+
+Completion only grows through the public API. Admin deletions call ``forget``;
+other workers may keep a deleted user in their set until restart, which only
+suppresses the prompt.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, Optional, Set, Tuple
+
+from database.dynamic_models import QuestionnaireAssignment
+from backend.services import response_store
+from backend.services.questionnaire_resolver import resolve_code
+from backend.services.version_index import get_version_index
+
+UX_SURVEY_CODE = "ux_survey"
+
+
+@dataclass(frozen=True)
+class UxSurvey:
+    version_id: int
+    title: str
+    questions: Tuple[Dict[str, Any], ...]
+
+    def structure(self) -> Dict[str, Any]:
+        return {"code": UX_SURVEY_CODE, "title": self.title, "version_id": self.version_id, "questions": list(self.questions)}
+
+
+_SURVEY: Optional[UxSurvey] = None
+_COMPLETED: Dict[int, Set[str]] = {}  # version_id -> user codes with a finalized assignment
+_LOCK = Lock()
+
+
+def _build(s, version_id: int, title: str) -> Optional[UxSurvey]:
+    index = get_version_index(s, version_id)
+    if index is None:
+        return None
+    questions = tuple(
+        {
+            "code": meta.code,
+            "text": meta.text,
+            "options": [{"value": op.value, "label": op.label} for op in meta.options],
+        }
+        for meta in (index.by_code[code] for code in index.codes)
+    )
+    return UxSurvey(version_id=version_id, title=title, questions=questions)
+
+
+def get_survey(s) -> Optional[UxSurvey]:
+    """Cached survey for the current target version (None if not configured)."""
+    global _SURVEY
+    rq = resolve_code(s, UX_SURVEY_CODE)
+    if not rq or not rq.target_version_id:
+        return None
+    survey = _SURVEY
+    if survey is not None and survey.version_id == rq.target_version_id and survey.title == rq.title:
+        return survey
+    survey = _build(s, rq.target_version_id, rq.title)
+    with _LOCK:
+        _SURVEY = survey
+    return survey
+
+
+def invalidate_survey() -> None:
+    """Drop the cached payload; the next lookup rebuilds it."""
+    global _SURVEY
+    with _LOCK:
+        _SURVEY = None
+
+
+def version_id(s) -> Optional[int]:
+    survey = get_survey(s)
+    return survey.version_id if survey else None
+
+
+def warm(s) -> None:
+    """Build the survey payload and load every user that already finalized it."""
+    survey = get_survey(s)
+    if survey is None:
+        return
+    codes = {
+        code for (code,) in s.query(QuestionnaireAssignment.user_code)
+        .filter(
+            QuestionnaireAssignment.questionnaire_version_id == survey.version_id,
+            QuestionnaireAssignment.status == "finalized",
+            QuestionnaireAssignment.user_code.isnot(None),
+        )
+        .all()
+    }
+    with _LOCK:
+        _COMPLETED.setdefault(survey.version_id, set()).update(codes)
+
+
+def is_known_completed(version: Optional[int], user_code: Optional[str]) -> bool:
+    """Set membership only (no query)."""
+    return bool(version and user_code and user_code in _COMPLETED.get(version, ()))
+
+
+def mark_completed(version: Optional[int], user_code: Optional[str]) -> None:
+    if not version or not user_code:
+        return
+    with _LOCK:
+        _COMPLETED.setdefault(version, set()).add(user_code)
+
+
+def forget(user_code: Optional[str] = None) -> None:
+    """Drop a user (or everyone when None) from the completion sets."""
+    with _LOCK:
+        if user_code is None:
+            _COMPLETED.clear()
+            return
+        for codes in _COMPLETED.values():
+            codes.discard(user_code)
+
+
+def is_pending(s, user_code: Optional[str]) -> bool:
+    """True when the survey is configured and the user has not finalized it."""
+    survey = get_survey(s)
+    if survey is None or not user_code:
+        return False
+    if is_known_completed(survey.version_id, user_code):
+        return False
+    assign = response_store.find_assignment(s, user_code, survey.version_id)
+    if assign is not None and assign.status == "finalized":
+        mark_completed(survey.version_id, user_code)
+        return False
+    return True
+
+
+__all__ = [
+    "UX_SURVEY_CODE", "UxSurvey", "get_survey", "invalidate_survey", "version_id", "warm",
+    "is_known_completed", "mark_completed", "forget", "is_pending",
+]
@@ -0,0 +1,302 @@
+"""Opt-in timing of answer validation and a guard for admin-supplied regexes.
+
+``PROFILE`` (``ValidationProfile``) records, per worker, how often each rule
+type runs and how long it takes: the type checks (``text``, ``number``,
+``date``, ...), ``regex`` matching, ``visibility``, ``required``, the
+ICFES/"otro" ``domain`` pass and ``computed`` questions. It is off unless
+``DQ_VALIDATION_PROFILE=1`` or an admin enables it through
+``/api/admin/diagnostics/validation``; when off, validation pays one attribute
+read per call. Regex matches slower than ``DQ_SLOW_REGEX_MS`` (default 5) are
+listed with their question code.
+
+``REGEX_GUARD`` (``RegexGuard``) protects workers from catastrophic
+backtracking in ``validation_rules.regex``:
+
+ - ``regex_risk`` inspects the parsed pattern; nested unbounded quantifiers
+   (``(a+)+``, ``([a-z]+ ?)*``) and backreferences are reported. The admin API
+   rejects such patterns and ``dynamic_validation`` does not enforce stored
+   ones (like invalid patterns);
+ - every match is timed in CPU time of the calling thread (``thread_time``, so
+   GC pauses of other threads, GIL waits and a loaded host do not count); a
+   pattern that goes over ``DQ_REGEX_BUDGET_MS`` (default 50)
+   ``DQ_REGEX_STRIKES`` times (default 3) is quarantined in that worker for
+   ``DQ_REGEX_QUARANTINE_S`` seconds (default 300), then enforced again.
+   While quarantined the match is not run and ``fullmatch`` returns None;
+   validation reports ``regex_unavailable`` for the answer instead of
+   accepting it unchecked.
+
+Python's ``re`` cannot be interrupted, so this is not a timeout: the budget
+bounds the damage to a few requests per pattern and worker and period; the
+static check is what keeps known-bad shapes out. Input length is already
+capped by ``payload_limits``. ``stored_unsafe_patterns`` lists the stored rules
+the static check leaves unenforced (reported by the diagnostics endpoint).
+"""
+from __future__ import annotations
+from threading import Lock
+from time import perf_counter_ns, thread_time, time
+from typing import Any, Dict, List, Optional, Pattern
+import logging
+import os
+
+try:  # Python 3.11+
+    from re import _parser as _sre_parse  # type: ignore[attr-defined]
+    from re import _constants as _sre  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore
+    import sre_constants as _sre  # type: ignore
+
+log = logging.getLogger(__name__)
+
+_MAX_SLOW_REGEX = 50  # distinct (code, pattern) entries kept
+_WIDE_REPEAT = 16  # repeat counts above this behave like "+" for backtracking
+
+
+def _env_flag(name: str) -> bool:
+    return (os.environ.get(name, "0") or "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        value = int(os.environ.get(name, default) or default)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _env_ms(name: str, default: float) -> float:
+    try:
+        value = float(os.environ.get(name, default) or default)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class ValidationProfile:
+    """Per-worker counters: rule type -> count, errors, total/max time."""
+
+    def __init__(self, enabled: bool = False, slow_regex_ms: float = 5.0):
+        self.enabled = bool(enabled)
+        self.slow_regex_ms = float(slow_regex_ms)
+        self._lock = Lock()
+        self._rules: Dict[str, List[int]] = {}  # rule -> [count, errors, total_ns, max_ns]
+        self._slow_regex: Dict[tuple, Dict[str, Any]] = {}
+        self.since = time()
+
+    @classmethod
+    def from_env(cls) -> "ValidationProfile":
+        return cls(_env_flag("DQ_VALIDATION_PROFILE"), _env_ms("DQ_SLOW_REGEX_MS", 5.0))
+
+    def record(self, rule: str, elapsed_ns: int, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._rules.get(rule)
+            if stats is None:
+                stats = self._rules[rule] = [0, 0, 0, 0]
+            stats[0] += 1
+            stats[1] += 1 if failed else 0
+            stats[2] += elapsed_ns
+            if elapsed_ns > stats[3]:
+                stats[3] = elapsed_ns
+
+    def lap(self, rule: str, started_ns: int) -> int:
+        """Record the time since ``started_ns`` under ``rule``; returns now (next lap start)."""
+        now = perf_counter_ns()
+        self.record(rule, now - started_ns)
+        return now
+
+    def record_regex(self, code: str, pattern: str, elapsed_ms: float) -> None:
+        if elapsed_ms < self.slow_regex_ms:
+            return
+        key = (code, pattern)
+        with self._lock:
+            entry = self._slow_regex.get(key)
+            if entry is None:
+                if len(self._slow_regex) >= _MAX_SLOW_REGEX:
+                    return
+                entry = self._slow_regex[key] = {"code": code, "pattern": pattern, "count": 0, "max_ms": 0.0}
+            entry["count"] += 1
+            entry["max_ms"] = max(entry["max_ms"], round(elapsed_ms, 3))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rules.clear()
+            self._slow_regex.clear()
+            self.since = time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            rules = {
+                rule: {
+                    "count": count,
+                    "errors": errors,
+                    "total_ms": round(total / 1e6, 3),
+                    "mean_us": round(total / count / 1e3, 3) if count else 0.0,
+                    "max_us": round(peak / 1e3, 3),
+                }
+                for rule, (count, errors, total, peak) in sorted(self._rules.items())
+            }
+            slow = sorted(self._slow_regex.values(), key=lambda e: -e["max_ms"])
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "slow_regex_ms": self.slow_regex_ms,
+            "rules": rules,
+            "slow_regex": [dict(e) for e in slow],
+        }
+
+
+def _walk(items, in_repeat: bool) -> Optional[str]:
+    for op, av in items:
+        if op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT) or op is getattr(_sre, "POSSESSIVE_REPEAT", None):
+            low, high, sub = av
+            wide = high == _sre.MAXREPEAT or high > _WIDE_REPEAT
+            if wide and in_repeat:
+                return "nested_quantifier"
+            if op is getattr(_sre, "POSSESSIVE_REPEAT", None):
+                continue  # never backtracks
+            found = _walk(sub, in_repeat or wide)
+        elif op in (_sre.GROUPREF, _sre.GROUPREF_EXISTS):
+            return "backreference"
+        elif op == _sre.SUBPATTERN:
+            found = _walk(av[-1], in_repeat)
+        elif op == _sre.BRANCH:
+            found = next((r for r in (_walk(b, in_repeat) for b in av[1]) if r), None)
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            found = _walk(av[1], in_repeat)
+        elif op is getattr(_sre, "ATOMIC_GROUP", None):
+            found = None  # never backtracks into the group
+        else:
+            found = None
+        if found:
+            return found
+    return None
+
+
+def regex_risk(source: str) -> Optional[str]:
+    """Why a pattern can backtrack catastrophically ("nested_quantifier",
+    "backreference"), "syntax_error" if it does not compile, None if it looks safe."""
+    try:
+        parsed = _sre_parse.parse(str(source))
+    except Exception:
+        return "syntax_error"
+    return _walk(parsed, False)
+
+
+class RegexGuard:
+    """Times regex matches and quarantines patterns that keep going over budget (per worker)."""
+
+    def __init__(self, budget_ms: float = 50.0, profile: Optional[ValidationProfile] = None,
+                 strikes: int = 3, quarantine_s: float = 300.0):
+        self.budget_ms = float(budget_ms)
+        self.profile = profile
+        self.strikes = max(1, int(strikes))
+        self.quarantine_s = float(quarantine_s)
+        self._lock = Lock()
+        self._overruns: Dict[str, int] = {}  # pattern -> matches over budget since the last quarantine
+        self._quarantined: Dict[str, Dict[str, Any]] = {}  # pattern -> details (until = expiry)
+        self._unsafe: Dict[tuple, str] = {}  # (code, pattern) -> reason, not enforced since compile
+
+    @classmethod
+    def from_env(cls, profile: Optional[ValidationProfile] = None) -> "RegexGuard":
+        return cls(_env_ms("DQ_REGEX_BUDGET_MS", 50.0), profile, _env_int("DQ_REGEX_STRIKES", 3),
+                   _env_ms("DQ_REGEX_QUARANTINE_S", 300.0))
+
+    def note_unsafe(self, code: str, pattern: str, reason: str) -> None:
+        if (code, pattern) not in self._unsafe:
+            log.warning("validation regex of %s not enforced (%s): %r", code, reason, pattern)
+            with self._lock:
+                self._unsafe[(code, pattern)] = reason
+
+    def is_quarantined(self, pattern: str) -> bool:
+        entry = self._quarantined.get(pattern)
+        if entry is None:
+            return False
+        if time() < entry["until"]:
+            return True
+        with self._lock:
+            self._quarantined.pop(pattern, None)  # expired: enforce again
+        log.info("validation regex of %s enforced again after quarantine", entry["code"])
+        return False
+
+    def fullmatch(self, code: str, pattern: Pattern, text: str) -> Optional[bool]:
+        """True/False like ``pattern.fullmatch``; None when the pattern is quarantined."""
+        if self._quarantined and self.is_quarantined(pattern.pattern):
+            return None
+        started = thread_time()
+        matched = pattern.fullmatch(text) is not None
+        elapsed_ms = (thread_time() - started) * 1000.0
+        if elapsed_ms > self.budget_ms:
+            self._overrun(code, pattern.pattern, elapsed_ms)
+        profile = self.profile
+        if profile is not None and profile.enabled:
+            profile.record("regex", int(elapsed_ms * 1e6), not matched)
+            profile.record_regex(code, pattern.pattern, elapsed_ms)
+        return matched
+
+    def _overrun(self, code: str, pattern: str, elapsed_ms: float) -> None:
+        with self._lock:
+            count = self._overruns[pattern] = self._overruns.get(pattern, 0) + 1
+            if count < self.strikes:
+                quarantined = False
+            else:
+                self._overruns.pop(pattern, None)
+                now = time()
+                self._quarantined[pattern] = {
+                    "code": code, "pattern": pattern, "elapsed_ms": round(elapsed_ms, 3), "strikes": count,
+                    "at": now, "until": now + self.quarantine_s,
+                }
+                quarantined = True
+        if quarantined:
+            log.error("validation regex of %s over %.1f ms CPU %d times: quarantined for %.0f s",
+                      code, self.budget_ms, count, self.quarantine_s)
+        else:
+            log.warning("validation regex of %s took %.1f ms CPU (> %.1f), %d/%d", code, elapsed_ms, self.budget_ms, count, self.strikes)
+
+    def release(self) -> None:
+        """Forget quarantined patterns and overrun counts (e.g. after the admin fixed the rule)."""
+        with self._lock:
+            self._quarantined.clear()
+            self._overruns.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_ms": self.budget_ms,
+                "strikes": self.strikes,
+                "quarantine_s": self.quarantine_s,
+                "quarantined": [dict(v) for v in self._quarantined.values()],
+                "unsafe": [{"code": c, "pattern": p, "reason": r} for (c, p), r in self._unsafe.items()],
+            }
+
+
+def stored_unsafe_patterns(s) -> List[Dict[str, Any]]:
+    """Stored ``validation_rules.regex`` patterns that validation does not enforce.
+
+    Covers every version (rows saved before the admin API rejected such
+    patterns): ``{version_id, status, code, pattern, reason}`` with the
+    ``regex_risk`` reason ("nested_quantifier", "backreference", "syntax_error").
+    """
+    from database.dynamic_models import QuestionnaireVersion, Section, Question
+
+    rows = (
+        s.query(QuestionnaireVersion.id, QuestionnaireVersion.status, Question.code, Question.validation_rules)
+        .join(Section, Section.questionnaire_version_id == QuestionnaireVersion.id)
+        .join(Question, Question.section_id == Section.id)
+        .filter(Question.validation_rules.isnot(None))
+        .order_by(QuestionnaireVersion.id, Question.id)
+    )
+    found = []
+    for version_id, status, code, rules in rows:
+        source = rules.get("regex") if isinstance(rules, dict) else None
+        if not source:
+            continue
+        reason = regex_risk(str(source))
+        if reason is not None:
+            found.append({"version_id": version_id, "status": status, "code": code, "pattern": str(source), "reason": reason})
+    return found
+
+
+PROFILE = ValidationProfile.from_env()
+REGEX_GUARD = RegexGuard.from_env(PROFILE)
+
+
+__all__ = ["ValidationProfile", "RegexGuard", "regex_risk", "stored_unsafe_patterns", "PROFILE", "REGEX_GUARD"]
@@ -0,0 +1,258 @@
+"""Shared, version-keyed index of questionnaire structure.
+
+Many endpoints need the same derived maps for a QuestionnaireVersion
+(code -> question, question id -> code, ordered codes, option values). Walking
+``version.sections`` / ``sec.questions`` / ``qu.options`` on every request
+triggers lazy loads per relationship, so this module builds those maps once
+with three bulk column queries and keeps them as immutable structures.
+
+Caching rules:
+ - Published versions are immutable through the admin API, so their index is
+   reused until the version's (status, valid_from, metadata) stamp changes.
+ - Draft/archived versions are cached briefly and invalidated explicitly by
+   the admin edit endpoints via ``invalidate_version``. The short TTL covers
+   edits made through another worker process.
+ - ``peek_version_index`` returns a published index without loading the version
+   row at all, as long as its stamp was verified within ``_PEEK_SECONDS``
+   (hot write paths such as finalize use it together with the resolver cache).
+
+``QuestionMeta`` keeps the attribute names of the ORM ``Question`` (code, type,
+required, validation_rules, visible_if, options[].value/is_other_flag) so it can
+be passed anywhere a question object was used for reading.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from threading import Lock
+from time import time
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+import copy
+import json
+
+from database.dynamic_models import QuestionnaireVersion, Section, Question, Option
+from backend.services.computed_fields import ExpressionError, compile_expression, expression_source
+from backend.services.visibility import referenced_codes
+
+_DRAFT_TTL_SECONDS = 10
+_PEEK_SECONDS = 30
+
+
+@dataclass(frozen=True)
+class OptionMeta:
+    id: int
+    value: str
+    label: str
+    order: int
+    is_other_flag: bool
+
+
+@dataclass(frozen=True)
+class QuestionMeta:
+    id: int
+    code: str
+    text: str
+    type: str
+    required: bool
+    order: int
+    section_id: int
+    section_order: int
+    validation_rules: Optional[Dict[str, Any]]  # read-only by convention (deep copy of the stored JSON)
+    visible_if: Optional[Any]
+    is_computed: bool
+    computed_expression: Optional[Any]
+    options: Tuple[OptionMeta, ...] = ()
+    option_values: FrozenSet[str] = frozenset()
+    other_values: FrozenSet[str] = frozenset()
+
+
+@dataclass(frozen=True)
+class SectionMeta:
+    id: int
+    title: str
+    description: Optional[str]
+    order: int
+    codes: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class VersionIndex:
+    version_id: int
+    questionnaire_id: int
+    version_number: int
+    status: str
+    sections: Tuple[SectionMeta, ...]
+    codes: Tuple[str, ...]  # ordered by section order, then question order
+    by_code: Mapping[str, QuestionMeta] = field(default_factory=lambda: MappingProxyType({}))
+    qid_to_code: Mapping[int, str] = field(default_factory=lambda: MappingProxyType({}))
+    option_values: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    # code -> codes whose visibility/validation/value reads it (visible_if, not_before_code/not_after_code, computed_expression)
+    dependents: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    # version metadata (ML binding etc.); lets ml_registry.get_binding read the index like a version
+    metadata_json: Optional[Dict[str, Any]] = None
+
+    @property
+    def total_questions(self) -> int:
+        return len(self.codes)
+
+
+# version_id -> (stamp, built_at, checked_at, VersionIndex)
+_INDEX_CACHE: Dict[int, Tuple[tuple, float, float, VersionIndex]] = {}
+_LOCK = Lock()
+
+
+def _stamp(version: QuestionnaireVersion) -> tuple:
+    meta = version.metadata_json
+    return (version.status, version.valid_from, json.dumps(meta, sort_keys=True, default=str) if meta else None)
+
+
+def get_version_index(s, version) -> Optional[VersionIndex]:
+    """Return the cached index for a version (ORM object or id); build it if needed."""
+    if version is None:
+        return None
+    if not isinstance(version, QuestionnaireVersion):
+        version = s.get(QuestionnaireVersion, int(version))
+        if version is None:
+            return None
+    stamp = _stamp(version)
+    now = time()
+    entry = _INDEX_CACHE.get(version.id)
+    if entry and entry[0] == stamp:
+        if version.status == "published" or (now - entry[1] < _DRAFT_TTL_SECONDS):
+            with _LOCK:
+                _INDEX_CACHE[version.id] = (entry[0], entry[1], now, entry[3])
+            return entry[3]
+    index = build_version_index(s, version)
+    with _LOCK:
+        _INDEX_CACHE[version.id] = (stamp, now, now, index)
+    return index
+
+
+def peek_version_index(version_id: Optional[int]) -> Optional[VersionIndex]:
+    """Cached index of a published version whose stamp was checked recently; no query."""
+    if version_id is None:
+        return None
+    entry = _INDEX_CACHE.get(int(version_id))
+    if entry and entry[3].status == "published" and (time() - entry[2]) < _PEEK_SECONDS:
+        return entry[3]
+    return None
+
+
+def invalidate_version(version_id: Optional[int] = None) -> None:
+    """Drop the cached index for one version (or all versions when None)."""
+    with _LOCK:
+        if version_id is None:
+            _INDEX_CACHE.clear()
+        else:
+            _INDEX_CACHE.pop(int(version_id), None)
+
+
+def _computed_inputs(meta: QuestionMeta) -> set:
+    source = expression_source(meta.computed_expression) if meta.is_computed else None
+    if source is None:
+        return set()
+    try:
+        return set(compile_expression(source).inputs)
+    except ExpressionError:
+        return set()
+
+
+def build_dependents(by_code: Mapping[str, QuestionMeta]) -> Mapping[str, FrozenSet[str]]:
+    """code -> codes whose visible_if, relative date rules or computed_expression read it."""
+    dependents: Dict[str, set] = {}
+    for code, meta in by_code.items():
+        refs = referenced_codes(meta.visible_if)
+        rules = meta.validation_rules if isinstance(meta.validation_rules, dict) else {}
+        for key in ("not_before_code", "not_after_code"):
+            if rules.get(key):
+                refs.add(str(rules.get(key)))
+        refs |= _computed_inputs(meta)
+        for ref in refs:
+            if ref != code:
+                dependents.setdefault(ref, set()).add(code)
+    return MappingProxyType({k: frozenset(v) for k, v in dependents.items()})
+
+
+def build_version_index(s, version: QuestionnaireVersion) -> VersionIndex:
+    """Build a VersionIndex with three column queries (sections, questions, options)."""
+    sections = (
+        s.query(Section.id, Section.title, Section.description, Section.order)
+        .filter(Section.questionnaire_version_id == version.id)
+        .all()
+    )
+    q_rows = (
+        s.query(
+            Question.id, Question.code, Question.text, Question.type, Question.required,
+            Question.order, Question.section_id, Section.order.label("section_order"),
+            Question.validation_rules, Question.visible_if, Question.is_computed, Question.computed_expression,
+        )
+        .join(Section, Section.id == Question.section_id)
+        .filter(Section.questionnaire_version_id == version.id)
+        .all()
+    )
+    options_by_qid: Dict[int, list] = {}
+    qids = [r.id for r in q_rows]
+    if qids:
+        for o in (
+            s.query(Option.id, Option.question_id, Option.value, Option.label, Option.order, Option.is_other_flag)
+            .filter(Option.question_id.in_(qids))
+            .all()
+        ):
+            options_by_qid.setdefault(o.question_id, []).append(
+                OptionMeta(id=o.id, value=o.value, label=o.label, order=o.order, is_other_flag=bool(o.is_other_flag))
+            )
+
+    by_code: Dict[str, QuestionMeta] = {}
+    qid_to_code: Dict[int, str] = {}
+    option_values: Dict[str, FrozenSet[str]] = {}
+    q_rows = sorted(q_rows, key=lambda r: (r.section_order, r.order, r.id))
+    for r in q_rows:
+        opts = tuple(sorted(options_by_qid.get(r.id, []), key=lambda o: (o.order, o.id)))
+        values = frozenset(o.value for o in opts)
+        meta = QuestionMeta(
+            id=r.id,
+            code=r.code,
+            text=r.text,
+            type=r.type,
+            required=bool(r.required),
+            order=r.order,
+            section_id=r.section_id,
+            section_order=r.section_order,
+            validation_rules=copy.deepcopy(r.validation_rules),
+            visible_if=copy.deepcopy(r.visible_if),
+            is_computed=bool(r.is_computed),
+            computed_expression=copy.deepcopy(r.computed_expression),
+            options=opts,
+            option_values=values,
+            other_values=frozenset(o.value for o in opts if o.is_other_flag and o.value),
+        )
+        by_code[r.code] = meta
+        qid_to_code[r.id] = r.code
+        option_values[r.code] = values
+
+    codes_by_section: Dict[int, list] = {}
+    for r in q_rows:
+        codes_by_section.setdefault(r.section_id, []).append(r.code)
+    section_metas = tuple(
+        SectionMeta(id=sec.id, title=sec.title, description=sec.description, order=sec.order,
+                    codes=tuple(codes_by_section.get(sec.id, [])))
+        for sec in sorted(sections, key=lambda sc: (sc.order, sc.id))
+    )
+    return VersionIndex(
+        version_id=version.id,
+        questionnaire_id=version.questionnaire_id,
+        version_number=version.version_number,
+        status=version.status,
+        sections=section_metas,
+        codes=tuple(r.code for r in q_rows),
+        by_code=MappingProxyType(by_code),
+        qid_to_code=MappingProxyType(qid_to_code),
+        option_values=MappingProxyType(option_values),
+        dependents=build_dependents(by_code),
+        metadata_json=copy.deepcopy(version.metadata_json),
+    )
+
+
+__all__ = [
+    "OptionMeta", "QuestionMeta", "SectionMeta", "VersionIndex",
+    "get_version_index", "peek_version_index", "invalidate_version", "build_version_index", "build_dependents", "referenced_codes",
+]
@@ -0,0 +1,218 @@
+"""visible_if rules compiled into a dependency graph of predicates.
+
+Rule format (stored in dq_question.visible_if)::
+
+    {"code": "<question_code>", "<op>": <value>}    # leaf
+    {"and": [<rule>, ...]} / {"or": [<rule>, ...]}
+
+Leaf operators (several in one leaf must all hold):
+ - ``equals`` / ``not_equals``: plain comparison with the raw answer
+ - ``in`` / ``not_in``: answer in the given list (multi_choice: any selected value)
+ - ``gt`` / ``gte`` / ``lt`` / ``lte``: numeric comparison; non numeric answers never match
+ - ``answered``: true when the question has a non-empty answer (false: it has none)
+A leaf without operator keeps the historical meaning ``equals: null``; unknown
+operators are permissive (true).
+
+``VisibilityGraph`` compiles every rule of a version once and orders the
+questions topologically by the codes their rules reference. Evaluation follows
+that order and reads the answer of a hidden question as empty, so a question
+that depends on a hidden one is hidden as well (cascade) unless another branch
+of an ``or`` (or a ``not_equals``/``answered: false`` test) still holds.
+``evaluate(answers, scope)`` only evaluates the scope and its ancestors, and
+``descendants`` lists the questions whose visibility can change when an answer
+changes (incremental re-evaluation on delta saves). Rules that reference each
+other in a cycle are evaluated without the cascade between them.
+
+The frontend mirrors these semantics in DynamicQuestionnaire.jsx (evalRule).
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+# (answers, hidden codes) -> visible; answers of hidden codes read as None
+Predicate = Callable[[Mapping[str, Any], AbstractSet[str]], bool]
+_NOTHING_HIDDEN: FrozenSet[str] = frozenset()
+
+_LEAF_OPERATORS = ("equals", "not_equals", "in", "not_in", "gt", "gte", "lt", "lte", "answered")
+
+
+def _true(answers, hidden) -> bool:
+    return True
+
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool) or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_answered(value) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value.strip() != ""
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0
+    return True
+
+
+def _member(value, allowed) -> bool:
+    if isinstance(value, (list, tuple)):
+        return any(v in allowed for v in value)
+    return value in allowed
+
+
+def _compare(op: str, expected) -> Callable[[Any], bool]:
+    if op == "equals":
+        return lambda v: v == expected
+    if op == "not_equals":
+        return lambda v: v != expected
+    if op in ("in", "not_in"):
+        allowed = tuple(expected) if isinstance(expected, (list, tuple)) else (expected,)
+        if op == "in":
+            return lambda v: _member(v, allowed)
+        return lambda v: not _member(v, allowed)
+    if op == "answered":
+        wanted = bool(expected)
+        return lambda v: is_answered(v) == wanted
+    bound = _number(expected)
+    if bound is None:
+        return lambda v: False
+    if op == "gt":
+        return lambda v: (n := _number(v)) is not None and n > bound
+    if op == "gte":
+        return lambda v: (n := _number(v)) is not None and n >= bound
+    if op == "lt":
+        return lambda v: (n := _number(v)) is not None and n < bound
+    return lambda v: (n := _number(v)) is not None and n <= bound
+
+
+def compile_rule(rule) -> Predicate:
+    """visible_if rule -> predicate over (answers, hidden codes)."""
+    if not rule or not isinstance(rule, dict):
+        return _true
+    if "and" in rule:
+        parts = tuple(compile_rule(r) for r in (rule["and"] or []))
+        return lambda answers, hidden: all(p(answers, hidden) for p in parts)
+    if "or" in rule:
+        parts = tuple(compile_rule(r) for r in (rule["or"] or []))
+        return lambda answers, hidden: any(p(answers, hidden) for p in parts)
+    code = rule.get("code")
+    if not code:
+        return _true
+    ops = [op for op in _LEAF_OPERATORS if op in rule]
+    if not ops:
+        ops_checks = (_compare("equals", None),)
+    else:
+        ops_checks = tuple(_compare(op, rule[op]) for op in ops)
+    if len(ops_checks) == 1:
+        check = ops_checks[0]
+        return lambda answers, hidden: check(None if code in hidden else answers.get(code))
+    return lambda answers, hidden: all(c(None if code in hidden else answers.get(code)) for c in ops_checks)
+
+
+def evaluate_visibility(rule, answers: Dict[str, Any]) -> bool:
+    """Evaluate one rule on raw answers (no cascade); prefer VisibilityGraph for a version."""
+    return compile_rule(rule)(answers, _NOTHING_HIDDEN)
+
+
+def referenced_codes(rule) -> set:
+    """Question codes referenced by a visible_if rule ({"code": ...} / {"and"|"or": [...]})."""
+    found = set()
+    if isinstance(rule, dict):
+        if rule.get("code"):
+            found.add(str(rule.get("code")))
+        for key in ("and", "or"):
+            for sub in rule.get(key) or []:
+                found |= referenced_codes(sub)
+    return found
+
+
+@dataclass(frozen=True)
+class VisibilityGraph:
+    order: Tuple[str, ...]  # codes with a rule, parents before children
+    predicates: Mapping[str, Predicate]
+    parents: Mapping[str, FrozenSet[str]]  # referenced codes that also have a rule
+    ancestors: Mapping[str, FrozenSet[str]]
+    descendants: Mapping[str, FrozenSet[str]]  # code -> every rule that (transitively) reads it
+
+    def evaluate(self, answers: Mapping[str, Any], scope: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """{code: visible} for questions with a rule (others are always visible).
+
+        With ``scope`` only those codes and what they depend on are evaluated.
+        """
+        needed = None
+        if scope is not None:
+            needed = set()
+            for code in scope:
+                if code in self.predicates:
+                    needed.add(code)
+                    needed |= self.ancestors[code]
+        visible: Dict[str, bool] = {}
+        hidden = set()  # answers of hidden questions do not count for later rules
+        predicates = self.predicates
+        for code in self.order:
+            if needed is not None and code not in needed:
+                continue
+            shown = predicates[code](answers, hidden)
+            visible[code] = shown
+            if not shown:
+                hidden.add(code)
+        return visible
+
+
+def _closure(edges: Mapping[str, Iterable[str]], start: str) -> FrozenSet[str]:
+    seen = set()
+    stack = list(edges.get(start, ()))
+    while stack:
+        node = stack.pop()
+        if node in seen or node == start:
+            continue
+        seen.add(node)
+        stack.extend(edges.get(node, ()))
+    return frozenset(seen)
+
+
+def build_graph(rules: Mapping[str, Any]) -> VisibilityGraph:
+    """Compile {code: visible_if} (every question of a version, in display order)."""
+    ruled = {code: rule for code, rule in rules.items() if rule}
+    refs = {code: referenced_codes(rule) - {code} for code, rule in ruled.items()}
+    parents = {code: frozenset(r for r in deps if r in ruled) for code, deps in refs.items()}
+    # children edges over every referenced code (answers of unruled questions matter too)
+    children: Dict[str, set] = {}
+    for code, deps in refs.items():
+        for ref in deps:
+            children.setdefault(ref, set()).add(code)
+    # Kahn's algorithm; codes left in cycles keep display order at the end
+    pending = {code: set(p) for code, p in parents.items()}
+    order = []
+    ready = [code for code in ruled if not pending[code]]
+    while ready:
+        code = ready.pop(0)
+        order.append(code)
+        for child in children.get(code, ()):
+            deps = pending.get(child)
+            if deps is not None and code in deps:
+                deps.discard(code)
+                if not deps:
+                    ready.append(child)
+    placed = set(order)
+    order.extend(code for code in ruled if code not in placed)
+    parent_edges = {code: tuple(p) for code, p in parents.items()}
+    return VisibilityGraph(
+        order=tuple(order),
+        predicates=MappingProxyType({code: compile_rule(rule) for code, rule in ruled.items()}),
+        parents=MappingProxyType(parents),
+        ancestors=MappingProxyType({code: _closure(parent_edges, code) for code in ruled}),
+        descendants=MappingProxyType({code: _closure(children, code) for code in children}),
+    )
+
+
+__all__ = [
+    "compile_rule", "evaluate_visibility", "referenced_codes", "is_answered",
+    "VisibilityGraph", "build_graph",
+]
@@ -6,7 +6,7 @@ They are added to the same SQLAlchemy Base so tables get created idempotently.
 Dynamic questionnaires are always enabled; no environment flag required.
 """
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, JSON, inspect, text, Index
+    Column, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, JSON, inspect, text, Index, Float
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -115,11 +115,18 @@ class QuestionnaireAssignment(Base):
     assigned_at = Column(DateTime, server_default=func.now())
     last_activity_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     progress_percent = Column(Integer, nullable=False, default=0)
+    # Materialized count of answered items in the current response (kept in sync on save/finalize/submit)
+    answered_count = Column(Integer, nullable=False, default=0)
 
     __table_args__ = (
         # Speed up lookups by (user_code, questionnaire_version_id)
         Index("ix_dq_assignment_user_version", user_code, questionnaire_version_id),
         Index("ix_dq_assignment_last_activity", last_activity_at),
+        # One assignment per user and version (anonymous shadow submissions are exempt)
+        Index(
+            "uq_dq_assignment_user_version", user_code, questionnaire_version_id, unique=True,
+            mssql_where=user_code.isnot(None), sqlite_where=user_code.isnot(None),
+        ),
     )
 
 class Response(Base):
@@ -130,9 +137,15 @@ class Response(Base):
     submitted_at = Column(DateTime)
     finalized_at = Column(DateTime)
     summary_cache = Column(JSON)
+    # Incremented on every write of the response items; used for optimistic concurrency on save
+    revision = Column(Integer, nullable=False, default=0)
+    # Highest dq_response_event.id already folded into dq_response_item (event log mode)
+    compacted_event_id = Column(Integer, nullable=False, default=0)
 
     __table_args__ = (
         Index("ix_dq_response_assignment", assignment_id),
+        # One current response per assignment
+        Index("uq_dq_response_assignment", assignment_id, unique=True),
     )
 
 class ResponseItem(Base):
@@ -142,8 +155,10 @@ class ResponseItem(Base):
     # NOTE: Avoid ON DELETE CASCADE here to prevent multiple cascade paths in SQL Server.
     # Cleanup of orphaned items when deleting questions should be handled at application level.
     question_id = Column(Integer, ForeignKey("dq_question.id"), nullable=False, index=True)
-    value = Column(String(2000))
-    numeric_value = Column(Integer)
+    value = Column(String(2000))  # text form (kept for every type; legacy readers/exports)
+    numeric_value = Column(Integer)  # integers, booleans (0/1)
+    float_value = Column(Float)  # every number answer, decimals included
+    values_json = Column(JSON(none_as_null=True))  # multi_choice selections as a JSON array
     extra_json = Column(JSON)
     answered_at = Column(DateTime, server_default=func.now())
 
@@ -152,6 +167,44 @@ class ResponseItem(Base):
         Index("ix_dq_response_item_response", response_id),
     )
 
+class ResponseEvent(Base):
+    """Append-only answer log written by autosave when DQ_RESPONSE_EVENTS is on.
+
+    Rows are never updated; compaction folds them into dq_response_item and moves
+    dq_response.compacted_event_id forward. Same value columns as ResponseItem.
+    """
+    __tablename__ = "dq_response_event"
+    id = Column(Integer, primary_key=True)
+    response_id = Column(Integer, ForeignKey("dq_response.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(Integer, nullable=False)  # no FK: events may outlive a deleted question
+    value = Column(String(2000))
+    numeric_value = Column(Integer)
+    float_value = Column(Float)
+    values_json = Column(JSON(none_as_null=True))
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_dq_response_event_response", response_id, id),
+    )
+
+class PrefillValue(Base):
+    """Latest known answer per (user_code, question_code) across questionnaires.
+
+    Maintained on save/finalize/submit so /dynamic/prefill is a single indexed
+    lookup instead of a scan over every assignment/response of the user.
+    """
+    __tablename__ = "dq_prefill_value"
+    id = Column(Integer, primary_key=True)
+    user_code = Column(String(64), nullable=False)
+    question_code = Column(String(64), nullable=False)
+    value_json = Column(JSON)  # normalized value as returned by the public API
+    source_version_id = Column(Integer)  # informational only (no FK to avoid cascade paths)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_code", "question_code", name="uq_dq_prefill_user_question"),
+    )
+
 # --- Change Log ---
 
 class ChangeLog(Base):
@@ -171,17 +224,37 @@ class ChangeLog(Base):
 def ensure_dynamic_schema(db_engine):
     """Ensure new columns exist without a full migration tool.
 
-    Currently adds dq_questionnaire.is_primary if missing.
+    Currently adds dq_questionnaire.is_primary, dq_assignment.answered_count,
+    dq_response.revision/compacted_event_id and dq_response_item.float_value/values_json
+    if missing.
     Safe to run on startup; no-op if column already exists.
+
+    The unique indexes uq_dq_assignment_user_version / uq_dq_response_assignment are
+    only created once there are no duplicates (`python manage.py dedupe-assignments`).
     """
     try:
         inspector = inspect(db_engine)
         cols = inspector.get_columns("dq_questionnaire")
         col_names = {c.get("name") or c.get("column_name") for c in cols}
+        assign_cols = {c.get("name") or c.get("column_name") for c in inspector.get_columns("dq_assignment")}
+        response_cols = {c.get("name") or c.get("column_name") for c in inspector.get_columns("dq_response")}
+        item_cols = {c.get("name") or c.get("column_name") for c in inspector.get_columns("dq_response_item")}
         with db_engine.begin() as conn:
             if "is_primary" not in col_names:
                 # SQL Server BIT type for boolean; default 0
                 conn.execute(text("ALTER TABLE dq_questionnaire ADD is_primary BIT NOT NULL CONSTRAINT DF_dq_questionnaire_is_primary DEFAULT 0"))
+            if "answered_count" not in assign_cols:
+                # Existing rows start at 0; run `python manage.py backfill-progress` to populate them
+                conn.execute(text("ALTER TABLE dq_assignment ADD answered_count INT NOT NULL CONSTRAINT DF_dq_assignment_answered_count DEFAULT 0"))
+            if "revision" not in response_cols:
+                conn.execute(text("ALTER TABLE dq_response ADD revision INT NOT NULL CONSTRAINT DF_dq_response_revision DEFAULT 0"))
+            if "compacted_event_id" not in response_cols:
+                conn.execute(text("ALTER TABLE dq_response ADD compacted_event_id INT NOT NULL CONSTRAINT DF_dq_response_compacted_event_id DEFAULT 0"))
+            # Typed answer columns; existing rows are filled by `python manage.py backfill-typed-values`
+            if "float_value" not in item_cols:
+                conn.execute(text("ALTER TABLE dq_response_item ADD float_value FLOAT NULL"))
+            if "values_json" not in item_cols:
+                conn.execute(text("ALTER TABLE dq_response_item ADD values_json NVARCHAR(MAX) NULL"))
 
             # Ensure performance indexes (SQL Server specific IF NOT EXISTS checks)
             conn.execute(text(
@@ -224,6 +297,27 @@ def ensure_dynamic_schema(db_engine):
                 END
                 """
             ))
+            conn.execute(text(
+                """
+                IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'uq_dq_assignment_user_version' AND object_id = OBJECT_ID('dbo.dq_assignment'))
+                   AND NOT EXISTS (
+                       SELECT 1 FROM dbo.dq_assignment WHERE user_code IS NOT NULL
+                       GROUP BY user_code, questionnaire_version_id HAVING COUNT(*) > 1
+                   )
+                BEGIN
+                    CREATE UNIQUE INDEX uq_dq_assignment_user_version ON dbo.dq_assignment (user_code, questionnaire_version_id) WHERE user_code IS NOT NULL;
+                END
+                """
+            ))
+            conn.execute(text(
+                """
+                IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'uq_dq_response_assignment' AND object_id = OBJECT_ID('dbo.dq_response'))
+                   AND NOT EXISTS (SELECT 1 FROM dbo.dq_response GROUP BY assignment_id HAVING COUNT(*) > 1)
+                BEGIN
+                    CREATE UNIQUE INDEX uq_dq_response_assignment ON dbo.dq_response (assignment_id);
+                END
+                """
+            ))
             conn.execute(text(
                 """
                 IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_dq_response_item_response' AND object_id = OBJECT_ID('dbo.dq_response_item'))
@@ -235,4 +329,10 @@ def ensure_dynamic_schema(db_engine):
     except Exception:
         # Don't crash app if we can't alter schema; feature will behave as False
         pass
+    try:
+        existing = {ix.get("name") for ix in inspect(db_engine).get_indexes("dq_assignment")}
+        if "uq_dq_assignment_user_version" not in existing:
+            print("[schema] uq_dq_assignment_user_version not present; if there are duplicate assignments run `python manage.py dedupe-assignments`.")
+    except Exception:
+        pass
 
@@ -67,6 +67,13 @@ export const getDynamicQuestionnaire = async (code) => {
   return handleResponse(res);
 };
 
+// JSON Schema of the version's validation rules; the server sends an ETag with
+// Cache-Control: no-cache, so the browser revalidates and reuses its copy on 304.
+export const getDynamicQuestionnaireSchema = async (code) => {
+  const res = await fetch(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/schema`, { method: "GET" });
+  return handleResponse(res);
+};
+
 export const submitDynamicResponse = async (code, payload) => {
   const res = await fetch(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/responses`, {
     method: "POST",
@@ -92,21 +99,33 @@ export const getPrefillValues = async (userCode, codes) => {
   return handleResponse(res);
 };
 
-export const saveDynamicResponse = async (code, payload) => {
-  const res = await fetch(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/save`, {
+// Clave de idempotencia: el backend devuelve la respuesta registrada si la petición se repite
+const newIdempotencyKey = () => {
+  if (typeof crypto !== "undefined" && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
+// POST con la misma Idempotency-Key en el reintento (solo ante fallo de red)
+const postIdempotent = async (url, payload) => {
+  const init = {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", "Idempotency-Key": newIdempotencyKey() },
     body: JSON.stringify(payload || {}),
-  });
+  };
+  try {
+    return await fetch(url, init);
+  } catch (_) {
+    return fetch(url, init);
+  }
+};
+
+export const saveDynamicResponse = async (code, payload) => {
+  const res = await postIdempotent(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/save`, payload);
   return handleResponse(res);
 };
 
 export const finalizeDynamicResponse = async (code, payload) => {
-  const res = await fetch(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/finalize`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify(payload || {}),
-  });
+  const res = await postIdempotent(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/finalize`, payload);
   return handleResponse(res);
 };
 
@@ -114,7 +133,7 @@ export const saveDynamicResponseKeepAlive = async (code, payload) => {
   try {
     const res = await fetch(`${API_BASE_URL}/dynamic/questionnaires/${encodeURIComponent(code)}/save`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", "Idempotency-Key": newIdempotencyKey() },
       keepalive: true,
       body: JSON.stringify(payload || {}),
     });
@@ -1,6 +1,6 @@
-import React, { useCallback, useEffect, useMemo, useState } from "react";
+import React, { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { useLocation, useNavigate, useParams } from "react-router-dom";
-import { getDynamicQuestionnaire, getMyDynamicStatus, saveDynamicResponse, finalizeDynamicResponse, saveDynamicResponseKeepAlive, getPrefillValues, getUxSurveyStatus } from "../api";
+import { getDynamicQuestionnaire, getDynamicQuestionnaireSchema, getMyDynamicStatus, saveDynamicResponse, finalizeDynamicResponse, saveDynamicResponseKeepAlive, getPrefillValues, getUxSurveyStatus } from "../api";
 import UxSurveyModal from './UxSurveyModal';
 import styled, { keyframes } from "styled-components";
 import { ArrowLeft, ChevronRight, CheckCircle2, XCircle, AlertCircle, Save, Check, Award } from "lucide-react";
@@ -652,8 +652,9 @@ function InputForQuestion({ q, value, onChange, disabled, answers, fieldErrors }
       const vr = q.validation_rules || {};
       const stepVal = vr.allow_decimal ? (vr.step !== undefined ? vr.step : 'any') : 1;
       const props = { min: vr.min ?? undefined, max: vr.max ?? undefined, step: stepVal };
-      const isIcfesGlobal = q.code === 'puntaje_global_saber11';
-      return <StyledInput {...props} type="number" value={value ?? ""} onChange={e => onChange(e.target.value === "" ? "" : Number(e.target.value))} disabled={!!disabled || isIcfesGlobal} placeholder={q.placeholder} />;
+      // Computed questions (computed_expression) are filled by the server
+      const isComputed = !!q.is_computed || q.code === 'puntaje_global_saber11';
+      return <StyledInput {...props} type="number" value={value ?? ""} onChange={e => onChange(e.target.value === "" ? "" : Number(e.target.value))} disabled={!!disabled || isComputed} placeholder={q.placeholder} />;
     }
     case "date":
       {
@@ -757,6 +758,22 @@ function InputForQuestion({ q, value, onChange, disabled, answers, fieldErrors }
   }
 }
 
+// Text rules from the version's JSON Schema (minLength/maxLength/pattern). The
+// server stays authoritative: a pattern this browser cannot compile is skipped.
+const textSchemaErrors = (prop, val) => {
+  const out = [];
+  if (!prop || typeof val !== 'string' || val === '') return out;
+  const len = [...val].length;
+  if (prop.minLength !== undefined && len < prop.minLength) out.push(`Mínimo ${prop.minLength} caracteres`);
+  if (prop.maxLength !== undefined && len > prop.maxLength) out.push(`Máximo ${prop.maxLength} caracteres`);
+  if (prop.pattern) {
+    let re = null;
+    try { re = new RegExp(prop.pattern, 'u'); } catch (_) {}
+    if (re && !re.test(val)) out.push('Formato inválido');
+  }
+  return out;
+};
+
 export default function DynamicQuestionnaire() {
   const { code } = useParams();
   const navigate = useNavigate();
@@ -779,6 +796,7 @@ export default function DynamicQuestionnaire() {
     if (!usuario) navigate('/login');
   }, [usuario, usuario?.codigo_estudiante, navigate]);
   const [data, setData] = useState(null);
+  const [schema, setSchema] = useState(null); // JSON Schema of the version (optional, soft checks only)
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [answers, setAnswers] = useState({});
@@ -793,6 +811,8 @@ export default function DynamicQuestionnaire() {
   const [mlResult, setMlResult] = useState(null);
   const [uxSurveyOpen, setUxSurveyOpen] = useState(false);
   const [uxSurveyDone, setUxSurveyDone] = useState(false);
+  // Last state acknowledged by the server: autosave only sends the difference
+  const savedRef = useRef({ answers: {}, revision: undefined });
 
   // Helper to coerce raw answers from backend into proper JS types based on questionnaire structure
   const coerceAnswers = (structure, raw) => {
@@ -829,11 +849,16 @@ export default function DynamicQuestionnaire() {
       try {
         const res = await getDynamicQuestionnaire(code);
         if (mounted) setData(res?.questionnaire || null);
+        getDynamicQuestionnaireSchema(code).then(s => { if (mounted) setSchema(s); }).catch(() => {});
         if (usuario?.codigo_estudiante) {
           const mine = await getMyDynamicStatus(code, usuario.codigo_estudiante);
           if (mounted && mine) {
             setFinalized(mine.status === 'finalized');
             if (mine.answers) setAnswers(coerceAnswers(res?.questionnaire, mine.answers));
+            savedRef.current = {
+              answers: mine.answers ? coerceAnswers(res?.questionnaire, mine.answers) : {},
+              revision: mine.revision,
+            };
             // Persisted ML summary for read-only view after reingress
             if (mine.ml) setMlResult(mine.ml);
             // If backend prompts for UX survey, fetch status to show modal if pending
@@ -876,30 +901,80 @@ export default function DynamicQuestionnaire() {
     return () => { mounted = false; };
   }, [code, usuario?.codigo_estudiante]);
 
-  // Client-side visibility evaluator (mirrors backend simple rules)
-  const evalVisible = useCallback((rule, vals) => {
+  // Client-side visibility evaluator (mirrors backend/services/visibility.py)
+  const evalRule = useCallback((rule, vals) => {
     if (!rule) return true;
     if (typeof rule !== 'object') return true;
-    if (Array.isArray(rule.and)) return rule.and.every(r => evalVisible(r, vals));
-    if (Array.isArray(rule.or)) return rule.or.some(r => evalVisible(r, vals));
+    if (Array.isArray(rule.and)) return rule.and.every(r => evalRule(r, vals));
+    if (Array.isArray(rule.or)) return rule.or.some(r => evalRule(r, vals));
     const code = rule.code;
-    if (code) {
-      const expected = rule.equals;
-      return (vals ?? {})[code] === expected;
-    }
-    return true;
+    if (!code) return true;
+    const v = (vals ?? {})[code] ?? null;
+    const num = (x) => (x === null || x === undefined || x === '' || typeof x === 'boolean' || isNaN(Number(x))) ? null : Number(x);
+    const answered = !(v === null || v === undefined || (typeof v === 'string' && v.trim() === '') || (Array.isArray(v) && v.length === 0));
+    const member = (list) => {
+      const allowed = Array.isArray(list) ? list : [list];
+      return Array.isArray(v) ? v.some(x => allowed.includes(x)) : allowed.includes(v);
+    };
+    const checks = {
+      equals: (e) => v === e,
+      not_equals: (e) => v !== e,
+      in: (e) => member(e),
+      not_in: (e) => !member(e),
+      gt: (e) => num(v) !== null && num(e) !== null && num(v) > num(e),
+      gte: (e) => num(v) !== null && num(e) !== null && num(v) >= num(e),
+      lt: (e) => num(v) !== null && num(e) !== null && num(v) < num(e),
+      lte: (e) => num(v) !== null && num(e) !== null && num(v) <= num(e),
+      answered: (e) => answered === Boolean(e),
+    };
+    const ops = Object.keys(checks).filter(op => op in rule);
+    // A leaf without operator keeps the historical meaning (equals null)
+    if (!ops.length) return v === null;
+    return ops.every(op => checks[op](rule[op]));
   }, []);
 
+  // Visibility per question code with cascade: answers of hidden questions count as empty
+  const visibleCodes = useMemo(() => {
+    const out = {};
+    if (!data?.sections) return out;
+    const byCode = {};
+    for (const sec of data.sections) for (const q of (sec.questions || [])) byCode[q.code] = q;
+    const refs = (rule, acc) => {
+      if (rule && typeof rule === 'object') {
+        if (rule.code) acc.add(rule.code);
+        for (const key of ['and', 'or']) if (Array.isArray(rule[key])) rule[key].forEach(r => refs(r, acc));
+      }
+      return acc;
+    };
+    const visiting = new Set();
+    const visit = (code) => {
+      if (code in out) return out[code];
+      const q = byCode[code];
+      if (!q || !q.visible_if) { out[code] = true; return true; }
+      if (visiting.has(code)) return true; // cycle: no cascade between these rules
+      visiting.add(code);
+      const view = { ...(answers || {}) };
+      for (const parent of refs(q.visible_if, new Set())) {
+        if (parent !== code && byCode[parent] && !visit(parent)) view[parent] = null;
+      }
+      visiting.delete(code);
+      out[code] = evalRule(q.visible_if, view);
+      return out[code];
+    };
+    Object.keys(byCode).forEach(visit);
+    return out;
+  }, [data, answers, evalRule]);
+
   // Derive which sections have at least one visible question
   const visibleMap = useMemo(() => {
     const map = {};
     if (!data?.sections) return map;
     for (const sec of data.sections) {
-      const vqs = (sec.questions || []).filter(q => evalVisible(q.visible_if, answers));
+      const vqs = (sec.questions || []).filter(q => visibleCodes[q.code] !== false);
       map[sec.id] = vqs.map(q => q.id);
     }
     return map;
-  }, [data, answers, evalVisible]);
+  }, [data, visibleCodes]);
 
   // Initialize open state on first load to open first section that has visible questions
   useEffect(() => {
@@ -983,6 +1058,11 @@ export default function DynamicQuestionnaire() {
             if (minAttr && val < minAttr) { errs.push(`${q.text}: fecha antes de ${minAttr}`); perField[q.code] = [...(perField[q.code]||[]), `No antes de ${minAttr}`]; }
             if (maxAttr && val > maxAttr) { errs.push(`${q.text}: fecha después de ${maxAttr}`); perField[q.code] = [...(perField[q.code]||[]), `No después de ${maxAttr}`]; }
           }
+        } else if (q.type === 'text' || q.type === 'textarea') {
+          for (const msg of textSchemaErrors(schema?.properties?.[q.code], val)) {
+            errs.push(`${q.text}: ${msg.toLowerCase()}`);
+            perField[q.code] = [...(perField[q.code]||[]), msg];
+          }
         }
         // Require inline 'otro' text if selected (only for single choice)
         const hasOther = (q.options || []).some(op => op.is_other);
@@ -1007,6 +1087,40 @@ export default function DynamicQuestionnaire() {
     return errs.length ? errs : null;
   };
 
+  // Changed answers since the last acknowledged save. Inline "otro_" texts are not
+  // stored server-side, so they always travel with the delta (needed for validation).
+  const buildDelta = (current) => {
+    const saved = savedRef.current.answers || {};
+    const changes = {};
+    const keys = new Set([...Object.keys(current || {}), ...Object.keys(saved)]);
+    keys.forEach(k => {
+      const cur = (current || {})[k];
+      if (k.startsWith('otro_')) {
+        if (cur !== undefined) changes[k] = cur;
+        return;
+      }
+      if (JSON.stringify(cur) !== JSON.stringify(saved[k])) changes[k] = cur === undefined ? null : cur;
+    });
+    return changes;
+  };
+
+  const saveDelta = async () => {
+    const user_code = usuario?.codigo_estudiante || undefined;
+    const snapshot = { ...answers };
+    const changes = buildDelta(snapshot);
+    const hasChanges = Object.keys(changes).some(k => !k.startsWith('otro_'));
+    if (!hasChanges) return;
+    let res;
+    try {
+      res = await saveDynamicResponse(code, { user_code, changes, base_revision: savedRef.current.revision });
+    } catch (e) {
+      // Saved from another tab/device: the form holds the full state, send it as a snapshot
+      if ((e.message || '') !== 'revision_conflict') throw e;
+      res = await saveDynamicResponse(code, { user_code, answers: snapshot });
+    }
+    savedRef.current = { answers: snapshot, revision: res?.revision };
+  };
+
   const handleSave = async () => {
     setSubmitErr(""); setSubmitMsg("");
     setBusySave(true);
@@ -1016,8 +1130,7 @@ export default function DynamicQuestionnaire() {
         setSubmitErr(`Corrige valores inválidos antes de guardar: \n- ${errs.join('\n- ')}`);
         return;
       }
-  const payload = { user_code: usuario?.codigo_estudiante || undefined, answers };
-      await saveDynamicResponse(code, payload);
+      await saveDelta();
       setSubmitMsg("Progreso guardado.");
     } catch (e) {
       setSubmitErr(e.message || "No se pudo guardar.");
@@ -1061,7 +1174,9 @@ export default function DynamicQuestionnaire() {
   useEffect(() => {
     const onBeforeUnload = (e) => {
       if (finalized) return;
-  const payload = { user_code: usuario?.codigo_estudiante || undefined, answers };
+      const changes = buildDelta(answers);
+      if (!Object.keys(changes).some(k => !k.startsWith('otro_'))) return;
+      const payload = { user_code: usuario?.codigo_estudiante || undefined, changes, base_revision: savedRef.current.revision };
       // fire and forget; keep it quick
       saveDynamicResponseKeepAlive(code, payload);
     };
@@ -103,6 +103,65 @@ def parse_args() -> argparse.Namespace:
     p_reml.add_argument("--limit", type=int, help="Max number of assignments to process")
     p_reml.add_argument("--dry-run", action="store_true", help="Compute without saving (prints a summary)")
 
+    # Maintenance: populate materialized progress counters on assignments
+    p_bprog = sub.add_parser("backfill-progress", help="Recompute answered_count/progress_percent for existing assignments")
+    p_bprog.add_argument("--version-id", type=int, help="Only assignments of this QuestionnaireVersion ID")
+    p_bprog.add_argument("--dry-run", action="store_true", help="Compute without saving (prints a summary)")
+
+    # Maintenance: rebuild the prefill index from stored responses
+    p_bpre = sub.add_parser("backfill-prefill", help="Rebuild dq_prefill_value (latest value per user/question code) from stored responses")
+    p_bpre.add_argument("--user-code", help="Only rebuild entries for this user code")
+    p_bpre.add_argument("--dry-run", action="store_true", help="Compute without saving (prints a summary)")
+
+    # Maintenance: fill float_value/values_json for items stored before the typed columns existed
+    p_btyped = sub.add_parser("backfill-typed-values", help="Populate dq_response_item.float_value/values_json from the legacy text column")
+    p_btyped.add_argument("--version-id", type=int, help="Only items of this QuestionnaireVersion ID")
+    p_btyped.add_argument("--batch-size", type=int, default=1000, help="Rows per UPDATE batch (default 1000)")
+    p_btyped.add_argument("--dry-run", action="store_true", help="Compute without saving (prints a summary)")
+
+    # Maintenance: store the ICFES global score formula on questions created before computed_expression
+    p_bicfes = sub.add_parser("backfill-icfes-expression", help="Set computed_expression on puntaje_global_saber11 questions that have none")
+    p_bicfes.add_argument("--version-id", type=int, help="Only questions of this QuestionnaireVersion ID")
+    p_bicfes.add_argument("--include-published", action="store_true", help="Also update published/archived versions (default: drafts only)")
+    p_bicfes.add_argument("--include-not-computed", action="store_true", help="Also update questions with is_computed=false (legacy rows; an admin may have turned it off)")
+    p_bicfes.add_argument("--dry-run", action="store_true", help="List the questions without saving")
+
+    # Maintenance: collapse duplicate assignments/responses so the unique indexes can be created
+    p_dedupe = sub.add_parser("dedupe-assignments", help="Remove duplicate assignments per (user_code, version) and extra responses per assignment")
+    p_dedupe.add_argument("--dry-run", action="store_true", help="Report what would be removed without deleting")
+
+    # Maintenance: fold the append-only answer log (DQ_RESPONSE_EVENTS) into dq_response_item
+    p_compact = sub.add_parser("compact-response-events", help="Fold pending dq_response_event rows into response items; optionally prune old folded events")
+    p_compact.add_argument("--batch-size", type=int, default=200, help="Responses compacted per pass (default 200)")
+    p_compact.add_argument("--prune-days", type=int, help="Also delete folded events older than this many days")
+
+    # Data quality: validate stored responses (or a CSV file) against the current rules
+    p_vresp = sub.add_parser("validate-responses", help="Batch-validate stored responses of a version (or a CSV of answers) and report errors")
+    grp = p_vresp.add_mutually_exclusive_group(required=True)
+    grp.add_argument("--version-id", type=int, help="Target QuestionnaireVersion ID")
+    grp.add_argument("--code", help="Questionnaire code (uses latest published version)")
+    p_vresp.add_argument("--csv", help="Validate this CSV file (header = question codes) instead of stored responses")
+    p_vresp.add_argument("--only-finalized", action="store_true", help="Only responses of finalized assignments")
+    p_vresp.add_argument("--batch-size", type=int, default=500, help="Responses validated per batch (default 500)")
+    p_vresp.add_argument("--show", type=int, default=10, help="Print the errors of up to N invalid rows (default 10)")
+
+    # Benchmark: compiled visibility graph vs. per-question rule walk (no database needed)
+    p_bvis = sub.add_parser("bench-visibility", help="Benchmark visible_if evaluation on a synthetic version")
+    p_bvis.add_argument("--questions", type=int, default=200, help="Questions in the synthetic version (default 200)")
+    p_bvis.add_argument("--runs", type=int, default=500, help="Evaluations per variant (default 500)")
+    p_bvis.add_argument("--seed", type=int, default=42, help="Random seed for rules and answers")
+
+    # Benchmark: computed_expression engine on the ICFES global score formula (no database needed)
+    p_bcomp = sub.add_parser("bench-computed", help="Benchmark computed_expression evaluation (ICFES global score)")
+    p_bcomp.add_argument("--runs", type=int, default=20000, help="Evaluations per variant (default 20000)")
+
+    # Benchmark: answer validation throughput on random versions/payloads (no database needed)
+    p_bval = sub.add_parser("bench-validation", help="Benchmark validate_answers throughput (answers/sec) on a random version")
+    p_bval.add_argument("--questions", type=int, default=60, help="Questions in the random version (default 60)")
+    p_bval.add_argument("--payloads", type=int, default=500, help="Random answer payloads (default 500)")
+    p_bval.add_argument("--seed", type=int, default=42, help="Random seed for the version and payloads")
+    p_bval.add_argument("--min-rate", type=float, default=0, help="Exit 1 when full validation is below this many answers/sec")
+
     return parser.parse_args()
 
 
@@ -367,6 +426,12 @@ def drop_legacy_finalizado() -> int:
         return 2
 
 
+def _parse_item_value(item, question_type: str | None = None):
+    """Parse a stored ResponseItem into the value shape used by the public API."""
+    from backend.services.response_store import decode_item
+    return decode_item(item, question_type)
+
+
 def recompute_ml(
     version_id: int | None,
     code: str | None,
@@ -391,17 +456,8 @@ def recompute_ml(
         QuestionnaireAssignment, Response, ResponseItem
     )
     from backend.services.ml_inference_service import try_infer_and_store
-
-    def _parse_value(item: ResponseItem):
-        if item.numeric_value is not None:
-            return item.numeric_value
-        if item.value is None:
-            return None
-        if item.value in ("true", "false"):
-            return item.value == "true"
-        if "," in item.value and item.value.count(",") >= 1:
-            return [v for v in item.value.split(",") if v]
-        return item.value
+    from backend.services.version_index import get_version_index
+    from backend.services.questionnaire_resolver import target_version
 
     with Session(engine) as s:
         # Resolve target version
@@ -413,19 +469,15 @@ def recompute_ml(
             if not q:
                 print(f"[recompute-ml] Questionnaire not found for code='{code}'", file=sys.stderr)
                 return 2
-            versions_sorted = sorted(q.versions, key=lambda v: v.version_number, reverse=True)
-            version = next((v for v in versions_sorted if v.status == "published"), versions_sorted[0] if versions_sorted else None)
+            version = target_version(s, q.id)
         if not version:
             print("[recompute-ml] Target version not found", file=sys.stderr)
             return 2
 
-        # Build code->question map once
-        qmap_by_code = {}
-        qid_to_code = {}
-        for sec in version.sections:
-            for qu in sec.questions:
-                qmap_by_code[qu.code] = qu
-                qid_to_code[qu.id] = qu.code
+        # Build code maps once (shared version index)
+        v_index = get_version_index(s, version)
+        qmap_by_code = v_index.by_code
+        qid_to_code = v_index.qid_to_code
 
         # Query assignments for this version
         q_assign = s.query(QuestionnaireAssignment).filter_by(questionnaire_version_id=version.id)
@@ -450,7 +502,7 @@ def recompute_ml(
                 code_key = qid_to_code.get(it.question_id)
                 if not code_key:
                     continue
-                answers[code_key] = _parse_value(it)
+                answers[code_key] = _parse_item_value(it, qmap_by_code[code_key].type)
             # Run ML
             ml_summary = try_infer_and_store(s, version, resp, answers, qmap_by_code)
             if isinstance(ml_summary, dict) and not dry_run:
@@ -465,6 +517,589 @@ def recompute_ml(
     return 0
 
 
+def backfill_progress(version_id: int | None, dry_run: bool) -> int:
+    """Recompute QuestionnaireAssignment.answered_count and progress_percent.
+
+    Save/finalize/submit keep these counters in sync incrementally; this command
+    populates rows created before the counters existed (or repairs drift).
+    Counts are computed with aggregate queries instead of loading items.
+    """
+    from sqlalchemy.orm import Session
+    from sqlalchemy import func, case, and_
+    from database.controller import engine
+    from database.dynamic_models import (
+        Section, Question, QuestionnaireAssignment, Response, ResponseItem
+    )
+
+    with Session(engine) as s:
+        # Total questions per version
+        totals_q = (
+            s.query(Section.questionnaire_version_id, func.count(Question.id))
+            .join(Question, Question.section_id == Section.id)
+            .group_by(Section.questionnaire_version_id)
+        )
+        if version_id:
+            totals_q = totals_q.filter(Section.questionnaire_version_id == int(version_id))
+        totals = {vid: int(n) for (vid, n) in totals_q.all()}
+
+        # Latest response per assignment (same rule as the read endpoints)
+        latest_resp = (
+            s.query(Response.assignment_id, func.max(Response.id).label("rid"))
+            .group_by(Response.assignment_id)
+            .subquery()
+        )
+        answered_expr = func.sum(case(
+            (ResponseItem.numeric_value.isnot(None), 1),
+            (ResponseItem.float_value.isnot(None), 1),
+            (and_(ResponseItem.value.isnot(None), func.ltrim(func.rtrim(ResponseItem.value)) != ""), 1),
+            else_=0,
+        ))
+        answered_q = (
+            s.query(latest_resp.c.assignment_id, answered_expr)
+            .join(ResponseItem, ResponseItem.response_id == latest_resp.c.rid)
+            .group_by(latest_resp.c.assignment_id)
+        )
+        answered = {aid: int(n or 0) for (aid, n) in answered_q.all()}
+
+        q_assign = s.query(QuestionnaireAssignment)
+        if version_id:
+            q_assign = q_assign.filter_by(questionnaire_version_id=int(version_id))
+        processed = 0
+        changed = 0
+        for a in q_assign.all():
+            processed += 1
+            total = totals.get(a.questionnaire_version_id, 0)
+            count = answered.get(a.id, 0)
+            if total > 0:
+                count = min(count, total)
+            percent = max(0, min(100, int(round((count / total) * 100)))) if total > 0 else 0
+            if a.answered_count != count or a.progress_percent != percent:
+                changed += 1
+                if not dry_run:
+                    a.answered_count = count
+                    a.progress_percent = percent
+        if not dry_run:
+            s.commit()
+        print(f"[backfill-progress] Done. processed={processed}, changed={changed}, dry_run={dry_run}")
+    return 0
+
+
+def backfill_icfes_expression(version_id: int | None, include_published: bool, include_not_computed: bool, dry_run: bool) -> int:
+    """Store ICFES_GLOBAL_EXPRESSION on global score questions without an expression.
+
+    The global score used to be computed by code inside validation for any
+    ``puntaje_global_saber11`` answer; questions created before that moved to
+    computed_expression need the formula stored once. Published versions and
+    questions with is_computed=false are only touched when asked for explicitly.
+    """
+    from sqlalchemy.orm import Session
+    from database.controller import engine
+    from database.dynamic_models import QuestionnaireVersion, Section, Question
+    from backend.services.computed_fields import ICFES_GLOBAL_EXPRESSION, expression_source
+    from backend.services.questionnaire_resolver import invalidate_resolution
+    from backend.services.version_index import invalidate_version
+
+    with Session(engine) as s:
+        query = (
+            s.query(Question, QuestionnaireVersion.id, QuestionnaireVersion.status)
+            .join(Section, Section.id == Question.section_id)
+            .join(QuestionnaireVersion, QuestionnaireVersion.id == Section.questionnaire_version_id)
+            .filter(Question.code == "puntaje_global_saber11")
+        )
+        if version_id:
+            query = query.filter(QuestionnaireVersion.id == int(version_id))
+        if not include_published:
+            query = query.filter(QuestionnaireVersion.status == "draft")
+        updated, skipped, versions = 0, 0, set()
+        for qu, v_id, status in query.order_by(Question.id).all():
+            if expression_source(qu.computed_expression) is not None:
+                continue
+            if not qu.is_computed and not include_not_computed:
+                skipped += 1
+                continue
+            print(f"  version {v_id} ({status}) question {qu.id}")
+            qu.is_computed = True
+            qu.computed_expression = {"expr": ICFES_GLOBAL_EXPRESSION}
+            updated += 1
+            versions.add(v_id)
+        if dry_run:
+            s.rollback()
+        elif updated:
+            s.commit()
+            invalidate_resolution()
+            for v_id in versions:
+                invalidate_version(v_id)
+    print(f"[backfill-icfes-expression] {'would update' if dry_run else 'updated'} {updated} question(s) in {len(versions)} version(s)")
+    if skipped:
+        print(f"[backfill-icfes-expression] {skipped} question(s) with is_computed=false left alone (--include-not-computed to update them)")
+    return 0
+
+
+def backfill_prefill(user_code: str | None, dry_run: bool) -> int:
+    """Rebuild the prefill index from the latest response of each assignment.
+
+    Assignments are replayed from oldest to newest activity so the most recent
+    value of each question code wins, matching the previous scan semantics.
+    """
+    from sqlalchemy.orm import Session
+    from sqlalchemy import func
+    from database.controller import engine
+    from database.dynamic_models import QuestionnaireAssignment, Response, ResponseItem
+    from backend.services.prefill_index import record_values
+    from backend.services.version_index import get_version_index
+
+    with Session(engine) as s:
+        q_assign = s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.user_code.isnot(None))
+        if user_code:
+            q_assign = q_assign.filter(QuestionnaireAssignment.user_code == user_code)
+        assigns = q_assign.order_by(QuestionnaireAssignment.last_activity_at, QuestionnaireAssignment.id).all()
+        latest = dict(
+            s.query(Response.assignment_id, func.max(Response.id))
+            .filter(Response.assignment_id.in_([a.id for a in assigns] or [-1]))
+            .group_by(Response.assignment_id)
+            .all()
+        ) if assigns else {}
+        processed = 0
+        written = 0
+        for a in assigns:
+            rid = latest.get(a.id)
+            if not rid:
+                continue
+            processed += 1
+            vid = a.questionnaire_version_id
+            v_index = get_version_index(s, vid)
+            qid_to_code = v_index.qid_to_code if v_index else {}
+            values = {}
+            for it in s.query(ResponseItem).filter_by(response_id=rid).all():
+                code_key = qid_to_code.get(it.question_id)
+                if code_key:
+                    values[code_key] = _parse_item_value(it, v_index.by_code[code_key].type)
+            written += record_values(s, a.user_code, values, vid)
+            # flush so later assignments of the same user see (and overwrite) these rows
+            s.flush()
+        if dry_run:
+            s.rollback()
+        else:
+            s.commit()
+        print(f"[backfill-prefill] Done. responses={processed}, rows_written={written}, dry_run={dry_run}")
+    return 0
+
+
+def backfill_typed_values(version_id: int | None, batch_size: int, dry_run: bool) -> int:
+    """Populate float_value (number/scale answers) and values_json (multi_choice).
+
+    Only items whose typed columns are still NULL are touched; the encoding is the
+    same one used on save (response_store.encode_value), applied to the value
+    decoded from the legacy text/integer columns. Runs in keyset-paged batches.
+    """
+    from sqlalchemy.orm import Session
+    from sqlalchemy import select, update
+    from database.controller import engine
+    from database.dynamic_models import Section, Question, ResponseItem
+    from backend.services.response_store import decode_item, encode_value
+
+    batch_size = max(1, int(batch_size or 1000))
+    with Session(engine) as s:
+        q_types = s.query(Question.id, Question.type).join(Section, Section.id == Question.section_id)
+        if version_id:
+            q_types = q_types.filter(Section.questionnaire_version_id == int(version_id))
+        types = {qid: qtype for qid, qtype in q_types.filter(Question.type.in_(["number", "scale_1_5", "multi_choice"])).all()}
+        if not types:
+            print("[backfill-typed-values] No number/scale/multi_choice questions found.")
+            return 0
+        scanned = 0
+        changed = 0
+        last_id = 0
+        while True:
+            rows = s.execute(
+                select(ResponseItem.id, ResponseItem.question_id, ResponseItem.value, ResponseItem.numeric_value,
+                       ResponseItem.float_value, ResponseItem.values_json)
+                .where(
+                    ResponseItem.id > last_id,
+                    ResponseItem.question_id.in_(list(types.keys())),
+                    ResponseItem.float_value.is_(None),
+                    ResponseItem.values_json.is_(None),
+                )
+                .order_by(ResponseItem.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            updates = []
+            for row in rows:
+                scanned += 1
+                qtype = types[row.question_id]
+                value = decode_item(row, qtype)
+                if value is None or (qtype != "multi_choice" and isinstance(value, str)):
+                    continue  # blank or unparsable legacy text: leave as is
+                enc = encode_value(qtype, value)
+                if enc.float_value is None and enc.values_json is None:
+                    continue
+                updates.append({"id": row.id, "float_value": enc.float_value, "values_json": enc.values_json})
+            changed += len(updates)
+            if updates and not dry_run:
+                s.execute(update(ResponseItem), updates)
+                s.commit()
+        print(f"[backfill-typed-values] Done. scanned={scanned}, changed={changed}, dry_run={dry_run}")
+    return 0
+
+
+def compact_response_events(batch_size: int, prune_days: int | None) -> int:
+    """Compact every response with pending answer events, then prune if requested.
+
+    Same code path as the background compactor of the API workers; safe to run
+    while they are up (the watermark UPDATE is guarded).
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy.orm import Session
+    from database.controller import engine
+    from backend.services.response_events import compact_pending, prune_events
+
+    batch_size = max(1, int(batch_size or 200))
+    total = 0
+    while True:
+        compacted = compact_pending(lambda: Session(engine), batch_size)
+        total += compacted
+        if compacted < batch_size:
+            break
+    pruned = 0
+    if prune_days is not None:
+        with Session(engine) as s:
+            pruned = prune_events(s, datetime.utcnow() - timedelta(days=max(0, int(prune_days))))
+            s.commit()
+    print(f"[compact-response-events] Done. responses={total}, pruned_events={pruned}")
+    return 0
+
+
+def bench_visibility(questions: int, runs: int, seed: int) -> int:
+    """Time visible_if evaluation for one payload on a synthetic version.
+
+    Half of the questions get an ``equals`` rule on an earlier question (a
+    quarter of them combined in an ``or``). Compares the previous evaluator
+    (recursive walk per question, no cascade) with the compiled VisibilityGraph,
+    both for a full pass and for the incremental scope of a one-answer change.
+    """
+    import random
+    from time import perf_counter
+    from backend.services.visibility import build_graph
+
+    def walk(rule, answers):  # evaluator used before the graph existed
+        if not rule:
+            return True
+        if isinstance(rule, dict):
+            if "and" in rule:
+                return all(walk(r, answers) for r in rule["and"])
+            if "or" in rule:
+                return any(walk(r, answers) for r in rule["or"])
+            code = rule.get("code")
+            if code:
+                return answers.get(code) == rule.get("equals")
+        return True
+
+    rng = random.Random(seed)
+    questions = max(2, int(questions))
+    runs = max(1, int(runs))
+    codes = [f"q{i}" for i in range(questions)]
+    rules = {}
+    for i, code in enumerate(codes):
+        if i == 0 or rng.random() < 0.5:
+            rules[code] = None
+            continue
+        leaf = {"code": codes[rng.randrange(i)], "equals": str(rng.randrange(3))}
+        if rng.random() < 0.25:
+            leaf = {"or": [leaf, {"code": codes[rng.randrange(i)], "equals": str(rng.randrange(3))}]}
+        rules[code] = leaf
+    answers = {code: str(rng.randrange(3)) for code in codes}
+    changed = codes[0]
+
+    def timed(fn):
+        start = perf_counter()
+        for _ in range(runs):
+            fn()
+        return (perf_counter() - start) / runs * 1e6
+
+    start = perf_counter()
+    graph = build_graph(rules)
+    compile_us = (perf_counter() - start) * 1e6
+    scope = {changed} | graph.descendants.get(changed, frozenset())
+    legacy = timed(lambda: {code: walk(rule, answers) for code, rule in rules.items() if rule})
+    full = timed(lambda: graph.evaluate(answers))
+    partial = timed(lambda: graph.evaluate(answers, scope))
+    print(f"[bench-visibility] questions={questions}, rules={len(graph.order)}, runs={runs}, compile={compile_us:.0f}us")
+    print(f"  legacy walk (no cascade): {legacy:8.1f} us/eval")
+    print(f"  graph full pass:          {full:8.1f} us/eval")
+    print(f"  graph incremental ({len(scope)} codes affected by {changed}): {partial:8.1f} us/eval")
+    return 0
+
+
+def validate_responses(
+    version_id: int | None,
+    code: str | None,
+    csv_path: str | None,
+    only_finalized: bool,
+    batch_size: int,
+    show: int,
+) -> int:
+    """Validate many answer sets with the batch validator and summarize the errors.
+
+    Without ``csv_path`` the stored responses of the version are read in keyset
+    pages (dq_response_item snapshot; run compact-response-events first when the
+    event log is on). With ``csv_path`` each CSV row is one answer set: empty
+    cells are unanswered, multi_choice cells are comma-separated and every other
+    cell is validated as the submitted text. Nothing is written. Exit code 1 when
+    any row is invalid.
+    """
+    import csv
+    from collections import Counter
+    from types import SimpleNamespace
+    from sqlalchemy.orm import Session
+    from sqlalchemy import select
+    from database.controller import engine
+    from database.dynamic_models import Questionnaire, QuestionnaireVersion, QuestionnaireAssignment, Response, ResponseItem
+    from backend.services.batch_validation import validate_batch
+    from backend.services.response_store import decode_item
+    from backend.services.version_index import get_version_index
+    from backend.services.questionnaire_resolver import target_version
+
+    batch_size = max(1, int(batch_size or 500))
+    by_error: Counter = Counter()
+    scanned = 0
+    invalid = 0
+    shown = 0
+
+    def report(labels, rows):
+        nonlocal scanned, invalid, shown
+        result = validate_batch(v_index, rows)
+        scanned += len(rows)
+        for label, errs in zip(labels, result.errors):
+            if not errs:
+                continue
+            invalid += 1
+            for q_code, err in errs.items():
+                by_error[(q_code, err if isinstance(err, str) else next(iter(err), "invalid"))] += 1
+            if shown < show:
+                shown += 1
+                print(f"  {label}: {errs}")
+
+    with Session(engine) as s:
+        version = None
+        if version_id:
+            version = s.get(QuestionnaireVersion, int(version_id))
+        elif code:
+            q = s.query(Questionnaire).filter_by(code=code).first()
+            version = target_version(s, q.id) if q else None
+        if not version:
+            print("[validate-responses] Target version not found", file=sys.stderr)
+            return 2
+        v_index = get_version_index(s, version)
+        print(f"[validate-responses] Version id={v_index.version_id} (#{v_index.version_number}), questions={len(v_index.by_code)}")
+        if csv_path:
+            types = {q_code: qu.type for q_code, qu in v_index.by_code.items()}
+            with open(csv_path, newline="", encoding="utf-8-sig") as fh:
+                reader = csv.DictReader(fh)
+                labels, rows = [], []
+                for line_no, raw in enumerate(reader, start=2):
+                    row = {}
+                    for q_code, cell in raw.items():
+                        if q_code is None or cell is None or cell.strip() == "":
+                            continue
+                        cell = cell.strip()
+                        if types.get(q_code) == "multi_choice":
+                            cell = decode_item(SimpleNamespace(value=cell, numeric_value=None, float_value=None), "multi_choice")
+                        row[q_code] = cell
+                    labels.append(f"line {line_no}")
+                    rows.append(row)
+                    if len(rows) >= batch_size:
+                        report(labels, rows)
+                        labels, rows = [], []
+                if rows:
+                    report(labels, rows)
+        else:
+            last_id = 0
+            while True:
+                page = select(Response.id, QuestionnaireAssignment.user_code).join(
+                    QuestionnaireAssignment, QuestionnaireAssignment.id == Response.assignment_id
+                ).where(QuestionnaireAssignment.questionnaire_version_id == v_index.version_id, Response.id > last_id)
+                if only_finalized:
+                    page = page.where(QuestionnaireAssignment.status == "finalized")
+                responses = s.execute(page.order_by(Response.id).limit(batch_size)).all()
+                if not responses:
+                    break
+                last_id = responses[-1].id
+                answers = {r.id: {} for r in responses}
+                items = s.execute(
+                    select(ResponseItem.response_id, ResponseItem.question_id, ResponseItem.value, ResponseItem.numeric_value,
+                           ResponseItem.float_value, ResponseItem.values_json)
+                    .where(ResponseItem.response_id.in_(list(answers.keys())))
+                )
+                for it in items:
+                    q_code = v_index.qid_to_code.get(it.question_id)
+                    if q_code:
+                        answers[it.response_id][q_code] = decode_item(it, v_index.by_code[q_code].type)
+                report([f"response {r.id} ({r.user_code})" for r in responses], [answers[r.id] for r in responses])
+    print(f"[validate-responses] Done. rows={scanned}, invalid={invalid}")
+    for (q_code, err), count in by_error.most_common():
+        print(f"  {q_code:<32} {err:<20} {count}")
+    return 1 if invalid else 0
+
+
+def bench_computed(runs: int) -> int:
+    """Time the ICFES global score: inline formula vs. compiled expression vs. parsing per call.
+
+    The inline variant is the code validation used before the formula moved to
+    computed_expression; "parse per call" shows what compiling once saves.
+    """
+    from time import perf_counter
+    from backend.services.computed_fields import ICFES_GLOBAL_EXPRESSION, compile_expression
+
+    runs = max(1, int(runs))
+    answers = {
+        "puntaje_lectura_critica": 61, "puntaje_matematicas": 72, "puntaje_sociales_ciudadanas": 55,
+        "puntaje_ciencias_naturales": 68, "puntaje_ingles": 80,
+    }
+    components = tuple(answers)
+
+    def inline():
+        comps = []
+        for cc in components:
+            v = answers.get(cc)
+            try:
+                v = int(v) if v is not None and v != "" else None
+            except Exception:
+                v = None
+            comps.append(v)
+        if all(v is not None for v in comps):
+            lc, m, sc, cn, i = comps
+            return max(0, min(500, int(round((3 * (lc + m + sc + cn) + i) / 13 * 5))))
+        return None
+
+    def timed(fn):
+        start = perf_counter()
+        for _ in range(runs):
+            fn()
+        return (perf_counter() - start) / runs * 1e6
+
+    start = perf_counter()
+    expr = compile_expression(ICFES_GLOBAL_EXPRESSION)
+    compile_us = (perf_counter() - start) * 1e6
+    assert expr.evaluate(answers) == inline()
+    inline_us = timed(inline)
+    compiled_us = timed(lambda: expr.evaluate(answers))
+    parse_us = timed(lambda: compile_expression(ICFES_GLOBAL_EXPRESSION).evaluate(answers))
+    print(f"[bench-computed] runs={runs}, result={expr.evaluate(answers)}, compile={compile_us:.0f}us")
+    print(f"  inline formula (previous):  {inline_us:8.2f} us/eval")
+    print(f"  compiled expression:        {compiled_us:8.2f} us/eval")
+    print(f"  parse + compile per call:   {parse_us:8.2f} us/eval")
+    return 0
+
+
+def bench_validation(questions: int, payloads: int, seed: int, min_rate: float) -> int:
+    """Answers/sec of full validation, one-answer autosaves and the batch validator.
+
+    The version and payloads come from ``synthetic_versions`` (every question
+    type, visible_if trees, computed questions, junk values); best of three
+    passes. ``--min-rate`` turns it into a regression gate for CI.
+    """
+    import random
+    from time import perf_counter
+    from backend.services.batch_validation import validate_batch
+    from backend.services.dynamic_validation import get_validator
+    from backend.services.synthetic_versions import random_answers, random_version
+
+    rng = random.Random(seed)
+    index = random_version(rng, questions=max(1, int(questions)), version_id=seed)
+    rows = [random_answers(rng, index) for _ in range(max(1, int(payloads)))]
+    answers = sum(len(r) for r in rows)
+    start = perf_counter()
+    validator = get_validator(index)
+    compile_ms = (perf_counter() - start) * 1000
+    changes = [rng.choice(list(r)) if r else None for r in rows]
+
+    def best(fn):
+        times = []
+        for _ in range(3):
+            start = perf_counter()
+            fn()
+            times.append(perf_counter() - start)
+        return min(times)
+
+    full = answers / best(lambda: [validator.validate(r) for r in rows])
+    partial = len(rows) / best(lambda: [validator.validate_partial(r, [c]) for r, c in zip(rows, changes) if c])
+    batch = answers / best(lambda: validate_batch(index, rows))
+    print(f"[bench-validation] questions={len(index.codes)}, payloads={len(rows)}, answers={answers}, compile={compile_ms:.1f}ms")
+    print(f"  validate (full):           {full:12,.0f} answers/s")
+    print(f"  validate_partial (1 code): {partial:12,.0f} saves/s")
+    print(f"  validate_batch:            {batch:12,.0f} answers/s")
+    if min_rate and full < min_rate:
+        print(f"[bench-validation] below --min-rate {min_rate:,.0f} answers/s", file=sys.stderr)
+        return 1
+    return 0
+
+
+def dedupe_assignments(dry_run: bool) -> int:
+    """Keep one assignment per (user_code, version) and one response per assignment.
+
+    The kept assignment is the finalized one if any, else the most recently active
+    (highest id on ties). Each kept assignment keeps its latest response. Removed
+    rows are deleted items -> responses -> assignments, then the unique indexes
+    are created by ensure_dynamic_schema.
+    """
+    from sqlalchemy.orm import Session
+    from sqlalchemy import func
+    from database.controller import engine
+    from database.dynamic_models import QuestionnaireAssignment, Response, ResponseItem, ensure_dynamic_schema
+
+    with Session(engine) as s:
+        dup_keys = (
+            s.query(QuestionnaireAssignment.user_code, QuestionnaireAssignment.questionnaire_version_id)
+            .filter(QuestionnaireAssignment.user_code.isnot(None))
+            .group_by(QuestionnaireAssignment.user_code, QuestionnaireAssignment.questionnaire_version_id)
+            .having(func.count(QuestionnaireAssignment.id) > 1)
+            .all()
+        )
+        drop_assignments = []
+        for user_code, version_id in dup_keys:
+            rows = s.query(QuestionnaireAssignment).filter_by(user_code=user_code, questionnaire_version_id=version_id).all()
+            rows.sort(key=lambda a: (a.status == "finalized", a.last_activity_at is not None, a.last_activity_at or 0, a.id), reverse=True)
+            drop_assignments.extend(a.id for a in rows[1:])
+        drop_set = set(drop_assignments)
+        # Extra responses of the assignments that stay
+        drop_responses = []
+        dup_resp = (
+            s.query(Response.assignment_id)
+            .group_by(Response.assignment_id)
+            .having(func.count(Response.id) > 1)
+            .all()
+        )
+        for (assignment_id,) in dup_resp:
+            if assignment_id in drop_set:
+                continue
+            ids = sorted(i for (i,) in s.query(Response.id).filter(Response.assignment_id == assignment_id).all())
+            drop_responses.extend(ids[:-1])
+        trimmed = len(drop_responses)
+        if drop_assignments:
+            drop_responses.extend(i for (i,) in s.query(Response.id).filter(Response.assignment_id.in_(drop_assignments)).all())
+        items = 0
+        if drop_responses:
+            items = s.query(ResponseItem).filter(ResponseItem.response_id.in_(drop_responses)).count()
+        print(f"[dedupe-assignments] duplicate_keys={len(dup_keys)}, assignments={len(drop_assignments)}, responses={len(drop_responses)}, items={items}, dry_run={dry_run}")
+        if dry_run:
+            return 0
+        for start in range(0, len(drop_responses), 500):
+            chunk = drop_responses[start:start + 500]
+            s.query(ResponseItem).filter(ResponseItem.response_id.in_(chunk)).delete(synchronize_session=False)
+            s.query(Response).filter(Response.id.in_(chunk)).delete(synchronize_session=False)
+        for start in range(0, len(drop_assignments), 500):
+            chunk = drop_assignments[start:start + 500]
+            s.query(QuestionnaireAssignment).filter(QuestionnaireAssignment.id.in_(chunk)).delete(synchronize_session=False)
+        s.commit()
+    ensure_dynamic_schema(engine)
+    if trimmed:
+        print("[dedupe-assignments] Responses were removed; run `python manage.py backfill-progress` to refresh progress counters.")
+    return 0
+
+
 def main() -> int:
     """Main entrypoint for the management CLI."""
     args = parse_args()
@@ -488,6 +1123,26 @@ def main() -> int:
         print("ensure_user_schema executed.")
     elif args.command == "recompute-ml":
         return recompute_ml(getattr(args, "version_id", None), getattr(args, "code", None), bool(getattr(args, "only_finalized", False)), getattr(args, "limit", None), bool(getattr(args, "dry_run", False)))
+    elif args.command == "backfill-progress":
+        return backfill_progress(getattr(args, "version_id", None), bool(getattr(args, "dry_run", False)))
+    elif args.command == "backfill-prefill":
+        return backfill_prefill(getattr(args, "user_code", None), bool(getattr(args, "dry_run", False)))
+    elif args.command == "backfill-typed-values":
+        return backfill_typed_values(getattr(args, "version_id", None), getattr(args, "batch_size", 1000), bool(getattr(args, "dry_run", False)))
+    elif args.command == "backfill-icfes-expression":
+        return backfill_icfes_expression(getattr(args, "version_id", None), bool(getattr(args, "include_published", False)), bool(getattr(args, "include_not_computed", False)), bool(getattr(args, "dry_run", False)))
+    elif args.command == "dedupe-assignments":
+        return dedupe_assignments(bool(getattr(args, "dry_run", False)))
+    elif args.command == "bench-visibility":
+        return bench_visibility(getattr(args, "questions", 200), getattr(args, "runs", 500), getattr(args, "seed", 42))
+    elif args.command == "validate-responses":
+        return validate_responses(getattr(args, "version_id", None), getattr(args, "code", None), getattr(args, "csv", None), bool(getattr(args, "only_finalized", False)), getattr(args, "batch_size", 500), getattr(args, "show", 10))
+    elif args.command == "bench-computed":
+        return bench_computed(getattr(args, "runs", 20000))
+    elif args.command == "bench-validation":
+        return bench_validation(getattr(args, "questions", 60), getattr(args, "payloads", 500), getattr(args, "seed", 42), getattr(args, "min_rate", 0))
+    elif args.command == "compact-response-events":
+        return compact_response_events(getattr(args, "batch_size", 200), getattr(args, "prune_days", None))
     else:
         print("Unknown command")
         return 1
@@ -0,0 +1,46 @@
+from types import MappingProxyType
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base
+from backend.services import ux_survey
+from backend.services.questionnaire_resolver import invalidate_resolution
+from backend.services.version_index import OptionMeta, QuestionMeta, VersionIndex, invalidate_version
+
+
+@pytest.fixture()
+def engine():
+    """Empty in-memory SQLite database with the full schema; process caches reset."""
+    eng = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(eng)
+    invalidate_version()
+    invalidate_resolution()
+    ux_survey.invalidate_survey()
+    ux_survey.forget()
+    yield eng
+    invalidate_version()
+    invalidate_resolution()
+    ux_survey.invalidate_survey()
+    ux_survey.forget()
+    eng.dispose()
+
+
+def make_question(qid, code, qtype="number", rules=None, options=(), required=False, visible_if=None, expression=None):
+    """In-memory QuestionMeta; options named "otro" are flagged is_other, ``expression`` makes it computed."""
+    opts = tuple(OptionMeta(id=qid * 10 + i, value=v, label=v, order=i, is_other_flag=(v == "otro")) for i, v in enumerate(options))
+    return QuestionMeta(
+        id=qid, code=code, text=code.title(), type=qtype, required=required, order=qid, section_id=1, section_order=1,
+        validation_rules=rules, visible_if=visible_if, is_computed=expression is not None, computed_expression=expression,
+        options=opts, option_values=frozenset(options), other_values=frozenset(v for v in options if v == "otro"),
+    )
+
+
+def make_index(*questions, version_id=7, version_number=1, dependents=None):
+    """Published VersionIndex over ``questions`` (display order as given), no database."""
+    return VersionIndex(
+        version_id=version_id, questionnaire_id=1, version_number=version_number, status="published", sections=(),
+        codes=tuple(q.code for q in questions), by_code=MappingProxyType({q.code: q for q in questions}),
+        dependents=MappingProxyType({k: frozenset(v) for k, v in (dependents or {}).items()}),
+    )
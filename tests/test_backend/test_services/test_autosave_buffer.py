@@ -0,0 +1,59 @@
+from backend.services.autosave_buffer import AutosaveBuffer
+
+
+def _buffer(window=5, max_entries=10):
+    written = []
+    return AutosaveBuffer(written.append, window, max_entries), written
+
+
+def test_saves_for_same_key_are_coalesced():
+    buf, written = _buffer()
+    assert buf.add("u1", 7, 1, 10, 3, {"a": 1, "b": "x"}) == 4
+    assert buf.add("u1", 7, 1, 10, 3, {"a": 2}) == 5
+    assert len(buf) == 1 and written == []
+    assert buf.flush_key("u1", 7) is True
+    assert len(written) == 1
+    entry = written[0]
+    assert entry.values == {"a": 2, "b": "x"}
+    assert (entry.base_revision, entry.pending_revision, entry.saves) == (3, 5, 2)
+    assert buf.flush_key("u1", 7) is False
+
+
+def test_flush_due_only_writes_idle_entries():
+    buf, written = _buffer(window=5)
+    buf.add("u1", 7, 1, 10, 0, {"a": 1})
+    buf.add("u2", 7, 2, 11, 0, {"a": 1})
+    buf.peek("u1", 7).last_at -= 10
+    assert buf.flush_due() == 1
+    assert [e.user_code for e in written] == ["u1"]
+    assert buf.peek("u2", 7) is not None
+    buf.close()
+    assert [e.user_code for e in written] == ["u1", "u2"]
+
+
+def test_buffer_is_bounded():
+    buf, written = _buffer(max_entries=2)
+    buf.add("u1", 7, 1, 10, 0, {"a": 1})
+    buf.add("u2", 7, 2, 11, 0, {"a": 1})
+    buf.peek("u1", 7).last_at -= 1
+    buf.add("u3", 7, 3, 12, 0, {"a": 1})
+    assert len(buf) == 2
+    assert [e.user_code for e in written] == ["u1"]
+    buf.close()
+
+
+def test_writer_errors_do_not_propagate():
+    def boom(entry):
+        raise RuntimeError("db down")
+    buf = AutosaveBuffer(boom, 5)
+    buf.add("u1", 7, 1, 10, 0, {"a": 1})
+    assert buf.flush_key("u1", 7) is True
+    assert len(buf) == 0
+    buf.close()
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("DQ_AUTOSAVE_BUFFER_SECONDS", raising=False)
+    assert AutosaveBuffer.from_env(lambda e: None).enabled is False
+    monkeypatch.setenv("DQ_AUTOSAVE_BUFFER_SECONDS", "2")
+    assert AutosaveBuffer.from_env(lambda e: None).enabled is True
@@ -0,0 +1,38 @@
+from backend.services.batch_validation import MISSING, validate_batch
+from backend.services.dynamic_validation import validate_answers
+from .conftest import make_index, make_question
+
+
+QUESTIONS = (
+    make_question(1, "edad", "number", {"min": 10, "max": 99}, required=True),
+    make_question(2, "nota", "number", {"allow_decimal": True, "min": 0, "max": 5, "step": "0.5"}),
+    make_question(3, "gusto", "scale_1_5"),
+    make_question(4, "colegio", "single_choice", options=("pub", "priv", "otro"), required=True),
+    make_question(5, "detalle", "text", {"minLength": 2}, required=True, visible_if={"code": "colegio", "equals": "pub"}),
+    make_question(6, "puntaje_ingles", "number"),
+)
+INDEX = make_index(*QUESTIONS, version_id=44)
+ROWS = [
+    {"edad": 15, "nota": 4.5, "gusto": 3, "colegio": "pub", "detalle": "ok"},
+    {"edad": "9", "nota": "4.2", "gusto": "7", "colegio": "otro"},
+    {"edad": 12.7, "nota": float("inf"), "gusto": None, "colegio": "priv", "detalle": "x"},
+    {"edad": "x", "nota": "", "gusto": True, "colegio": "pub", "puntaje_ingles": 120},
+    {"edad": 2 ** 70, "colegio": "zz"},
+    {"edad": 20, "nota": 10 ** 400, "colegio": "priv"},
+    {},
+]
+
+
+def test_batch_matches_row_by_row_validation():
+    result = validate_batch(INDEX, ROWS)
+    for row, errors, normalized in zip(ROWS, result.errors, result.normalized):
+        _, expected_errors, expected_normalized = validate_answers(INDEX, row)
+        assert errors == expected_errors
+        assert normalized == expected_normalized
+    assert result.errors[0] == {} and result.invalid_rows == len(ROWS) - 1
+    assert result.errors[1] == {"edad": "below_min", "nota": "invalid_step", "gusto": "out_of_range", "otro_colegio": "required"}
+
+
+def test_columns_input():
+    columns = {code: [row.get(code, MISSING) for row in ROWS] for code in INDEX.codes}
+    assert validate_batch(INDEX, columns) == validate_batch(INDEX, ROWS)
@@ -0,0 +1,91 @@
+import pytest
+
+from backend.services.computed_fields import ICFES_GLOBAL_EXPRESSION, ExpressionError, compile_computed, compile_expression
+from backend.services.dynamic_validation import compile_validator
+from .conftest import make_index, make_question
+
+
+SCORES = {
+    "puntaje_lectura_critica": 61, "puntaje_matematicas": 72, "puntaje_sociales_ciudadanas": 55,
+    "puntaje_ciencias_naturales": 68, "puntaje_ingles": 80,
+}
+
+
+def test_expressions_evaluate_with_missing_inputs_as_none():
+    expr = compile_expression("a * 2 + max(b, 1) if a > 0 else coalesce(c, -1)")
+    assert expr.inputs == frozenset({"a", "b", "c"})
+    assert expr.evaluate({"a": 3, "b": 5}) == 11
+    assert expr.evaluate({"a": 0}) == -1
+    assert expr.evaluate({"a": 3}) is None  # b unanswered
+    assert compile_expression("a / b").evaluate({"a": 1, "b": 0}) is None
+    lc, m, sc, cn, i = SCORES.values()
+    assert compile_expression(ICFES_GLOBAL_EXPRESSION).evaluate(SCORES) == max(0, min(500, round((3 * (lc + m + sc + cn) + i) / 13 * 5)))
+
+
+@pytest.mark.parametrize("source", [
+    "a.__class__", "__import__('os')", "open('x')", "[a][0]", "(lambda: 1)()", "a ** 2", "round(a, digits=1)", "", "a +",
+])
+def test_unsupported_syntax_is_rejected(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+
+@pytest.mark.parametrize("source", [
+    '"ab" * 99999999 * 20', "a * 'x'", "-'x'", "round('1')", "True + 2", "(a if a else 'x') * 3", "coalesce(a, 'x') + 1",
+])
+def test_non_numeric_arithmetic_is_rejected(source):
+    with pytest.raises(ExpressionError, match="non_numeric_operand"):
+        compile_expression(source)
+
+
+def test_text_constants_in_conditions_are_accepted():
+    expr = compile_expression("1 if a == 'x' or not 'y' else a * 2")
+    assert expr.evaluate({"a": 3}) == 6
+
+
+def test_validator_computes_in_dependency_order():
+    index = make_index(
+        make_question(1, "a"),
+        make_question(2, "total", expression={"expr": "doble + 1"}),
+        make_question(3, "doble", expression="a * 2"),
+        make_question(4, "tope", rules={"max": 5}, expression="a"),
+        dependents={"a": {"doble", "tope"}, "doble": {"total"}},  # as build_version_index derives them
+    )
+    assert [cf.code for cf in compile_computed(index.by_code)] == ["doble", "tope", "total"]
+    validator = compile_validator(index)
+    ok, errors, normalized = validator.validate({"a": 4, "total": 99})
+    assert normalized == {"a": 4, "total": 9, "doble": 8, "tope": 4}
+    _, errors, _ = validator.validate({"a": 7})
+    assert errors == {"tope": "above_max"}
+    # partial saves recompute what depends on the change
+    ok, errors, normalized = validator.validate_partial({"a": 2}, ["a"])
+    assert normalized == {"a": 2, "doble": 4, "total": 5, "tope": 2}
+
+
+@pytest.mark.parametrize("operand", ["5", [1], True, "abc"])
+def test_only_numbers_are_operands(operand):
+    assert compile_expression("a + 3").evaluate({"a": operand}) is None
+    assert compile_expression("coalesce(a, 0) + 1").evaluate({"a": operand}) == 1
+
+
+def test_validator_feeds_expressions_normalized_values():
+    index = make_index(
+        make_question(1, "a"),
+        make_question(2, "b"),
+        make_question(3, "nombre", qtype="text"),
+        make_question(4, "acepta", qtype="boolean"),
+        make_question(5, "suma", expression="a + b"),
+        make_question(6, "texto", expression="coalesce(nombre, a)"),
+        make_question(7, "bono", expression="coalesce(acepta, 0) + 2"),
+        dependents={"a": {"suma", "texto"}, "b": {"suma"}, "nombre": {"texto"}, "acepta": {"bono"}},
+    )
+    validator = compile_validator(index)
+    # numeric strings are validated first: the sum is arithmetic, never concatenation
+    _, _, normalized = validator.validate({"a": "5", "b": "3", "nombre": "ana", "acepta": True})
+    assert (normalized["suma"], normalized["texto"], normalized["bono"]) == (8, 5, 2)
+    # an invalid input (a list) does not reach the expression
+    _, errors, normalized = validator.validate({"a": [1], "b": [2]})
+    assert "a" in errors and "suma" not in normalized
+    # partial saves validate inputs outside the changed scope on demand
+    _, _, normalized = validator.validate_partial({"a": "4", "b": "6"}, ["b"])
+    assert normalized["suma"] == 10
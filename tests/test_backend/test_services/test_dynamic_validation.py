@@ -0,0 +1,90 @@
+from backend.services.dynamic_validation import compile_validator, get_validator, validate_answers
+from .conftest import make_index, make_question
+
+
+INDEX = make_index(
+    make_question(1, "nombre", "text", {"minLength": "2", "regex": "[a-z]+"}, required=True),
+    make_question(2, "nota", "number", {"allow_decimal": True, "min": 0, "max": 5, "step": "0.5"}),
+    make_question(3, "colegio", "single_choice", options=("pub", "otro")),
+    make_question(4, "detalle", "text", {"regex": "("}, visible_if={"code": "colegio", "equals": "pub"}),
+)
+
+
+def test_rules_are_parsed_once():
+    validator = compile_validator(INDEX)
+    assert validator.fields["nombre"].min_len == 2
+    assert validator.fields["nombre"].pattern.pattern == "[a-z]+"
+    assert validator.fields["detalle"].pattern is None  # invalid regex is ignored
+    assert validator.fields["nota"].step == 0.5
+    assert validator.fields["colegio"].options == frozenset({"pub", "otro"})
+    assert [f.code for f in validator.other_fields] == ["colegio"]
+    assert get_validator(INDEX) is get_validator(INDEX)
+
+
+def test_validation_results():
+    ok, errors, normalized = validate_answers(INDEX, {"nombre": "ana", "nota": "4.5", "colegio": "pub", "detalle": "x"})
+    assert ok and normalized == {"nombre": "ana", "nota": 4.5, "colegio": "pub", "detalle": "x"}
+    ok, errors, _ = validate_answers(INDEX, {"nombre": "A", "nota": 4.2, "colegio": "otro", "detalle": "x"})
+    assert errors == {"nombre": "too_short", "nota": "invalid_step", "otro_colegio": "required"}
+    # scope restricted to one code (delta saves): required elsewhere is not reported
+    ok, errors, normalized = validate_answers(INDEX, {"nota": 3}, only={"nota"})
+    assert ok and normalized == {"nota": 3.0}
+
+
+def test_partial_validation_follows_the_change():
+    validator = compile_validator(INDEX)
+    answers = {"nombre": "A", "nota": 4.2, "colegio": "otro", "detalle": "x"}
+    # only 'nota' changed: stored errors elsewhere are not re-reported
+    ok, errors, normalized = validator.validate_partial(answers, ["nota"])
+    assert errors == {"nota": "invalid_step"} and normalized == {}
+    # the companion alone brings its question (and dependents) into scope
+    ok, errors, normalized = validator.validate_partial(answers, ["otro_colegio"])
+    assert errors == {"otro_colegio": "required"} and normalized == {}
+    ok, errors, normalized = validator.validate_partial({**answers, "otro_colegio": "rural"}, ["otro_colegio"])
+    assert ok and errors == {}
+
+
+def test_critical_policy_comes_from_rules():
+    index = make_index(
+        make_question(1, "colegio", "single_choice", options=("pub", "otro")),
+        make_question(2, "nota", "number", {"min": 0, "max": 5}),
+        make_question(3, "edad", "number", {"min": 10, "critical": True}),
+        make_question(4, "puntaje_ingles", "number"),
+        make_question(5, "grado", "single_choice", {"critical": []}, options=("10", "11")),
+    )
+    validator = compile_validator(index)
+    answers = {"colegio": "x", "nota": 9, "edad": 5, "puntaje_ingles": 120, "grado": "9"}
+    _, errors, _ = validator.validate_partial(answers, answers)
+    assert validator.critical_errors(errors) == {"colegio": "invalid_option", "edad": "below_min", "puntaje_ingles": "out_of_range"}
+    assert validator.critical_errors(errors, among={"nota", "colegio"}) == {"colegio": "invalid_option"}
+    assert validator.critical_errors({"otro_colegio": "required"}) == {"otro_colegio": "required"}
+
+
+def test_date_rules_use_day_bounds(monkeypatch):
+    from datetime import date
+    from backend.services import dynamic_validation as dv
+
+    monkeypatch.setattr(dv, "_TODAY", [date(2024, 2, 29).toordinal(), float("inf")])
+    index = make_index(
+        make_question(1, "ingreso", "date", {"min_year": 2000, "max_date": "2030-01-01", "not_after_today": True}),
+        make_question(2, "nacimiento", "date", {"min_age_years": 18, "max_age_years": 60}),
+        make_question(3, "egreso", "date", {"min_date": 20200101, "not_before_code": "ingreso"}),
+    )
+    validator = compile_validator(index)
+    assert validator.fields["ingreso"].max_date == "2030-01-01"
+    assert validator.fields["egreso"].min_date is None  # not a date: ignored
+    cases = {
+        "ingreso": [("1999-12-31", "before_min_date"), ("2024-02-29", None), ("2024-3-1", "after_max_date"), ("2024-02-30", "invalid_date")],
+        "nacimiento": [("2006-02-28", None), ("2006-03-01", "min_age"), ("1964-02-29", None), ("1964-02-28", "max_age")],
+    }
+    for code, expected in cases.items():
+        for value, err in expected:
+            _, errors, _ = validator.validate({code: value}, only={code})
+            assert errors.get(code) == err, (code, value)
+    _, errors, _ = validator.validate({"ingreso": "2010-05-01", "egreso": "2010-4-30"})
+    assert errors == {"egreso": "before_other_date"}
+    first = validator.fields["nacimiento"].day_bounds()
+    assert validator.fields["nacimiento"].day_bounds() is first  # once per day
+    monkeypatch.setattr(dv, "_TODAY", [date(2024, 3, 1).toordinal(), float("inf")])
+    _, errors, _ = validator.validate({"nacimiento": "2006-03-01"}, only={"nacimiento"})
+    assert errors == {}
@@ -0,0 +1,113 @@
+"""Query-count regression test for the finalize path (in-memory SQLite)."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import (
+    Questionnaire, QuestionnaireVersion, Section, Question, Option, QuestionnaireAssignment, Response,
+)
+from backend.services import response_store
+from backend.services.dynamic_validation import validate_answers
+from backend.services.finalize_service import finalize_answers
+from backend.services.version_index import get_version_index
+
+ANSWERS = {"edad": 16, "colegio": "pub", "acepta": True}
+
+
+@pytest.fixture()
+def db(engine):
+    with Session(engine) as s:
+        q = Questionnaire(code="voc", title="Voc", status="active", is_primary=True)
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="S", order=1)
+        s.add(sec)
+        s.flush()
+        s.add_all([
+            Question(section_id=sec.id, code="edad", text="Edad", type="number", required=True, order=1),
+            Question(section_id=sec.id, code="colegio", text="Colegio", type="single_choice", required=True, order=2),
+            Question(section_id=sec.id, code="acepta", text="Acepta", type="boolean", required=False, order=3),
+        ])
+        s.flush()
+        colegio = s.query(Question).filter_by(code="colegio").one()
+        s.add_all([
+            Option(question_id=colegio.id, value="pub", label="Pub", order=1),
+            Option(question_id=colegio.id, value="priv", label="Priv", order=2),
+        ])
+        ux = Questionnaire(code="ux_survey", title="UX", status="active")
+        s.add(ux)
+        s.flush()
+        ux_v = QuestionnaireVersion(questionnaire_id=ux.id, version_number=1, status="published")
+        s.add(ux_v)
+        s.commit()
+        version_id, ux_version_id = v.id, ux_v.id
+    return engine, version_id, ux_version_id
+
+
+def _count_statements(engine):
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, params, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+def _autosave(engine, version_id, answers):
+    with Session(engine) as s:
+        v_index = get_version_index(s, version_id)
+        assign, _ = response_store.get_or_create_assignment(s, "stu1", version_id)
+        resp, _ = response_store.get_or_create_response(s, assign.id)
+        result = response_store.upsert_items(s, resp.id, v_index.by_code, answers)
+        response_store.apply_progress(assign, result.answered_delta, v_index.total_questions)
+        s.commit()
+
+
+def test_finalize_after_autosave_uses_three_reads(db):
+    engine, version_id, ux_version_id = db
+    _autosave(engine, version_id, {"edad": 15, "colegio": "pub"})
+    with Session(engine) as s:
+        get_version_index(s, version_id)  # warm the structure cache, as any earlier read does
+
+    statements = _count_statements(engine)
+    with Session(engine, expire_on_commit=False) as s:
+        v_index = get_version_index(s, version_id)
+        statements.clear()  # the version row itself is covered by peek_version_index in the route
+        ok, errs, normalized = validate_answers(v_index, ANSWERS)
+        assert ok, errs
+        outcome = finalize_answers(s, v_index, "stu1", normalized, ux_version_id)
+        s.commit()
+        assert outcome.assignment_id and outcome.response_id
+        assert outcome.ux_pending and not outcome.conflict
+
+    reads = [st for st in statements if st.lstrip().upper().startswith("SELECT")]
+    assert len(reads) == 3, reads
+    # no structure (section/question/option) loads on this path
+    assert not any("dq_question" in st or "dq_section" in st or "dq_option" in st for st in statements)
+    # writes: prefill INSERT inside a SAVEPOINT (+2 statements, unique-index race fallback)
+    assert len(statements) <= 10, statements
+
+    with Session(engine) as s:
+        assign = s.query(QuestionnaireAssignment).one()
+        resp = s.query(Response).one()
+        assert assign.status == "finalized" and assign.progress_percent == 100
+        assert resp.finalized_at is not None and resp.revision == 1
+        assert resp.summary_cache["ml"]["status"] == "skipped"
+
+
+def test_finalize_detects_concurrent_revision(db):
+    engine, version_id, _ = db
+    _autosave(engine, version_id, {"edad": 15})
+    with Session(engine, expire_on_commit=False) as s:
+        v_index = get_version_index(s, version_id)
+        _, _, normalized = validate_answers(v_index, ANSWERS)
+        # keep the revision-0 objects alive in the session (identity map is weak)
+        held = response_store.load_assignments(s, "stu1", [version_id])
+        # another writer advanced the revision after we read it
+        s.execute(Response.__table__.update().values(revision=5))
+        outcome = finalize_answers(s, v_index, "stu1", normalized)
+        assert outcome.conflict and held
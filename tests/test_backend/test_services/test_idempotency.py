@@ -0,0 +1,45 @@
+from backend.services.idempotency import IdempotencyStore
+
+
+def test_replay_returns_recorded_response():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    fp = store.fingerprint({"user_code": "u1", "changes": {"a": 1}})
+    assert store.begin("k", fp) == (None, "new")
+    store.finish("k", 200, {"message": "saved"})
+    replay, state = store.begin("k", fp)
+    assert state == "replay"
+    assert (replay.status, replay.body) == (200, {"message": "saved"})
+
+
+def test_key_reused_with_other_payload_is_rejected():
+    store = IdempotencyStore()
+    store.begin("k", store.fingerprint({"a": 1}))
+    store.finish("k", 200, {})
+    assert store.begin("k", store.fingerprint({"a": 2})) == (None, "mismatch")
+
+
+def test_server_errors_are_not_recorded():
+    store = IdempotencyStore()
+    store.begin("k", "fp")
+    store.finish("k", 500, {"error": "boom"})
+    assert store.begin("k", "fp") == (None, "new")
+
+
+def test_in_progress_duplicate_times_out():
+    store = IdempotencyStore(wait_seconds=0.01)
+    store.begin("k", "fp")
+    assert store.begin("k", "fp") == (None, "in_progress")
+
+
+def test_entries_expire_and_are_bounded():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=3)
+    for i in range(5):
+        store.begin(f"k{i}", "fp")
+        store.finish(f"k{i}", 200, {})
+    assert len(store) == 3
+    assert store.begin("k0", "fp") == (None, "new")
+
+    expired = IdempotencyStore(ttl_seconds=0)
+    expired.begin("k", "fp")
+    expired.finish("k", 200, {})
+    assert expired.begin("k", "fp") == (None, "new")
@@ -0,0 +1,61 @@
+import json
+
+from backend.services.json_schema import ecma_pattern, rule_to_schema, schema_document
+from .conftest import make_index, make_question
+
+
+QUESTIONS = (
+    make_question(1, "edad", "number", {"min": 10, "max": 99}, required=True),
+    make_question(2, "nota", "number", {"allow_decimal": True, "min": 0, "max": 5, "step": "0.5"}),
+    make_question(3, "promedio", "number", {"allow_decimal": True, "step": 0.1}),
+    make_question(4, "colegio", "single_choice", options=("pub", "otro"), required=True),
+    make_question(5, "detalle", "text", {"regex": "[a-z]+"}, required=True, visible_if={"code": "colegio", "equals": "pub"}),
+    make_question(6, "nacimiento", "date", {"min_year": 1990, "not_after_today": True}),
+)
+INDEX = make_index(*QUESTIONS, version_id=46, version_number=3)
+
+
+def test_rules_become_schema_keywords():
+    doc = schema_document(INDEX)
+    schema = json.loads(doc.body)
+    props = schema["properties"]
+    assert props["edad"] == {"title": "Edad", "type": "integer", "minimum": 10, "maximum": 99}
+    assert props["nota"]["multipleOf"] == 0.5
+    assert props["promedio"]["x-step"] == {"step": 0.1, "base": 0.0}  # not exact in binary floating point
+    assert props["colegio"]["enum"] == ["otro", "pub"]
+    assert props["detalle"]["pattern"] == "^(?:[a-z]+)$"
+    assert props["nacimiento"]["formatMinimum"] == "1990-01-01" and props["nacimiento"]["x-not-after-today"] is True
+    assert schema["required"] == ["edad", "colegio"]
+    assert {"if": rule_to_schema({"code": "colegio", "equals": "pub"}), "then": {"required": ["detalle"]}} in schema["allOf"]
+    assert any(c["then"]["required"] == ["otro_colegio"] for c in schema["allOf"])
+
+
+def test_python_regex_is_translated_or_skipped():
+    assert ecma_pattern(r"(?P<d>\d+)-(?P=d)") == r"(?<d>\d+)-\k<d>"
+    assert ecma_pattern(r"\A[a-z]+\Z") == "^[a-z]+$"
+    assert ecma_pattern(r"[(?P<\A]x") == r"[(?P<\A]x"  # literal inside a class
+    assert ecma_pattern(r"[]a]") == r"[\]a]"
+    for source in (r"(?i)abc", r"a(?s:.)b", r"(?#note)a", r"(a)?(?(1)b|c)"):
+        assert ecma_pattern(source) is None
+    index = make_index(
+        make_question(1, "codigo", "text", {"regex": r"\A[A-Z]{2}\d+\Z"}),
+        make_question(2, "ciudad", "text", {"regex": r"(?i)[a-z ]+"}),
+    )
+    props = json.loads(schema_document(index).body)["properties"]
+    assert props["codigo"]["pattern"] == r"^(?:^[A-Z]{2}\d+$)$"
+    assert "pattern" not in props["ciudad"] and props["ciudad"]["x-pattern"] == r"(?i)[a-z ]+"
+
+
+def test_visible_if_operators():
+    assert rule_to_schema({"code": "a", "gte": "3"}) == {"required": ["a"], "properties": {"a": {"type": "number", "minimum": 3.0}}}
+    assert rule_to_schema({"code": "a", "not_in": ["x"]})["not"]["required"] == ["a"]
+    assert rule_to_schema({"or": [{"code": "a", "answered": True}, {"code": "b"}]})["anyOf"][1] == {
+        "anyOf": [{"not": {"required": ["b"]}}, {"properties": {"b": {"const": None}}}],
+    }
+
+
+def test_document_is_cached_with_etag():
+    doc = schema_document(INDEX)
+    assert schema_document(INDEX) is doc
+    assert doc.matches(doc.etag) and doc.matches(f'"other", W/{doc.etag}') and doc.matches("*")
+    assert not doc.matches('"other"') and not doc.matches(None)
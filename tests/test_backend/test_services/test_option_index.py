@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import Questionnaire, QuestionnaireVersion, Section, Question, Option
+from backend.services import option_index, response_store
+from backend.services.dynamic_validation import get_validator
+from backend.services.option_index import OptionCodec, count_bits, option_stats
+from backend.services.version_index import get_version_index
+
+OPTIONS = [SimpleNamespace(value=v, is_other_flag=(v == "otro")) for v in ("a", "b", "c,d", "otro")]
+
+
+def test_codec_masks():
+    codec = OptionCodec.from_options(OPTIONS)
+    assert codec.mask(["a", "c,d", "a"]) == 0b101
+    assert codec.mask("b") == 0b10
+    assert codec.mask(["a", "x"]) is None and codec.mask(5) is None
+    assert codec.decode(0b1101) == ["a", "c,d", "otro"]
+    assert codec.selects_other(["b", "otro"]) and codec.selects_other("otro")
+    assert not codec.selects_other(["a"]) and not codec.selects_other([])
+
+
+def test_count_bits_without_numpy(monkeypatch):
+    masks = [0b101, 0b1, 0b110]
+    assert count_bits(masks, 4) == [2, 1, 2, 0]
+    monkeypatch.setattr(option_index, "np", None)
+    assert count_bits(masks, 4) == [2, 1, 2, 0]
+    assert count_bits([1 << 70], 71)[70] == 1
+
+
+def test_option_stats(engine):
+    with Session(engine) as s:
+        q = Questionnaire(code="voc", title="Voc", status="active", is_primary=True)
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="S", order=1)
+        s.add(sec)
+        s.flush()
+        colegio = Question(section_id=sec.id, code="colegio", text="Colegio", type="single_choice", required=True, order=1)
+        hobbies = Question(section_id=sec.id, code="hobbies", text="Hobbies", type="multi_choice", required=False, order=2)
+        s.add_all([colegio, hobbies])
+        s.flush()
+        s.add_all([Option(question_id=colegio.id, value=val, label=val.title(), order=i) for i, val in enumerate(["pub", "priv"])])
+        s.add_all([Option(question_id=hobbies.id, value=val, label=val, order=i) for i, val in enumerate(["a", "b", "c,d"])])
+        s.commit()
+        v_index = get_version_index(s, v.id)
+        for user, answers in (("u1", {"colegio": "pub", "hobbies": ["a", "c,d"]}), ("u2", {"colegio": "pub", "hobbies": ["c,d"]}), ("u3", {"colegio": "viejo"})):
+            assign, _ = response_store.get_or_create_assignment(s, user, v.id)
+            resp, _ = response_store.get_or_create_response(s, assign.id)
+            response_store.upsert_items(s, resp.id, v_index.by_code, answers)
+        s.commit()
+        codecs = {code: f.codec for code, f in get_validator(v_index).fields.items() if f.codec is not None}
+        stats = {item["code"]: item for item in option_stats(s, v_index, codecs)}
+    assert stats["colegio"]["answered"] == 3 and stats["colegio"]["invalid"] == 1
+    assert [(o["value"], o["label"], o["count"]) for o in stats["colegio"]["options"]] == [("pub", "Pub", 2), ("priv", "Priv", 0)]
+    assert [o["count"] for o in stats["hobbies"]["options"]] == [1, 0, 2]
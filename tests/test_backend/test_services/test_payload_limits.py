@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from backend.services import payload_limits
+from backend.services.payload_limits import bound_answers
+
+INDEX = SimpleNamespace(by_code={"edad": object(), "hobbies": object(), "colegio": object()})
+
+
+def test_unknown_codes_are_dropped_before_validation():
+    answers = {"edad": 15, "otro_colegio": "x", "otro_nada": "y", "zzz": "a" * 10_000, 3: "n"}
+    bounded, errors = bound_answers(INDEX, answers)
+    assert bounded == {"edad": 15, "otro_colegio": "x"}
+    assert errors == {}
+
+
+def test_per_field_caps():
+    answers = {
+        "edad": "9" * (payload_limits.MAX_ANSWER_CHARS + 1),
+        "hobbies": ["a"] * (payload_limits.MAX_ANSWER_ITEMS + 1),
+        "colegio": {"nested": True},
+    }
+    bounded, errors = bound_answers(INDEX, answers)
+    assert bounded == {}
+    assert errors == {"edad": "too_long", "hobbies": "too_many_items", "colegio": "invalid_value"}
+    assert bound_answers(INDEX, {"hobbies": ["a", ["b"]]})[1] == {"hobbies": "invalid_value"}
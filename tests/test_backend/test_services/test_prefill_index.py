@@ -0,0 +1,49 @@
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import PrefillValue
+from backend.services import prefill_index
+
+
+def _values(engine):
+    with Session(engine) as s:
+        return {row.question_code: (row.value_json, row.source_version_id) for row in s.query(PrefillValue).all()}
+
+
+def test_record_values_upserts(engine):
+    with Session(engine) as s:
+        assert prefill_index.record_values(s, "stu1", {"edad": 15, "colegio": "pub", "nombre": ""}, 1) == 2
+        assert prefill_index.record_values(s, "stu1", {"edad": 16, "colegio": "pub"}, 1) == 1
+        s.commit()
+        assert prefill_index.lookup_values(s, "stu1", ["edad", "colegio", "x"]) == {"edad": 16, "colegio": "pub", "x": None}
+
+
+def test_concurrent_insert_falls_back_to_update(engine, monkeypatch):
+    with Session(engine) as s:
+        prefill_index.record_values(s, "stu1", {"edad": 15}, 1)
+        s.commit()
+    # the other writer's row is not visible to our lookup: our INSERT hits the unique index
+    monkeypatch.setattr(prefill_index, "_existing_rows", lambda s, user_code, codes: {})
+    with Session(engine) as s:
+        assert prefill_index.record_values(s, "stu1", {"edad": 17, "colegio": "priv"}, 2) == 2
+        s.commit()
+    assert _values(engine) == {"edad": (17, 2), "colegio": ("priv", 2)}
+
+
+def test_cleared_answer_drops_the_row(engine):
+    with Session(engine) as s:
+        prefill_index.record_values(s, "stu1", {"edad": 15, "colegio": "pub"}, 1)
+        s.commit()
+    with Session(engine) as s:
+        assert prefill_index.record_values(s, "stu1", {"edad": None, "colegio": "pub", "nombre": ""}, 1) == 1
+        s.commit()
+    assert _values(engine) == {"colegio": ("pub", 1)}
+
+
+def test_forget_versions(engine):
+    with Session(engine) as s:
+        prefill_index.record_values(s, "stu1", {"edad": 15}, 1)
+        prefill_index.record_values(s, "stu2", {"edad": 16}, 2)
+        assert prefill_index.forget_versions(s, [1, None]) == 1
+        assert prefill_index.forget_versions(s, []) == 0
+        s.commit()
+    assert _values(engine) == {"edad": (16, 2)}
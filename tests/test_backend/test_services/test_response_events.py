@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import (
+    Questionnaire, QuestionnaireVersion, Section, Question, QuestionnaireAssignment, Response, ResponseEvent, ResponseItem,
+)
+from backend.services import response_events, response_store
+from backend.services.dynamic_validation import validate_answers
+from backend.services.finalize_service import finalize_answers
+from backend.services.version_index import get_version_index
+
+
+@pytest.fixture()
+def db(engine):
+    with Session(engine) as s:
+        q = Questionnaire(code="voc", title="Voc", status="active")
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="S", order=1)
+        s.add(sec)
+        s.flush()
+        s.add_all([
+            Question(section_id=sec.id, code="edad", text="Edad", type="number", required=True, order=1),
+            Question(section_id=sec.id, code="nombre", text="Nombre", type="text", required=True, order=2),
+        ])
+        s.commit()
+        version_id = v.id
+    return engine, version_id
+
+
+def _save(engine, version_id, answers):
+    with Session(engine) as s:
+        v_index = get_version_index(s, version_id)
+        assign, _ = response_store.get_or_create_assignment(s, "stu1", version_id)
+        resp, _ = response_store.get_or_create_response(s, assign.id)
+        state = response_events.load_state(s, resp)
+        written = response_events.append_events(s, resp.id, v_index.by_code, answers, state)
+        s.commit()
+        return written
+
+
+def test_append_only_logs_changes_and_overlays_state(db):
+    engine, version_id = db
+    assert _save(engine, version_id, {"edad": 15, "nombre": "Ana"}) == 2
+    assert _save(engine, version_id, {"edad": 15, "nombre": "Eva"}) == 1  # unchanged edad is skipped
+    with Session(engine) as s:
+        assert s.query(ResponseItem).count() == 0
+        assert s.query(ResponseEvent).count() == 3
+        resp = s.query(Response).one()
+        v_index = get_version_index(s, version_id)
+        state = response_events.load_state(s, resp)
+        assert state[v_index.by_code["nombre"].id].value == "Eva"
+
+
+def test_compaction_folds_events_and_advances_watermark(db):
+    engine, version_id = db
+    _save(engine, version_id, {"edad": 15})
+    _save(engine, version_id, {"edad": 16, "nombre": "Ana"})
+    assert response_events.compact_pending(lambda: Session(engine)) == 1
+    with Session(engine) as s:
+        items = {it.question_id: it for it in s.query(ResponseItem).all()}
+        assert sorted(it.value for it in items.values()) == ["16", "Ana"]
+        resp = s.query(Response).one()
+        assert resp.compacted_event_id == s.query(ResponseEvent).order_by(ResponseEvent.id.desc()).first().id
+        assign = s.query(QuestionnaireAssignment).one()
+        assert assign.answered_count == 2 and assign.progress_percent == 100
+    # nothing left to fold
+    assert response_events.compact_pending(lambda: Session(engine)) == 0
+
+
+def test_finalize_folds_pending_events(db):
+    engine, version_id = db
+    _save(engine, version_id, {"edad": 15, "nombre": "Ana"})
+    with Session(engine, expire_on_commit=False) as s:
+        v_index = get_version_index(s, version_id)
+        _, _, normalized = validate_answers(v_index, {"edad": 17, "nombre": "Ana"})
+        outcome = finalize_answers(s, v_index, "stu1", normalized, compact_events=True)
+        assert not outcome.conflict
+        s.commit()
+    with Session(engine) as s:
+        assert sorted(it.value for it in s.query(ResponseItem).all()) == ["17", "Ana"]
+        assert s.query(QuestionnaireAssignment).one().answered_count == 2
+        assert s.query(Response).one().compacted_event_id == s.query(ResponseEvent).count()
+    assert response_events.compact_pending(lambda: Session(engine)) == 0
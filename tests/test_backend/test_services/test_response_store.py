@@ -0,0 +1,176 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import (
+    Questionnaire, QuestionnaireVersion, Section, Question, QuestionnaireAssignment, Response, ResponseItem,
+)
+from backend.services import response_store
+from backend.services.dynamic_validation import get_validator
+from backend.services.response_store import EncodedValue, decode_item, encode_value, upsert_encoded
+from backend.services.version_index import get_version_index
+
+
+def _legacy(value, numeric_value=None):
+    return SimpleNamespace(value=value, numeric_value=numeric_value, float_value=None, values_json=None)
+
+
+@pytest.mark.parametrize("qtype, value, stored", [
+    ("number", 15, EncodedValue("15", 15, 15.0)),
+    ("number", 4.5, EncodedValue("4.5", None, 4.5)),
+    ("scale_1_5", 3, EncodedValue("3", 3, 3.0)),
+    ("boolean", True, EncodedValue("true", 1)),
+    ("multi_choice", ["a", "c,d"], EncodedValue("a,c,d", None, None, ["a", "c,d"])),
+    ("text", "uno, dos", EncodedValue("uno, dos", None)),
+    ("multi_choice", None, EncodedValue(None, None)),
+    ("boolean", None, EncodedValue(None, None)),
+])
+def test_encode_decode_roundtrip(qtype, value, stored):
+    enc = encode_value(qtype, value)
+    assert enc == stored
+    assert decode_item(SimpleNamespace(**enc._asdict()), qtype) == value
+
+
+def test_decode_legacy_rows():
+    assert decode_item(_legacy("4.5"), "number") == 4.5
+    assert decode_item(_legacy("a,b"), "multi_choice") == ["a", "b"]
+    assert decode_item(_legacy("a"), "multi_choice") == ["a"]
+    assert decode_item(_legacy("uno, dos"), "text") == "uno, dos"
+    assert decode_item(_legacy("true", 1), "boolean") is True
+    # without a type the historical heuristics still apply
+    assert decode_item(_legacy("a,b")) == ["a", "b"]
+    assert decode_item(_legacy("true", 1)) == 1
+
+
+def test_upsert_writes_typed_columns(engine):
+    with Session(engine) as s:
+        upsert_encoded(s, 1, {10: encode_value("number", 4.5), 11: encode_value("multi_choice", ["x", "y"])})
+        s.commit()
+        rows = {r.question_id: r for r in s.query(ResponseItem).all()}
+        assert rows[10].float_value == 4.5 and rows[10].numeric_value is None
+        assert rows[11].values_json == ["x", "y"]
+        # identical values are not rewritten
+        result = upsert_encoded(s, 1, {10: encode_value("number", 4.5), 11: encode_value("multi_choice", ["x", "y"])})
+        assert result.written == 0
+
+
+@pytest.fixture()
+def version(engine):
+    with Session(engine) as s:
+        q = Questionnaire(code="voc", title="Voc", status="active")
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="S", order=1)
+        s.add(sec)
+        s.flush()
+        s.add_all([
+            Question(section_id=sec.id, code="edad", text="Edad", type="number", required=False, order=1),
+            Question(section_id=sec.id, code="nombre", text="Nombre", type="text", required=False, order=2),
+            Question(section_id=sec.id, code="acepta", text="Acepta", type="boolean", required=False, order=3),
+        ])
+        s.commit()
+        version_id = v.id
+    return engine, version_id
+
+
+def _delta_save(engine, version_id, changes, base_revision):
+    """The delta branch of save_response: revision check, partial validation, changed items only."""
+    with Session(engine) as s:
+        v_index = get_version_index(s, version_id)
+        assign, _ = response_store.get_or_create_assignment(s, "stu1", version_id)
+        resp, _ = response_store.get_or_create_response(s, assign.id)
+        current = resp.revision or 0
+        if base_revision != current:
+            return 409, {"error": "revision_conflict", "revision": current}
+        context = {
+            v_index.qid_to_code[it.question_id]: decode_item(it, v_index.by_code[v_index.qid_to_code[it.question_id]].type)
+            for it in s.query(ResponseItem).filter_by(response_id=resp.id)
+        }
+        context.update(changes)
+        validator = get_validator(v_index)
+        _, errs, normalized = validator.validate_partial(context, changes.keys(), clear_nulls=True)
+        assert not validator.critical_errors(errs, changes.keys()), errs
+        result = response_store.upsert_items(s, resp.id, v_index.by_code, normalized)
+        revision = current
+        if result.written:
+            assert response_store.bump_revision(s, resp.id, current)
+            revision += 1
+        s.commit()
+        return 200, {"revision": revision, "written": result.written}
+
+
+def _stored(engine):
+    with Session(engine) as s:
+        return {it.question_id: (it.value, it.numeric_value) for it in s.query(ResponseItem).order_by(ResponseItem.question_id)}
+
+
+def test_delta_save_rejects_stale_revision(version):
+    engine, version_id = version
+    assert _delta_save(engine, version_id, {"edad": 15}, 0) == (200, {"revision": 1, "written": 1})
+    assert _delta_save(engine, version_id, {"edad": 16}, 0) == (409, {"error": "revision_conflict", "revision": 1})
+    with Session(engine) as s:
+        assert s.query(Response).one().revision == 1
+    assert list(_stored(engine).values()) == [("15", 15)]
+
+
+def test_delta_save_writes_only_changed_items(version):
+    engine, version_id = version
+    _delta_save(engine, version_id, {"edad": 15, "nombre": "Ana", "acepta": True}, 0)
+    before = _stored(engine)
+    assert _delta_save(engine, version_id, {"nombre": "Eva"}, 1) == (200, {"revision": 2, "written": 1})
+    after = _stored(engine)
+    changed = {qid for qid in after if after[qid] != before[qid]}
+    assert [after[qid] for qid in changed] == [("Eva", None)]
+    # unchanged values write nothing and keep the revision
+    assert _delta_save(engine, version_id, {"nombre": "Eva"}, 2) == (200, {"revision": 2, "written": 0})
+
+
+def test_delta_save_null_clears_item(version):
+    engine, version_id = version
+    _delta_save(engine, version_id, {"edad": 15, "acepta": True}, 0)
+    assert _delta_save(engine, version_id, {"edad": None, "acepta": None}, 1) == (200, {"revision": 2, "written": 2})
+    assert sorted(_stored(engine).values(), key=str) == [(None, None), (None, None)]
+
+
+def test_get_or_create_assignment_is_idempotent(version):
+    engine, version_id = version
+    with Session(engine) as s:
+        first, created = response_store.get_or_create_assignment(s, "stu1", version_id)
+        again, created_again = response_store.get_or_create_assignment(s, "stu1", version_id)
+        s.commit()
+        assert created and not created_again and again.id == first.id
+        resp, _ = response_store.get_or_create_response(s, first.id)
+        assert response_store.get_or_create_response(s, first.id) == (resp, False)
+        assert s.query(QuestionnaireAssignment).count() == 1
+
+
+def test_insert_race_falls_back_to_existing_row(version, monkeypatch):
+    engine, version_id = version
+    with Session(engine) as s:
+        winner, _ = response_store.get_or_create_assignment(s, "stu1", version_id)
+        s.commit()
+        winner_id = winner.id
+    # Another writer committed between our lookup and our INSERT: the first lookup
+    # misses and the NOT EXISTS probe does not see the row, so the unique index
+    # rejects the insert with an IntegrityError
+    real_find, real_insert = response_store.find_assignment, response_store._insert_if_absent
+    lookups = []
+
+    def late_find(s, user_code, v_id):
+        lookups.append(user_code)
+        return None if len(lookups) == 1 else real_find(s, user_code, v_id)
+
+    def blind_insert(s, model, values, match):
+        return real_insert(s, model, values, (model.id == -1,))
+
+    monkeypatch.setattr(response_store, "find_assignment", late_find)
+    monkeypatch.setattr(response_store, "_insert_if_absent", blind_insert)
+    with Session(engine) as s:
+        assign, created = response_store.get_or_create_assignment(s, "stu1", version_id)
+        assert not created and assign.id == winner_id
+        s.commit()
+        assert s.query(QuestionnaireAssignment).count() == 1
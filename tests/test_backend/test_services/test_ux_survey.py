@@ -0,0 +1,55 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import (
+    Questionnaire, QuestionnaireVersion, Section, Question, Option, QuestionnaireAssignment,
+)
+from backend.services import ux_survey
+
+
+def _seed(engine, finalized_users=()):
+    with Session(engine) as s:
+        q = Questionnaire(code="ux_survey", title="UX", status="active")
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="U", order=1)
+        s.add(sec)
+        s.flush()
+        for order, code in ((2, "ux_q2"), (1, "ux_q1")):
+            qu = Question(section_id=sec.id, code=code, text=code.upper(), type="choice", required=True, order=order)
+            s.add(qu)
+            s.flush()
+            s.add_all([Option(question_id=qu.id, value=str(i), label=f"L{i}", order=6 - i) for i in range(1, 6)])
+        for user in finalized_users:
+            s.add(QuestionnaireAssignment(user_code=user, questionnaire_version_id=v.id, status="finalized"))
+        s.commit()
+        return v.id
+
+
+def test_structure_is_ordered_and_cached(engine):
+    version_id = _seed(engine)
+    with Session(engine) as s:
+        survey = ux_survey.get_survey(s)
+        assert survey.version_id == version_id
+        assert [q["code"] for q in survey.questions] == ["ux_q1", "ux_q2"]
+        assert [o["value"] for o in survey.questions[0]["options"]] == ["5", "4", "3", "2", "1"]
+        assert ux_survey.get_survey(s) is survey
+
+
+def test_completion_set_avoids_queries(engine):
+    _seed(engine, finalized_users=("done1",))
+    with Session(engine) as s:
+        ux_survey.warm(s)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        assert not ux_survey.is_pending(s, "done1")
+        assert statements == []
+        assert ux_survey.is_pending(s, "new1")  # miss -> one indexed lookup
+        assert len(statements) == 1
+        ux_survey.mark_completed(ux_survey.version_id(s), "new1")
+        assert not ux_survey.is_pending(s, "new1")
+        ux_survey.forget("done1")
+        assert not ux_survey.is_pending(s, "done1")  # still finalized in the table
@@ -0,0 +1,70 @@
+"""Seeded property tests and a throughput floor for the answer validator.
+
+Every seed builds a random version (``synthetic_versions``) and random payloads;
+a failing seed reproduces with ``pytest "...test_validation_fuzz.py::test_fuzz_invariants[<seed>]"``. More seeds:
+``DQ_FUZZ_SEEDS=500``. Throughput floor: ``DQ_MIN_ANSWERS_PER_SEC``.
+"""
+import os
+import random
+from time import perf_counter
+
+import pytest
+
+from backend.services.batch_validation import validate_batch
+from backend.services.dynamic_validation import _ICFES_CODES, compile_validator, get_validator
+from backend.services.synthetic_versions import random_answers, random_version
+
+SEEDS = range(int(os.environ.get("DQ_FUZZ_SEEDS", "30")))
+MIN_ANSWERS_PER_SEC = float(os.environ.get("DQ_MIN_ANSWERS_PER_SEC", "50000"))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_fuzz_invariants(seed):
+    rng = random.Random(seed)
+    index = random_version(rng, questions=rng.randint(3, 40), version_id=10000 + seed)
+    validator = get_validator(index)
+    fresh = compile_validator(index)
+    computed = {cf.code for cf in validator.computed}
+    payloads = [random_answers(rng, index) for _ in range(25)]
+    for answers in payloads:
+        result = validator.validate(answers)
+        ok, errors, normalized = result
+        # deterministic: same result from a fresh compile and with keys in another order
+        shuffled = list(answers.items())
+        rng.shuffle(shuffled)
+        assert fresh.validate(dict(shuffled)) == result
+        assert ok == (not errors)
+        visible = validator.visibility.evaluate(answers)
+        shown = {code for code in validator.fields if visible.get(code, True)}
+        assert set(normalized) <= shown
+        for key in errors:
+            assert (key[5:] if key.startswith("otro_") and key not in validator.fields else key) in shown
+        # a code is either valid or not; except ICFES ranges (checked after the type) and empty
+        # required answers, which stay normalized so clearing a field is still saved
+        both = {code for code in set(errors) & set(normalized) if errors[code] != "required"}
+        assert not both - _ICFES_CODES
+        for code in shown - computed:
+            if validator.fields[code].required and answers.get(code) in (None, ""):
+                # empty answers still go through the type check, which may report a more specific error
+                assert errors[code] == "required" if code not in answers else code in errors
+        # re-checking every code incrementally finds the same errors
+        assert validator.validate_partial(answers, set(answers) | set(validator.fields))[1] == errors
+    batch = validate_batch(index, payloads)
+    assert batch.errors == [validator.validate(a)[1] for a in payloads]
+    assert batch.normalized == [validator.validate(a)[2] for a in payloads]
+
+
+def test_validation_throughput():
+    rng = random.Random(2024)
+    index = random_version(rng, questions=60, version_id=99999)
+    validator = get_validator(index)
+    payloads = [random_answers(rng, index) for _ in range(300)]
+    total = sum(len(p) for p in payloads)
+    best = float("inf")
+    for _ in range(3):
+        started = perf_counter()
+        for answers in payloads:
+            validator.validate(answers)
+        best = min(best, perf_counter() - started)
+    rate = total / best
+    assert rate >= MIN_ANSWERS_PER_SEC, f"validate_answers: {rate:,.0f} answers/s < {MIN_ANSWERS_PER_SEC:,.0f}"
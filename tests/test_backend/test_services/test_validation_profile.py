@@ -0,0 +1,110 @@
+import re
+
+from sqlalchemy.orm import Session
+
+from database.dynamic_models import Questionnaire, QuestionnaireVersion, Section, Question
+from backend.services import validation_profile
+from backend.services.dynamic_validation import compile_validator
+from backend.services.validation_profile import RegexGuard, ValidationProfile, regex_risk, stored_unsafe_patterns
+from .conftest import make_index, make_question
+
+
+def test_regex_risk_flags_catastrophic_shapes():
+    assert regex_risk("[A-Za-z ]+") is None
+    assert regex_risk(r"(\d{1,3}\.){3}\d{1,3}") is None
+    assert regex_risk("(a+)+$") == "nested_quantifier"
+    assert regex_risk("([a-z]+ ?)*") == "nested_quantifier"
+    assert regex_risk(r"(x)\1") == "backreference"
+    assert regex_risk("(") == "syntax_error"
+
+
+def test_unsafe_patterns_are_not_enforced():
+    validator = compile_validator(make_index(make_question(1, "nombre", "text", {"regex": "([a-z]+ ?)*"})))
+    assert validator.fields["nombre"].pattern is None
+    assert validator.validate({"nombre": "a" * 40 + "!"})[0]
+
+
+def test_stored_unsafe_patterns_are_listed(engine):
+    with Session(engine) as s:
+        q = Questionnaire(code="voc", title="Voc", status="active")
+        s.add(q)
+        s.flush()
+        v = QuestionnaireVersion(questionnaire_id=q.id, version_number=1, status="published")
+        s.add(v)
+        s.flush()
+        sec = Section(questionnaire_version_id=v.id, title="S", order=1)
+        s.add(sec)
+        s.flush()
+        s.add_all([
+            Question(section_id=sec.id, code="ok", text="Ok", type="text", order=1, validation_rules={"regex": "[a-z]+"}),
+            Question(section_id=sec.id, code="lento", text="Lento", type="text", order=2, validation_rules={"regex": "(a+)+$"}),
+            Question(section_id=sec.id, code="roto", text="Roto", type="text", order=3, validation_rules={"regex": "("}),
+            Question(section_id=sec.id, code="libre", text="Libre", type="text", order=4),
+        ])
+        s.commit()
+        assert stored_unsafe_patterns(s) == [
+            {"version_id": v.id, "status": "published", "code": "lento", "pattern": "(a+)+$", "reason": "nested_quantifier"},
+            {"version_id": v.id, "status": "published", "code": "roto", "pattern": "(", "reason": "syntax_error"},
+        ]
+
+
+def _cpu_clock(monkeypatch, step_s):
+    """thread_time advancing ``step_s`` per read, so each match costs exactly that."""
+    ticks = iter(range(10 ** 6))
+    monkeypatch.setattr(validation_profile, "thread_time", lambda: next(ticks) * step_s)
+
+
+def test_slow_pattern_is_quarantined_after_repeated_overruns(monkeypatch):
+    _cpu_clock(monkeypatch, 0.1)  # 100 ms CPU per match
+    profile = ValidationProfile(enabled=True, slow_regex_ms=1)
+    guard = RegexGuard(budget_ms=50, profile=profile, strikes=3, quarantine_s=60)
+    pattern = re.compile("[0-9]+")
+    assert guard.fullmatch("doc", pattern, "12a") is False
+    assert guard.fullmatch("doc", pattern, "12") is True  # one slow match is not enough
+    assert guard.fullmatch("doc", pattern, "12a") is False
+    assert guard.fullmatch("doc", pattern, "12a") is None  # third overrun: quarantined
+    entry = guard.snapshot()["quarantined"][0]
+    assert entry["code"] == "doc" and entry["strikes"] == 3
+    assert profile.snapshot()["slow_regex"][0]["count"] == 3
+    guard.release()
+    assert guard.fullmatch("doc", pattern, "12") is True
+
+
+def test_quarantine_expires(monkeypatch):
+    _cpu_clock(monkeypatch, 0.1)
+    now = [1000.0]
+    monkeypatch.setattr(validation_profile, "time", lambda: now[0])
+    guard = RegexGuard(budget_ms=50, strikes=1, quarantine_s=60)
+    pattern = re.compile("[a-z]+")
+    guard.fullmatch("nombre", pattern, "ana")
+    assert guard.fullmatch("nombre", pattern, "ana") is None
+    now[0] += 61
+    _cpu_clock(monkeypatch, 0.001)  # fast again
+    assert guard.fullmatch("nombre", pattern, "ana") is True
+    assert guard.snapshot()["quarantined"] == []
+
+
+def test_quarantined_pattern_is_reported_not_accepted(monkeypatch):
+    guard = RegexGuard(budget_ms=50, strikes=1)
+    monkeypatch.setattr("backend.services.dynamic_validation.REGEX_GUARD", guard)
+    validator = compile_validator(make_index(make_question(1, "nombre", "text", {"regex": "[a-z]+"})))
+    _cpu_clock(monkeypatch, 0.1)
+    assert validator.validate({"nombre": "ana"}) == (True, {}, {"nombre": "ana"})
+    assert validator.validate({"nombre": "ana"}) == (False, {"nombre": "regex_unavailable"}, {})
+
+
+def test_profile_records_rule_types(monkeypatch):
+    profile = ValidationProfile(enabled=True)
+    monkeypatch.setattr("backend.services.dynamic_validation.PROFILE", profile)
+    monkeypatch.setattr(validation_profile.REGEX_GUARD, "profile", profile)
+    validator = compile_validator(make_index(
+        make_question(1, "nombre", "text", {"regex": "[a-z]+"}, required=True),
+        make_question(2, "nota", "number", {"min": 0, "max": 5}),
+    ))
+    validator.validate({"nombre": "ana", "nota": 9})
+    rules = profile.snapshot()["rules"]
+    assert rules["number"]["count"] == 1 and rules["number"]["errors"] == 1
+    assert rules["regex"]["count"] == 1 and rules["text"]["errors"] == 0
+    assert {"visibility", "required", "domain"} <= set(rules)
+    profile.reset()
+    assert profile.snapshot()["rules"] == {}
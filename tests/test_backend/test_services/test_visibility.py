@@ -0,0 +1,44 @@
+from backend.services.visibility import build_graph, evaluate_visibility
+
+RULES = {
+    "estudia": None,
+    "nivel": {"code": "estudia", "equals": "si"},
+    "carrera": {"code": "nivel", "in": ["pregrado", "posgrado"]},
+    "semestre": {"and": [{"code": "carrera", "answered": True}, {"code": "edad", "gte": 17}]},
+    "beca": {"or": [{"code": "nivel", "equals": "posgrado"}, {"code": "edad", "lt": 16}]},
+    "edad": None,
+}
+
+
+def test_leaf_operators():
+    answers = {"edad": "18", "hobbies": ["a", "b"], "nombre": " "}
+    assert evaluate_visibility({"code": "edad", "gt": 17}, answers)
+    assert not evaluate_visibility({"code": "edad", "lte": 17.5}, answers)
+    assert evaluate_visibility({"code": "hobbies", "in": ["b", "z"]}, answers)
+    assert evaluate_visibility({"code": "hobbies", "not_in": ["z"]}, answers)
+    assert evaluate_visibility({"code": "nombre", "answered": False}, answers)
+    assert evaluate_visibility({"code": "edad", "not_equals": "17"}, answers)
+    assert not evaluate_visibility({"code": "nombre", "gt": 1}, answers)  # not numeric
+    assert evaluate_visibility({"code": "falta"}, answers)  # historical: equals null
+
+
+def test_hidden_parents_hide_children():
+    graph = build_graph(RULES)
+    assert graph.order.index("nivel") < graph.order.index("carrera") < graph.order.index("semestre")
+    answers = {"estudia": "si", "nivel": "pregrado", "carrera": "ing", "edad": 18}
+    visible = graph.evaluate(answers)
+    assert visible["carrera"] and visible["semestre"] and not visible["beca"]
+    # the stale answers of nivel/carrera no longer count once estudia changes
+    visible = graph.evaluate({**answers, "estudia": "no"})
+    assert not visible["nivel"] and not visible["carrera"] and not visible["semestre"]
+    # an "or" branch that does not depend on the hidden question still applies
+    assert graph.evaluate({**answers, "estudia": "no", "edad": 15})["beca"]
+
+
+def test_incremental_scope_and_cycles():
+    graph = build_graph(RULES)
+    assert graph.descendants["estudia"] == {"nivel", "carrera", "semestre", "beca"}
+    assert set(graph.evaluate({"estudia": "si"}, scope={"carrera"})) == {"nivel", "carrera"}
+    cyclic = build_graph({"a": {"code": "b", "equals": 1}, "b": {"code": "a", "equals": None}})
+    assert set(cyclic.order) == {"a", "b"}
+    assert cyclic.evaluate({"b": 1}) == {"a": True, "b": True}